@@ -3,7 +3,7 @@ CalibraCore Lab - Authentication Module
 """
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -23,6 +23,8 @@ pwd_context = CryptContext(
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+STREAM_SCOPE = "dashboard_stream"
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -46,10 +48,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def decode_token(token: str) -> Optional[TokenData]:
-    """Decode and validate JWT token"""
+def create_stream_token(user: Usuario) -> str:
+    """
+    Short-lived token that only opens the dashboard stream. EventSource
+    cannot send headers, so it goes in the URL (and in access logs),
+    unlike the access token.
+    """
+    return create_access_token(
+        {"sub": user.email, "user_id": user.id, "scope": STREAM_SCOPE},
+        timedelta(seconds=settings.SSE_TOKEN_EXPIRE_SECONDS)
+    )
+
+
+def decode_token(token: str, scope: Optional[str] = None) -> Optional[TokenData]:
+    """Decode and validate JWT token (access tokens have no scope)"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        if payload.get("scope") != scope:
+            return None
         email: str = payload.get("sub")
         user_id: int = payload.get("user_id")
         if email is None:
@@ -59,18 +75,14 @@ def decode_token(token: str) -> Optional[TokenData]:
         return None
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Usuario:
-    """Get current authenticated user from token"""
+def _user_from_token(token: str, db: Session, scope: Optional[str] = None) -> Usuario:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciais inválidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token_data = decode_token(token)
+    token_data = decode_token(token, scope)
     if token_data is None:
         raise credentials_exception
     
@@ -85,6 +97,22 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Usuario:
+    """Get current authenticated user from token"""
+    return _user_from_token(token, db)
+
+
+async def get_stream_user(
+    token: str = Query(..., description="Token de stream (POST /api/dashboard/stream-token)"),
+    db: Session = Depends(get_db)
+) -> Usuario:
+    """Get current user from a stream token in the query string (EventSource sends no headers)"""
+    return _user_from_token(token, db, STREAM_SCOPE)
+
+
 async def get_current_active_user(
     current_user: Usuario = Depends(get_current_user)
 ) -> Usuario:
@@ -14,6 +14,9 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./calibracore.db"
+    # SQLite: how long a writer waits for another process's lock (server,
+    # processar_alertas.py) before "database is locked"
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
     
     # Security
     SECRET_KEY: str = "calibracore-secret-key-change-in-production-2024"
@@ -28,10 +31,103 @@ class Settings(BaseSettings):
     SMTP_FROM_EMAIL: str = "noreply@calibracore.lab"
     SMTP_FROM_NAME: str = "CalibraCore Lab"
     SMTP_TLS: bool = True
+    SMTP_POOL_SIZE: int = 5  # Persistent connections per SMTP account
+    SMTP_POOL_MAX_MESSAGES: int = 100  # Recycle a connection after this many messages
+    SMTP_POOL_IDLE_SECONDS: float = 30.0  # NOOP health check before reusing older connections
     
+    # Twilio (WhatsApp)
+    TWILIO_SID: str = ""
+    TWILIO_AUTH_TOKEN: str = ""
+    TWILIO_WHATSAPP_NUMBER: str = ""  # e.g. whatsapp:+14155238886
+
     # Alert Recipients (comma-separated emails)
     ALERT_RECIPIENTS: str = ""
     
+    # Alert dispatch
+    ALERT_SEND_CONCURRENCY: int = 10  # Simultaneous sends within a channel batch
+    ALERT_SEND_TIMEOUT_SECONDS: float = 30.0
+    # Recipients that get one daily digest instead of one e-mail per
+    # equipment (comma-separated, or "*" for everyone)
+    ALERT_DIGEST_RECIPIENTS: str = ""
+
+    # Default alert schedule (regras_alerta overrides it per category/laboratory):
+    # first alert, reminders every N days, then urgent alerts on multiples of
+    # N days before expiration, then reminders after expiration
+    ALERT_INITIAL_DAYS: int = 60
+    ALERT_REMINDER_INTERVAL_DAYS: int = 15
+    ALERT_URGENT_DAYS: int = 30
+    ALERT_URGENT_INTERVAL_DAYS: int = 7
+    ALERT_OVERDUE_INTERVAL_DAYS: int = 7
+
+    # Built-in daily alert scheduler (one leader across workers via a DB lease)
+    SCHEDULER_ENABLED: bool = True
+    ALERT_SCHEDULE_TIME: str = "08:00"  # Local time, HH:MM
+    SCHEDULER_LEASE_SECONDS: int = 600  # Renewed while a run is in progress
+
+    # Alert history retention: older rows are rolled up into monthly
+    # summaries and moved to gzip JSONL files (0 = keep forever)
+    ALERT_RETENTION_MONTHS: int = 12
+    ALERT_ARCHIVE_DIR: str = "arquivo/alertas"  # Relative to the working directory
+    ALERT_ARCHIVE_BATCH_SIZE: int = 1000
+
+    # Notification outbox (durable queue + retry worker)
+    OUTBOX_WORKER_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_SECONDS: float = 5.0
+    OUTBOX_MAX_TENTATIVAS: int = 6  # Attempts before a message is marked as failed
+    OUTBOX_BACKOFF_BASE_SECONDS: int = 30  # Doubles after each failed attempt
+    OUTBOX_BACKOFF_MAX_SECONDS: int = 3600
+    OUTBOX_LEASE_SECONDS: int = 300  # Claimed rows return to the queue if the worker dies
+    OUTBOX_RETENTION_DAYS: int = 30  # Sent, failed and cancelled rows are deleted after this
+
+    # Provider limits per channel (0 = unlimited). Over the daily quota,
+    # messages wait for the next day, most urgent alerts first. A per-minute
+    # rate also paces the inline drain of POST /api/alertas/processar, so
+    # only set it when the provider throttles
+    EMAIL_RATE_PER_MINUTE: int = 0
+    EMAIL_QUOTA_PER_DAY: int = 500  # Gmail SMTP daily sending limit
+    WHATSAPP_RATE_PER_MINUTE: int = 0
+    WHATSAPP_QUOTA_PER_DAY: int = 50  # Twilio WhatsApp sandbox
+
+    # Notification channels: each gets whole batches from the outbox
+    EMAIL_ENABLED: bool = True
+    EMAIL_BATCH_SIZE: int = 50
+    WHATSAPP_ENABLED: bool = True
+    WHATSAPP_BATCH_SIZE: int = 20
+    VOICE_ENABLED: bool = True
+    VOICE_BATCH_SIZE: int = 50
+    WEBHOOK_ENABLED: bool = False  # POSTs each batch as a JSON array
+    WEBHOOK_URL: str = ""
+    WEBHOOK_TOKEN: str = ""  # Sent as a Bearer token when set
+    WEBHOOK_BATCH_SIZE: int = 100
+    FILE_SINK_ENABLED: bool = False  # Appends notifications as JSON lines (development, tests)
+    FILE_SINK_PATH: str = "notificacoes.jsonl"
+    FILE_SINK_BATCH_SIZE: int = 500
+
+    # WhatsApp (Twilio REST API over a shared keep-alive HTTP client)
+    TWILIO_API_BASE_URL: str = "https://api.twilio.com"  # Point to a fake server in tests
+    WHATSAPP_TIMEOUT_SECONDS: float = 15.0
+    WHATSAPP_MAX_CONNECTIONS: int = 10  # Also caps simultaneous sends
+
+    # Voice alerts (pyttsx3, desktop build): one speaking thread
+    VOICE_QUEUE_SIZE: int = 100
+    VOICE_COALESCE_SECONDS: float = 2.0  # Alerts this close together are spoken as one summary
+    VOICE_RATE: int = 150
+    VOICE_ID: str = ""  # pyttsx3 voice id (empty = system default)
+    TTS_CACHE_DIR: str = "cache/tts"  # Rendered phrases for the browser, relative to the working directory
+    TTS_CACHE_MAX_MB: int = 200  # Least recently used files are removed past this size
+    TTS_TIMEOUT_SECONDS: float = 30.0
+
+    # Dashboard live stream (SSE)
+    SSE_HEARTBEAT_SECONDS: int = 15
+    SSE_BUFFER_SIZE: int = 100  # Events kept for Last-Event-ID resume
+    SSE_QUEUE_SIZE: int = 50  # Pending events per client before it is dropped
+    SSE_TOKEN_EXPIRE_SECONDS: int = 60  # Stream tokens only open /api/dashboard/stream
+    
+    # Expiration forecast
+    PREVISAO_INTERVALO_PADRAO_DIAS: int = 365  # Used when the last calibration is unknown
+    PREVISAO_INTERVALO_MINIMO_DIAS: int = 30
+    
     # Admin padrão
     ADMIN_EMAIL: str = "admin@calibracore.lab"
     ADMIN_PASSWORD: str = "admin123"
@@ -1,16 +1,19 @@
 """
 CalibraCore Lab - Database Configuration
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
 from app.config import settings
 
 # Create engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite specific
-)
+if settings.DATABASE_URL.startswith("sqlite"):
+    # timeout = busy timeout: wait for other processes' write locks
+    connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}
+else:
+    connect_args = {}
+engine = create_engine(settings.DATABASE_URL, connect_args=connect_args)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -19,6 +22,28 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def dias_entre(fim, inicio):
+    """
+    SQL expression for the number of days between two DATE expressions
+    (fim - inicio), for both SQLite and PostgreSQL
+    """
+    if engine.dialect.name == "postgresql":
+        return fim - inicio
+    return func.julianday(fim) - func.julianday(inicio)
+
+
+def insert_ignore(model, index_elements):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for the current dialect; combined with
+    RETURNING, only rows actually inserted come back
+    """
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -31,4 +56,30 @@ def get_db():
 def init_db():
     """Initialize database tables"""
     from app import models  # Import models to register them
+    from app.services.outbox import link_legacy_alert_ids
+    from app.services.regras_alerta import rename_legacy_alert_types
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    with engine.begin() as conn:
+        rename_legacy_alert_types(conn)
+        link_legacy_alert_ids(conn)
+
+
+def upgrade_schema():
+    """
+    Bring existing databases up to date with the models: create_all() only
+    creates missing tables, so add new nullable columns and new indexes here
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existentes = {c["name"] for c in inspector.get_columns(table.name)}
+            for coluna in table.columns:
+                if coluna.name not in existentes:
+                    tipo = coluna.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {coluna.name} {tipo}'))
+            for index in table.indexes:
+                # IF NOT EXISTS: reflection does not see expression indexes
+                conn.execute(CreateIndex(index, if_not_exists=True))
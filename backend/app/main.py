@@ -5,6 +5,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+import asyncio
 import os
 import logging
 
@@ -12,7 +13,14 @@ from app.config import settings
 from app.database import init_db, SessionLocal
 from app.models import Usuario, UserRole
 from app.auth import get_password_hash
-from app.routers import auth, equipamentos, usuarios, dashboard, alertas, audit
+from app.routers import auth, equipamentos, usuarios, dashboard, alertas, audit, voz
+from app.services.dashboard_stream import dashboard_broadcaster
+from app.services.smtp_pool import close_smtp_pools
+from app.services.whatsapp import close_whatsapp_clients
+from app.services.canais import close_channels
+from app.services.voz import voice_worker
+from app.services.outbox import outbox_worker
+from app.services.agendador import alert_scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -123,6 +131,32 @@ async def startup_event():
     finally:
         db.close()
 
+    # Live dashboard: midnight rollover pushes fresh counts to open screens
+    dashboard_broadcaster.start()
+
+    # Notification outbox: delivers queued alerts and retries failures
+    if settings.OUTBOX_WORKER_ENABLED:
+        outbox_worker.start()
+
+    # Daily alert run (only the lease holder executes it)
+    if settings.SCHEDULER_ENABLED:
+        alert_scheduler.start()
+
+    # Voice alerts: one thread owns the TTS engine
+    await asyncio.to_thread(voice_worker.start)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks"""
+    await dashboard_broadcaster.stop()
+    await alert_scheduler.stop()
+    await outbox_worker.stop()
+    await close_smtp_pools()
+    await close_whatsapp_clients()
+    await close_channels()
+    await asyncio.to_thread(voice_worker.stop)
+
 
 # Include routers
 app.include_router(auth.router)
@@ -131,6 +165,7 @@ app.include_router(usuarios.router)
 app.include_router(dashboard.router)
 app.include_router(alertas.router)
 app.include_router(audit.router)
+app.include_router(voz.router)
 
 
 # Serve frontend static files
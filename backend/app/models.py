@@ -3,7 +3,7 @@ CalibraCore Lab - Database Models
 """
 from datetime import datetime, date, timezone
 from enum import Enum as PyEnum
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Enum, Text, Index, func, literal_column
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -51,10 +51,11 @@ class Equipamento(Base):
     marca = Column(String(100), nullable=True)  # Ex: Solotest, Marte, Delta
     numero_certificado = Column(String(100), nullable=True)  # Ex: 82512-25
     numero_serie = Column(String(100), nullable=True)
-    laboratorio = Column(String(100), nullable=False)
+    laboratorio = Column(String(100), nullable=False, index=True)
     responsavel_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
     data_ultima_calibracao = Column(Date, nullable=True)
-    data_vencimento = Column(Date, nullable=False)
+    data_vencimento = Column(Date, nullable=False, index=True)
+    proxima_data_alerta = Column(Date, nullable=True, index=True)  # Next day an alert is due (NULL = not scheduled yet)
     observacoes = Column(Text, nullable=True)
     caminho_certificado = Column(String(500), nullable=True)  # Path to PDF file
     
@@ -70,6 +71,7 @@ class Equipamento(Base):
     # Relationships
     responsavel_usuario = relationship("Usuario", back_populates="equipamentos")
     alertas = relationship("AlertaEnviado", back_populates="equipamento")
+    calibracoes = relationship("Calibracao", back_populates="equipamento", order_by="Calibracao.data_calibracao")
     
     @property
     def status(self) -> EquipmentStatus:
@@ -100,17 +102,231 @@ class Equipamento(Base):
 class AlertaEnviado(Base):
     """Alert history tracking"""
     __tablename__ = "alertas_enviados"
+    __table_args__ = (
+        # One alert per equipment, type and day: concurrent runs cannot both send
+        Index("uq_alertas_enviados_dia", "equipamento_id", "tipo_alerta", "dia_envio", unique=True),
+        # History pages: keyset order (data_envio, id), overall and per filter
+        Index("ix_alertas_enviados_equipamento_data", "equipamento_id", "data_envio"),
+        Index("ix_alertas_enviados_data_id", "data_envio", "id"),
+        Index("ix_alertas_enviados_tipo_data", "tipo_alerta", "data_envio"),
+        Index("ix_alertas_enviados_sucesso_data", "sucesso", "data_envio"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     equipamento_id = Column(Integer, ForeignKey("equipamentos.id"), nullable=False)
-    tipo_alerta = Column(String(50), nullable=False)  # inicial_60, lembrete_15, urgente_7, vencido
+    tipo_alerta = Column(String(50), nullable=False)  # inicial, lembrete, urgente, vencido
     data_envio = Column(DateTime, default=datetime.utcnow)
-    destinatarios = Column(Text, nullable=True)  # JSON list of emails
+    dia_envio = Column(Date, nullable=True)  # Local day of the run (NULL on legacy rows)
+    destinatarios = Column(Text, nullable=True)  # Legacy JSON list of emails (now in alertas_destinatarios)
     sucesso = Column(Boolean, default=True)
     mensagem_erro = Column(Text, nullable=True)
     
     # Relationships
     equipamento = relationship("Equipamento", back_populates="alertas")
+
+
+# History order key: legacy rows without data_envio sort as the oldest. The
+# sentinel is a literal (in SQLite's DateTime text format) so the expression
+# index below matches the one in the history query
+ALERTA_ORDEM_ENVIO = func.coalesce(
+    AlertaEnviado.data_envio, literal_column("'1970-01-01 00:00:00.000000'")
+)
+Index("ix_alertas_enviados_ordem_id", ALERTA_ORDEM_ENVIO, AlertaEnviado.id)
+
+
+class Destinatario(Base):
+    """Interned recipient address, referenced by id from the alert history"""
+    __tablename__ = "destinatarios"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String(255), unique=True, nullable=False)
+
+
+class AlertaDestinatario(Base):
+    """Recipients of each sent alert"""
+    __tablename__ = "alertas_destinatarios"
+
+    alerta_id = Column(Integer, ForeignKey("alertas_enviados.id"), primary_key=True)
+    destinatario_id = Column(Integer, ForeignKey("destinatarios.id"), primary_key=True)
+
+
+class ResumoAlertaMensal(Base):
+    """
+    Monthly roll-up of alert history per equipment and alert type. Rows
+    older than the retention period are counted here and moved to the
+    compressed archive.
+    """
+    __tablename__ = "resumo_alertas_mensal"
+    __table_args__ = (
+        Index("uq_resumo_alertas_mensal", "equipamento_id", "mes", "tipo_alerta", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    equipamento_id = Column(Integer, ForeignKey("equipamentos.id"), nullable=False)
+    mes = Column(Date, nullable=False)  # First day of the month
+    tipo_alerta = Column(String(50), nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    sucessos = Column(Integer, default=0, nullable=False)
+    falhas = Column(Integer, default=0, nullable=False)
+    primeiro_envio = Column(DateTime, nullable=True)
+    ultimo_envio = Column(DateTime, nullable=True)
+
+
+class Calibracao(Base):
+    """
+    Append-only calibration history (one row per registered calibration).
+    A certificate uploaded after the calibration already has one appends a
+    correction row pointing at it (substitui_id) instead of editing it.
+    """
+    __tablename__ = "calibracoes"
+    __table_args__ = (
+        Index("ix_calibracoes_equipamento_data", "equipamento_id", "data_calibracao"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    equipamento_id = Column(Integer, ForeignKey("equipamentos.id"), nullable=False)
+    data_calibracao = Column(Date, nullable=False)
+    data_vencimento = Column(Date, nullable=False)
+    vencimento_anterior = Column(Date, nullable=True)  # Due date this calibration replaced
+    numero_certificado = Column(String(100), nullable=True)
+    hash_arquivo = Column(String(64), nullable=True)  # SHA-256 of the certificate PDF
+    substitui_id = Column(Integer, ForeignKey("calibracoes.id"), nullable=True)  # Correction row: same calibration, new certificate
+    registrado_por_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    equipamento = relationship("Equipamento", back_populates="calibracoes")
+    registrado_por = relationship("Usuario")
+
+
+class NotificacaoOutbox(Base):
+    """
+    Durable queue of notifications (e-mail, WhatsApp, voice). Rows are written
+    in the same transaction as the change that triggers them and delivered
+    by the outbox worker with retries.
+    """
+    __tablename__ = "notificacoes_outbox"
+    __table_args__ = (
+        Index("ix_notificacoes_outbox_fila", "status", "proxima_tentativa"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    chave = Column(String(255), unique=True, nullable=False)  # Idempotency key
+    canal = Column(String(20), nullable=False)  # email, whatsapp, voz
+    formato = Column(String(10), default="texto")  # texto, html
+    destinatarios = Column(Text, nullable=True)  # JSON list
+    assunto = Column(String(255), nullable=True)
+    corpo = Column(Text, nullable=False)
+    origem = Column(String(100), nullable=True, index=True)  # e.g. alertas:2025-01-31, equipamento:12
+    alerta_ids = Column(Text, nullable=True)  # JSON list of AlertaEnviado ids covered by this message
+    prioridade = Column(Integer, default=4, nullable=True)  # 0 = vencido ... 3 = inicial, 4 = other
+    status = Column(String(20), default="pendente", nullable=False)  # pendente, processando, erro, enviado, falhou, cancelado
+    tentativas = Column(Integer, default=0, nullable=False)
+    proxima_tentativa = Column(DateTime, default=datetime.utcnow)
+    bloqueado_ate = Column(DateTime, nullable=True)  # Lease while a worker is sending
+    token_lote = Column(String(32), nullable=True)
+    ultimo_erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    enviado_em = Column(DateTime, nullable=True)
+
+
+class NotificacaoAlerta(Base):
+    """
+    AlertaEnviado rows covered by an outbox message (a digest covers several),
+    so an outcome only re-evaluates the alerts of the messages just sent
+    """
+    __tablename__ = "notificacoes_alertas"
+    __table_args__ = (
+        Index("ix_notificacoes_alertas_alerta", "alerta_id"),
+    )
+
+    notificacao_id = Column(Integer, ForeignKey("notificacoes_outbox.id", ondelete="CASCADE"), primary_key=True)
+    alerta_id = Column(Integer, primary_key=True)  # No FK: archived alerts leave the table first
+
+
+class TarefaLease(Base):
+    """DB-backed lease so a background job runs on a single worker/instance"""
+    __tablename__ = "tarefas_lease"
+
+    nome = Column(String(50), primary_key=True)
+    dono = Column(String(100), nullable=True)  # host:pid:token:run of the holding run
+    expira_em = Column(DateTime, nullable=True)
+    atualizado_em = Column(DateTime, default=datetime.utcnow)
+
+
+class ExecucaoAlerta(Base):
+    """History of alert processing runs (scheduler, manual trigger, script)"""
+    __tablename__ = "execucoes_alertas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    origem = Column(String(20), nullable=False)  # agendador, manual, script
+    instancia = Column(String(100), nullable=True)
+    status = Column(String(20), default="executando", nullable=False)  # executando, sucesso, erro
+    iniciado_em = Column(DateTime, default=datetime.utcnow, index=True)
+    finalizado_em = Column(DateTime, nullable=True)
+    duracao_ms = Column(Integer, nullable=True)
+    processados = Column(Integer, nullable=True)
+    alertas_enviados = Column(Integer, nullable=True)
+    erros = Column(Integer, nullable=True)
+    mensagem_erro = Column(Text, nullable=True)
+    fases = Column(Text, nullable=True)  # JSON {phase: ms}
+    latencias = Column(Text, nullable=True)  # JSON {channel: {envios, falhas, p50_ms, p95_ms, p99_ms, max_ms}}
+
+
+class ExecucaoAlertaItem(Base):
+    """Outcome of one equipment in an alert run (paged instead of returned whole)"""
+    __tablename__ = "execucoes_alertas_itens"
+    __table_args__ = (
+        Index("ix_execucoes_alertas_itens_execucao", "execucao_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    execucao_id = Column(Integer, ForeignKey("execucoes_alertas.id", ondelete="CASCADE"), nullable=False)
+    equipamento_codigo = Column(String(50), nullable=False)
+    tipo_alerta = Column(String(50), nullable=True)
+    status = Column(String(20), nullable=False)  # enviado, erro, sem_destinatarios
+    destinatarios = Column(Text, nullable=True)  # JSON list of emails
+    mensagem_erro = Column(Text, nullable=True)
+
+
+class RegraAlerta(Base):
+    """
+    Alert schedule for a category and/or laboratory. The most specific rule
+    wins (categoria + laboratorio, then categoria, then laboratorio, then
+    one with neither); equipment without a rule follows the ALERT_* settings.
+    """
+    __tablename__ = "regras_alerta"
+    __table_args__ = (
+        Index("uq_regras_alerta_escopo", "categoria", "laboratorio", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    categoria = Column(String(100), nullable=True)
+    laboratorio = Column(String(100), nullable=True)
+    dias_inicial = Column(Integer, nullable=False)  # First alert, days before expiration
+    intervalo_lembrete = Column(Integer, nullable=False)  # Reminders after the first one, until dias_urgente
+    dias_urgente = Column(Integer, nullable=False)  # Urgent alerts from this many days before expiration
+    intervalo_urgente = Column(Integer, nullable=False)  # Urgent alerts on multiples of this many days
+    intervalo_vencido = Column(Integer, nullable=False)  # Reminders after expiration
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CheckpointAlerta(Base):
+    """A shard of a sharded alert run that finished (committed with its alerts)"""
+    __tablename__ = "checkpoints_alertas"
+    __table_args__ = (
+        Index("uq_checkpoints_alertas_shard", "dia", "shard", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    dia = Column(Date, nullable=False)  # Local day of the run
+    shard = Column(String(150), nullable=False)  # laboratorio:<name> or ids:<first>-<last>
+    processados = Column(Integer, nullable=True)
+    alertas = Column(Integer, nullable=True)
+    concluido_em = Column(DateTime, default=datetime.utcnow)
+
+
 class AuditLog(Base):
     """Audit log for tracking create, update, delete actions on models"""
     __tablename__ = "audit_logs"
@@ -1,61 +1,345 @@
 """
 CalibraCore Lab - Alerts Router
 """
-from typing import Optional, List
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Optional, List, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app.auth import get_current_user, require_admin
-from app.models import AlertaEnviado, Equipamento, Usuario
-from app.schemas import AlertaResponse, ProcessarAlertasResponse
-from app.services.alerta_service import process_alerts
+from app.models import (
+    ALERTA_ORDEM_ENVIO, AlertaEnviado, Equipamento, ExecucaoAlerta, ExecucaoAlertaItem, NotificacaoOutbox, RegraAlerta, Usuario
+)
+from app.schemas import (
+    AlertaHistoricoResponse, ExecucaoAlertaItensResponse, ExecucaoAlertaResponse,
+    FilaNotificacoesResponse, ProcessarAlertasResponse, RegraAlertaCreate, RegraAlertaResponse,
+    RegraAlertaUpdate, SimulacaoResponse
+)
+from app.services.agendador import run_alert_job
+from app.services.alerta_service import reschedule_alerts
+from app.services.audit import log_action
+from app.services.regras_alerta import Regra, alert_rules, invalidate_alert_rules, scope_filter
+from app.services.retencao import recipients_by_alert
+from app.services.simulacao import simular_alertas
 
 router = APIRouter(prefix="/api/alertas", tags=["Alertas"])
 
 
 @router.post("/processar", response_model=ProcessarAlertasResponse)
 async def processar_alertas(
-    db: Session = Depends(get_db),
     current_user: Usuario = Depends(require_admin)
 ):
     """
-    Process all equipment and send calibration alerts
-    This endpoint should be called daily (via cron/scheduler)
+    Process all equipment and send calibration alerts now.
+    Runs daily on its own (built-in scheduler); shares its lock, so it
+    fails with 409 while another run is in progress. Per-equipment outcomes
+    are paged from /execucoes/{execucao_id}/itens.
     """
-    result = await process_alerts(db)
+    result = await run_alert_job("manual")
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Processamento de alertas já em execução"
+        )
     return result
 
 
-@router.get("/historico", response_model=List[AlertaResponse])
+@router.get("/execucoes", response_model=List[ExecucaoAlertaResponse])
+async def listar_execucoes(
+    limit: int = Query(30, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    History of alert processing runs (most recent first)
+    """
+    return db.query(ExecucaoAlerta).order_by(ExecucaoAlerta.iniciado_em.desc()).limit(limit).all()
+
+
+@router.get("/execucoes/{execucao_id}/itens", response_model=ExecucaoAlertaItensResponse)
+async def listar_itens_execucao(
+    execucao_id: int,
+    status_item: Optional[str] = Query(None, alias="status"),
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Per-equipment outcomes of a run (enviado, erro, sem_destinatarios),
+    keyset-paginated on id: pass `proximo_cursor` back as `cursor`
+    """
+    if not db.query(ExecucaoAlerta.id).filter(ExecucaoAlerta.id == execucao_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Execução não encontrada")
+    
+    query = db.query(ExecucaoAlertaItem).filter(ExecucaoAlertaItem.execucao_id == execucao_id)
+    if status_item:
+        query = query.filter(ExecucaoAlertaItem.status == status_item)
+    if cursor:
+        query = query.filter(ExecucaoAlertaItem.id > cursor)
+    rows = query.order_by(ExecucaoAlertaItem.id).limit(limit + 1).all()
+    
+    pagina = rows[:limit]
+    return {
+        "items": pagina,
+        "proximo_cursor": pagina[-1].id if len(rows) > limit else None
+    }
+
+
+@router.get("/notificacoes", response_model=FilaNotificacoesResponse)
+async def fila_notificacoes(
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    State of the background notification queue (outbox): totals per channel
+    and status, plus the most recent failures (being retried or given up)
+    """
+    por_canal = {}
+    for canal, status_fila, total in db.query(
+        NotificacaoOutbox.canal, NotificacaoOutbox.status, func.count(NotificacaoOutbox.id)
+    ).group_by(NotificacaoOutbox.canal, NotificacaoOutbox.status):
+        por_canal.setdefault(canal, {})[status_fila] = total
+    
+    falhas = db.query(NotificacaoOutbox).filter(
+        NotificacaoOutbox.status.in_(["erro", "falhou"])
+    ).order_by(NotificacaoOutbox.id.desc()).limit(limit).all()
+    return {"por_canal": por_canal, "falhas": falhas}
+
+
+def _validar_regra(regra: RegraAlerta) -> None:
+    try:
+        Regra(
+            regra.dias_inicial,
+            regra.intervalo_lembrete,
+            regra.dias_urgente,
+            regra.intervalo_urgente,
+            regra.intervalo_vencido
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _escopo_livre(db: Session, regra: RegraAlerta) -> None:
+    existente = db.query(RegraAlerta.id).filter(
+        RegraAlerta.id != regra.id,
+        RegraAlerta.categoria.is_(None) if regra.categoria is None else RegraAlerta.categoria == regra.categoria,
+        RegraAlerta.laboratorio.is_(None) if regra.laboratorio is None else RegraAlerta.laboratorio == regra.laboratorio
+    ).first()
+    if existente:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe uma regra para esta categoria e laboratório"
+        )
+
+
+def _reagendar(db: Session, *escopos) -> int:
+    """Reschedule the equipment of the changed scopes under the new rules (does not commit)"""
+    db.flush()
+    invalidate_alert_rules()
+    return reschedule_alerts(db, alert_rules(db), or_(*(scope_filter(*escopo) for escopo in escopos)))
+
+
+def _resposta_regra(regra: RegraAlerta, reagendados: int) -> dict:
+    return {**RegraAlertaResponse.model_validate(regra).model_dump(), "equipamentos_reagendados": reagendados}
+
+
+@router.get("/regras", response_model=List[RegraAlertaResponse])
+async def listar_regras(
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Alert rules per category and/or laboratory. The most specific rule
+    applies; equipment without one follows the default schedule.
+    """
+    return db.query(RegraAlerta).order_by(RegraAlerta.categoria, RegraAlerta.laboratorio).all()
+
+
+@router.post("/regras", response_model=RegraAlertaResponse, status_code=status.HTTP_201_CREATED)
+async def criar_regra(
+    dados: RegraAlertaCreate,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Create an alert rule; the equipment it covers is rescheduled at once
+    """
+    regra = RegraAlerta(**dados.model_dump())
+    _validar_regra(regra)
+    _escopo_livre(db, regra)
+    db.add(regra)
+    reagendados = _reagendar(db, (regra.categoria, regra.laboratorio))
+    log_action(db, current_user.id, "CREATE", "regras_alerta", regra.id, dados.model_dump(), commit=False)
+    db.commit()
+    invalidate_alert_rules()
+    db.refresh(regra)
+    return _resposta_regra(regra, reagendados)
+
+
+@router.put("/regras/{regra_id}", response_model=RegraAlertaResponse)
+async def atualizar_regra(
+    regra_id: int,
+    dados: RegraAlertaUpdate,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Update an alert rule; equipment under its old and new scope is rescheduled
+    """
+    regra = db.query(RegraAlerta).filter(RegraAlerta.id == regra_id).first()
+    if not regra:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Regra não encontrada")
+    
+    escopo_anterior = (regra.categoria, regra.laboratorio)
+    update_data = dados.model_dump(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(regra, field, value)
+    _validar_regra(regra)
+    _escopo_livre(db, regra)
+    reagendados = _reagendar(db, escopo_anterior, (regra.categoria, regra.laboratorio))
+    log_action(db, current_user.id, "UPDATE", "regras_alerta", regra.id, update_data, commit=False)
+    db.commit()
+    invalidate_alert_rules()
+    db.refresh(regra)
+    return _resposta_regra(regra, reagendados)
+
+
+@router.delete("/regras/{regra_id}")
+async def deletar_regra(
+    regra_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Delete an alert rule; its equipment falls back to the next matching rule
+    """
+    regra = db.query(RegraAlerta).filter(RegraAlerta.id == regra_id).first()
+    if not regra:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Regra não encontrada")
+    
+    db.delete(regra)
+    reagendados = _reagendar(db, (regra.categoria, regra.laboratorio))
+    log_action(db, current_user.id, "DELETE", "regras_alerta", regra_id, None, commit=False)
+    db.commit()
+    invalidate_alert_rules()
+    return {"message": "Regra removida com sucesso", "equipamentos_reagendados": reagendados}
+
+
+def _simular_em_sessao_propria(inicio: date, fim: date, amostras: int) -> dict:
+    """Sessions are not thread-safe: the worker thread opens its own"""
+    db = SessionLocal()
+    try:
+        return simular_alertas(db, inicio, fim, amostras)
+    finally:
+        db.close()
+
+
+@router.get("/simulacao", response_model=SimulacaoResponse)
+async def simular(
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    amostras: int = Query(1, ge=0, le=10),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Dry run of the alert rules from `inicio` to `fim` (default: next 90 days):
+    alerts and e-mails per day and per recipient, plus sample messages.
+    Nothing is sent or recorded.
+    """
+    inicio = inicio or date.today()
+    fim = fim or inicio + timedelta(days=89)
+    if fim < inicio:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Data final anterior à inicial")
+    if (fim - inicio).days >= 731:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Período máximo de simulação: 2 anos")
+    return await asyncio.to_thread(_simular_em_sessao_propria, inicio, fim, amostras)
+
+
+def _encode_cursor(data_envio: datetime, alerta_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{data_envio.isoformat()}|{alerta_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        data_envio, alerta_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(data_envio), int(alerta_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+
+@router.get("/historico", response_model=AlertaHistoricoResponse)
 async def listar_historico_alertas(
     equipamento_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    tipo_alerta: Optional[str] = None,
+    sucesso: Optional[bool] = None,
+    laboratorio: Optional[str] = None,
+    cursor: Optional[str] = None,
     limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Get alert history
+    Get alert history, newest first. Keyset-paginated on (data_envio, id),
+    rows without data_envio last:
+    pass `proximo_cursor` back as `cursor` for the next page; every page
+    costs the same two indexed queries (alerts, recipients) regardless of depth.
     """
-    query = db.query(AlertaEnviado).order_by(AlertaEnviado.data_envio.desc())
+    query = db.query(
+        AlertaEnviado, Equipamento.codigo_interno, Equipamento.descricao
+    ).outerjoin(Equipamento, Equipamento.id == AlertaEnviado.equipamento_id)
     
     if equipamento_id:
         query = query.filter(AlertaEnviado.equipamento_id == equipamento_id)
+    if data_inicio:
+        query = query.filter(AlertaEnviado.data_envio >= datetime.combine(data_inicio, time.min))
+    if data_fim:
+        query = query.filter(AlertaEnviado.data_envio < datetime.combine(data_fim + timedelta(days=1), time.min))
+    if tipo_alerta:
+        query = query.filter(AlertaEnviado.tipo_alerta == tipo_alerta)
+    if sucesso is not None:
+        query = query.filter(AlertaEnviado.sucesso == sucesso)
+    if laboratorio:
+        query = query.filter(Equipamento.laboratorio == laboratorio)
+    if cursor:
+        data_envio, alerta_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            ALERTA_ORDEM_ENVIO < data_envio,
+            and_(ALERTA_ORDEM_ENVIO == data_envio, AlertaEnviado.id < alerta_id)
+        ))
     
-    alertas = query.limit(limit).all()
+    rows = query.add_columns(ALERTA_ORDEM_ENVIO).order_by(
+        ALERTA_ORDEM_ENVIO.desc(), AlertaEnviado.id.desc()
+    ).limit(limit + 1).all()
     
-    result = []
-    for alerta in alertas:
-        eq = db.query(Equipamento).filter(Equipamento.id == alerta.equipamento_id).first()
-        result.append({
+    pagina = rows[:limit]
+    destinatarios = recipients_by_alert(db, [alerta.id for alerta, _, _, _ in pagina])
+    items = [
+        {
             "id": alerta.id,
             "equipamento_id": alerta.equipamento_id,
-            "equipamento_codigo": eq.codigo_interno if eq else None,
-            "equipamento_descricao": eq.descricao if eq else None,
+            "equipamento_codigo": codigo,
+            "equipamento_descricao": descricao,
             "tipo_alerta": alerta.tipo_alerta,
             "data_envio": alerta.data_envio,
-            "destinatarios": alerta.destinatarios,
+            # Legacy rows keep the JSON list until the retention job normalizes them
+            "destinatarios": json.dumps(destinatarios[alerta.id]) if alerta.id in destinatarios else alerta.destinatarios,
             "sucesso": alerta.sucesso
-        })
+        }
+        for alerta, codigo, descricao, _ in pagina
+    ]
     
-    return result
+    proximo_cursor = None
+    if len(rows) > limit:
+        ultimo, _, _, ordem = rows[limit - 1]
+        proximo_cursor = _encode_cursor(ordem, ultimo.id)
+    
+    return {"items": items, "proximo_cursor": proximo_cursor}
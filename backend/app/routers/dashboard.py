@@ -1,14 +1,20 @@
 """
 CalibraCore Lab - Dashboard Router
 """
-from fastapi import APIRouter, Depends
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import date
 
+from app.config import settings
 from app.database import get_db
-from app.auth import get_current_user
+from app.auth import create_stream_token, get_current_user, get_stream_user
 from app.models import Equipamento, Usuario, EquipmentStatus
-from app.schemas import DashboardResumo
+from app.schemas import DashboardResumo, PrevisaoResponse, CalibracaoEstatistica, StreamToken
+from app.services.dashboard_stream import dashboard_broadcaster, calcular_resumo, format_sse
+from app.services.previsao import calcular_previsao
+from app.services.calibracao import estatisticas_por_categoria
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
@@ -21,34 +27,82 @@ async def obter_resumo(
     """
     Get dashboard summary with equipment counts by status
     """
-    # Get all active equipment
-    equipamentos = db.query(Equipamento).filter(Equipamento.ativo == True).all()
-    
-    # Count by status
-    total = len(equipamentos)
-    em_dia = 0
-    vence_60_dias = 0
-    vence_30_dias = 0
-    vencidos = 0
-    
-    for eq in equipamentos:
-        status = eq.status
-        if status == EquipmentStatus.EM_DIA:
-            em_dia += 1
-        elif status == EquipmentStatus.PROXIMO_60:
-            vence_60_dias += 1
-        elif status == EquipmentStatus.PROXIMO_30:
-            vence_30_dias += 1
-        elif status == EquipmentStatus.VENCIDO:
-            vencidos += 1
-    
-    return {
-        "total": total,
-        "em_dia": em_dia,
-        "vence_60_dias": vence_60_dias,
-        "vence_30_dias": vence_30_dias,
-        "vencidos": vencidos
-    }
+    return calcular_resumo(db)
+
+
+@router.get("/previsao", response_model=PrevisaoResponse)
+async def obter_previsao(
+    semanas: int = Query(52, ge=1, le=104),
+    laboratorio: Optional[str] = None,
+    categoria: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Forecast how many instruments expire per week, per laboratory and
+    category, projecting each instrument's calibration interval forward
+    """
+    return calcular_previsao(db, semanas=semanas, laboratorio=laboratorio, categoria=categoria)
+
+
+@router.post("/stream-token", response_model=StreamToken)
+async def obter_token_stream(
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Short-lived token for /stream: it goes in the EventSource URL, so the
+    access token never does
+    """
+    return {"token": create_stream_token(current_user), "expira_em": settings.SSE_TOKEN_EXPIRE_SECONDS}
+
+
+@router.get("/stream")
+async def stream_dashboard(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: Usuario = Depends(get_stream_user)
+):
+    """
+    Live dashboard updates via Server-Sent Events.
+    Sends a full `resumo` on connect and `delta` events with changed counts
+    afterwards. Reconnecting clients resume from Last-Event-ID.
+    Authenticated with a token from /stream-token (`?token=`).
+    """
+    queue = dashboard_broadcaster.subscribe()
+
+    async def event_stream():
+        try:
+            eventos = None
+            if last_event_id and last_event_id.isdigit():
+                eventos = dashboard_broadcaster.events_since(int(last_event_id))
+
+            if eventos is None:
+                resumo = await dashboard_broadcaster.snapshot()
+                yield format_sse("resumo", resumo, dashboard_broadcaster.last_id)
+            else:
+                for event_id, event, data in eventos:
+                    yield format_sse(event, data, event_id)
+
+            yield f"retry: {settings.SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+
+            while True:
+                try:
+                    event_id, event, data = await asyncio.wait_for(
+                        queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS
+                    )
+                    yield format_sse(event, data, event_id)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected() or not dashboard_broadcaster.is_subscribed(queue):
+                        break
+                    yield ": heartbeat\n\n"
+        finally:
+            dashboard_broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/laboratorios-stats")
@@ -86,3 +140,16 @@ async def obter_stats_por_laboratorio(
             lab_stats[lab]["vencidos"] += 1
     
     return lab_stats
+
+
+@router.get("/calibracoes-stats", response_model=List[CalibracaoEstatistica])
+async def obter_stats_calibracoes(
+    laboratorio: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Get calibration history statistics per category
+    (average interval, late calibrations and average lateness)
+    """
+    return estatisticas_por_categoria(db, laboratorio=laboratorio)
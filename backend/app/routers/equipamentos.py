@@ -1,14 +1,18 @@
 """
 CalibraCore Lab - Equipment Router
 """
+import asyncio
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from app.services.audit import log_action
-from app.services.notification import alert_expiration
+from app.services.outbox import cancel_pending, enqueue_equipment_notification, enqueue_expiration_alert, outbox_worker
+from app.services.dashboard_stream import dashboard_broadcaster
+from app.services.calibracao import registrar_certificado, registrar_historico, salvar_certificado
+from app.services.alerta_service import schedule_next_alert
+from app.services.regras_alerta import alert_rules
 from app.auth import require_admin
 from fastapi.responses import StreamingResponse, FileResponse
 import os
-import shutil
 from uuid import uuid4
 from app.services.export import generate_excel_report, generate_pdf_report
 from sqlalchemy.orm import Session
@@ -17,12 +21,13 @@ from datetime import date
 
 from app.database import get_db
 from app.auth import get_current_user
-from app.models import Equipamento, Usuario, EquipmentStatus
+from app.models import Equipamento, Usuario, EquipmentStatus, Calibracao
 from app.schemas import (
     EquipamentoCreate,
     EquipamentoUpdate,
     EquipamentoResponse,
-    EquipamentoListResponse
+    EquipamentoListResponse,
+    CalibracaoResponse
 )
 
 router = APIRouter(prefix="/api/equipamentos", tags=["Equipamentos"])
@@ -160,6 +165,36 @@ async def obter_equipamento(
     return equipamento_to_response(equipamento)
 
 
+@router.get("/{equipamento_id}/calibracoes", response_model=List[CalibracaoResponse])
+async def listar_calibracoes(
+    equipamento_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Get calibration history for equipment (most recent first)
+    """
+    existe = db.query(Equipamento.id).filter(Equipamento.id == equipamento_id).first()
+    if not existe:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Equipamento não encontrado"
+        )
+
+    rows = db.query(Calibracao, Usuario.nome).outerjoin(
+        Usuario, Usuario.id == Calibracao.registrado_por_id
+    ).filter(
+        Calibracao.equipamento_id == equipamento_id
+    ).order_by(Calibracao.data_calibracao.desc(), Calibracao.id.desc()).all()
+
+    result = []
+    for calibracao, nome in rows:
+        item = CalibracaoResponse.model_validate(calibracao)
+        item.registrado_por_nome = nome
+        result.append(item)
+    return result
+
+
 @router.post("", response_model=EquipamentoResponse, status_code=status.HTTP_201_CREATED)
 async def criar_equipamento(
     equipamento: EquipamentoCreate,
@@ -196,30 +231,22 @@ async def criar_equipamento(
         notificar_automaticamente=equipamento.notificar_automaticamente
     )
     
+    schedule_next_alert(db_equipamento, plano=alert_rules(db))
     db.add(db_equipamento)
-    db.commit()
-    db.refresh(db_equipamento)
-    # Audit log for creation
+    db.flush()
+    # Queue alerts and the audit entry in the same transaction: the request
+    # ends at this commit and the outbox worker delivers in the background
+    if db_equipamento.notificar_automaticamente:
+        enqueue_expiration_alert(db, db_equipamento, "criacao")
     log_action(db, current_user.id, "CREATE", "equipamentos", db_equipamento.id, {
         "codigo_interno": db_equipamento.codigo_interno,
         "descricao": db_equipamento.descricao,
-    })
-    # Determine recipients
-    emails = ["admin@example.com"]
-    whatsapps = ["whatsapp:+1234567890"]
-    
-    if db_equipamento.email_contato:
-        emails.append(db_equipamento.email_contato)
-    if db_equipamento.telefone_contato:
-        # Ensure 'whatsapp:' prefix if using Twilio
-        num = db_equipamento.telefone_contato
-        if not num.startswith("whatsapp:"):
-            num = f"whatsapp:{num}"
-        whatsapps.append(num)
-
-    # Send alerts after creation
-    if db_equipamento.notificar_automaticamente:
-        await alert_expiration(db_equipamento, emails, whatsapps)
+    }, commit=False)
+
+    db.commit()
+    db.refresh(db_equipamento)
+    outbox_worker.wake()
+    dashboard_broadcaster.notify("equipamento")
 
     return equipamento_to_response(db_equipamento)
 
@@ -256,26 +283,20 @@ async def atualizar_equipamento(
     update_data = equipamento.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_equipamento, field, value)
+    # Category and laboratory select the alert rule
+    if update_data.keys() & {"data_vencimento", "ativo", "categoria", "laboratorio"}:
+        schedule_next_alert(db_equipamento, plano=alert_rules(db))
+
+    # Queue alerts and the audit entry (changed fields) in the same
+    # transaction; the outbox worker delivers in the background
+    if db_equipamento.notificar_automaticamente:
+        enqueue_expiration_alert(db, db_equipamento, "atualizacao")
+    log_action(db, current_user.id, "UPDATE", "equipamentos", db_equipamento.id, update_data, commit=False)
 
     db.commit()
     db.refresh(db_equipamento)
-    # Audit log for update (capture changed fields)
-    log_action(db, current_user.id, "UPDATE", "equipamentos", db_equipamento.id, update_data)
-    # Determine recipients
-    emails = ["admin@example.com"]
-    whatsapps = ["whatsapp:+1234567890"]
-    
-    if db_equipamento.email_contato:
-        emails.append(db_equipamento.email_contato)
-    if db_equipamento.telefone_contato:
-        num = db_equipamento.telefone_contato
-        if not num.startswith("whatsapp:"):
-            num = f"whatsapp:{num}"
-        whatsapps.append(num)
-
-    # Send alerts after update
-    if db_equipamento.notificar_automaticamente:
-        await alert_expiration(db_equipamento, emails, whatsapps)
+    outbox_worker.wake()
+    dashboard_broadcaster.notify("equipamento")
 
     return equipamento_to_response(db_equipamento)
 
@@ -297,11 +318,12 @@ async def deletar_equipamento(
         )
     
     db_equipamento.ativo = False
+    # Inactive equipment gets no alerts: nothing is queued, and alerts
+    # still waiting in the outbox are dropped
+    cancel_pending(db, f"equipamento:{db_equipamento.id}")
+    log_action(db, current_user.id, "DELETE", "equipamentos", db_equipamento.id, None, commit=False)
     db.commit()
-    # Audit log for delete (soft)
-    log_action(db, current_user.id, "DELETE", "equipamentos", db_equipamento.id, None)
-    # Send alert for deletion if needed (optional)
-    await alert_expiration(db_equipamento, ["admin@example.com"], ["whatsapp:+1234567890"])
+    dashboard_broadcaster.notify("equipamento")
 
     return {"message": "Equipamento desativado com sucesso"}
 
@@ -311,11 +333,12 @@ async def registrar_calibracao(
     equipamento_id: int,
     data_calibracao: date,
     data_novo_vencimento: date,
+    numero_certificado: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Register a new calibration for equipment
+    Register a new calibration for equipment (also appended to its history)
     """
     db_equipamento = db.query(Equipamento).filter(Equipamento.id == equipamento_id).first()
     if not db_equipamento:
@@ -324,11 +347,25 @@ async def registrar_calibracao(
             detail="Equipamento não encontrado"
         )
     
+    registrar_historico(
+        db,
+        db_equipamento,
+        data_calibracao=data_calibracao,
+        data_vencimento=data_novo_vencimento,
+        numero_certificado=numero_certificado,
+        usuario_id=current_user.id,
+        vencimento_anterior=db_equipamento.data_vencimento
+    )
+    
+    if numero_certificado:
+        db_equipamento.numero_certificado = numero_certificado
     db_equipamento.data_ultima_calibracao = data_calibracao
     db_equipamento.data_vencimento = data_novo_vencimento
+    schedule_next_alert(db_equipamento, plano=alert_rules(db))
     
     db.commit()
     db.refresh(db_equipamento)
+    dashboard_broadcaster.notify("calibracao")
     
     return equipamento_to_response(db_equipamento)
 
@@ -472,9 +509,8 @@ async def upload_comprovante(
         
         logger.info(f"Salvando certificado em: {file_path}")
         
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save and hash the file off the event loop
+        hash_certificado = await asyncio.to_thread(salvar_certificado, file.file, file_path)
             
         # Remove old file if exists
         if db_equipamento.caminho_certificado and os.path.exists(db_equipamento.caminho_certificado):
@@ -484,8 +520,9 @@ async def upload_comprovante(
             except Exception as e:
                 logger.error(f"Erro ao remover certificado antigo: {e}")
                 
-        # Update DB
+        # Update DB; the history keeps the hash of each calibration's certificate
         db_equipamento.caminho_certificado = file_path
+        registrar_certificado(db, db_equipamento, hash_certificado, current_user.id)
         
         db.commit()
         db.refresh(db_equipamento)
@@ -542,51 +579,16 @@ async def enviar_alerta_manual(
     if not db_equipamento:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
     
-    # Determine recipients
-    admin_email = os.getenv("ADMIN_EMAIL", "admin@calibracore.lab")
-    alert_recipients = os.getenv("ALERT_RECIPIENTS", "")
-    
-    emails = [admin_email]
-    if alert_recipients:
-        emails.extend([e.strip() for e in alert_recipients.split(",") if e.strip()])
-        
-    whatsapps = []
-    
-    if db_equipamento.email_contato:
-        emails.append(db_equipamento.email_contato)
-    
-    if db_equipamento.telefone_contato:
-        num = db_equipamento.telefone_contato
-        if not num.startswith("whatsapp:"):
-            num = f"whatsapp:{num}"
-        whatsapps.append(num)
-        
-    # Deduplicate emails
-    emails = list(set(emails))
-        
-    # Force alert regardless of date
-    # We call a simplified version or reuse alert_expiration but forcing a body
-    # Since alert_expiration logic depends on days, let's reuse it but maybe pass a flag?
-    # Or just construct message here. For simplicity, let's call alert_expiration.
-    # If the equipment is NOT expiring soon, alert_expiration currently returns None (does nothing).
-    # We should probably force a message.
-    
-    # Let's verify days first.
-    days = db_equipamento.dias_para_vencer
-    
-    if days > 60:
-         # Force a "Manual Reminder"
-        from app.services.notification import send_email, send_whatsapp
-        subject = f"🔔 [Manual] Lembrete de Equipamento: {db_equipamento.codigo_interno}"
-        body = f"Olá, este é um lembrete manual sobre o equipamento {db_equipamento.codigo_interno} ({db_equipamento.descricao}). Vencimento: {db_equipamento.data_vencimento}."
-        
-        await send_email(emails, subject, body)
-        for num in whatsapps:
-            await send_whatsapp(num, body)
-            
-        return {"message": "Alerta manual enviado com sucesso (Vencimento distante)"}
-    else:
-        # Use standard logic if it is already in warning period
-        await alert_expiration(db_equipamento, emails, whatsapps)
-        return {"message": "Alerta manual enviado com sucesso (Baseado no vencimento)"}
+    # Force alert regardless of date: the standard expiration alert once the
+    # equipment's rule is alerting, a "Manual Reminder" before its first alert
+    if enqueue_expiration_alert(db, db_equipamento, "manual"):
+        db.commit()
+        outbox_worker.wake()
+        return {"message": "Alerta manual enfileirado para envio (Baseado no vencimento)"}
 
+    subject = f"🔔 [Manual] Lembrete de Equipamento: {db_equipamento.codigo_interno}"
+    body = f"Olá, este é um lembrete manual sobre o equipamento {db_equipamento.codigo_interno} ({db_equipamento.descricao}). Vencimento: {db_equipamento.data_vencimento}."
+    enqueue_equipment_notification(db, db_equipamento, "manual", subject, body, voz=False)
+    db.commit()
+    outbox_worker.wake()
+    return {"message": "Alerta manual enfileirado para envio (Vencimento distante)"}
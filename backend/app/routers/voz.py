@@ -0,0 +1,48 @@
+"""
+CalibraCore Lab - Voice Router
+Server-rendered audio for the dashboard assistant
+"""
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from app.auth import get_current_user
+from app.models import Usuario
+from app.schemas import AudioRequest, AudioResponse
+from app.services.tts import TTSIndisponivel, tts_cache
+
+router = APIRouter(prefix="/api/voz", tags=["Voz"])
+
+
+@router.post("/audio", response_model=AudioResponse)
+async def gerar_audio(
+    dados: AudioRequest,
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Render a phrase to audio (cached on disk) and return its URL.
+    Fails with 503 when the server has no voice engine.
+    """
+    try:
+        chave = await tts_cache.render(dados.texto)
+    except TTSIndisponivel as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Tempo esgotado ao gerar o áudio")
+    return {"url": f"/api/voz/audio/{chave}.wav"}
+
+
+@router.get("/audio/{chave}.wav")
+async def obter_audio(chave: str):
+    """
+    Serve a rendered phrase. The URL is a hash of the content, so the
+    browser may cache it forever.
+    """
+    caminho = tts_cache.get(chave)
+    if caminho is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Áudio não encontrado")
+    return FileResponse(
+        caminho,
+        media_type="audio/wav",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
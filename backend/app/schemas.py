@@ -2,8 +2,9 @@
 CalibraCore Lab - Pydantic Schemas
 """
 from datetime import date, datetime
-from typing import Optional, List
-from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, Optional, List
+import json
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from enum import Enum
 
 
@@ -28,6 +29,11 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+class StreamToken(BaseModel):
+    token: str
+    expira_em: int  # Seconds
+
+
 class TokenData(BaseModel):
     email: Optional[str] = None
     user_id: Optional[int] = None
@@ -147,6 +153,31 @@ class EquipamentoListResponse(BaseModel):
     pages: int
 
 
+class CalibracaoResponse(BaseModel):
+    id: int
+    equipamento_id: int
+    data_calibracao: date
+    data_vencimento: date
+    vencimento_anterior: Optional[date] = None
+    numero_certificado: Optional[str] = None
+    hash_arquivo: Optional[str] = None
+    substitui_id: Optional[int] = None  # Set on rows that replace a calibration's certificate
+    registrado_por_id: Optional[int] = None
+    registrado_por_nome: Optional[str] = None
+    criado_em: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class CalibracaoEstatistica(BaseModel):
+    categoria: Optional[str] = None
+    calibracoes: int
+    intervalo_medio_dias: Optional[float] = None
+    calibracoes_atrasadas: int
+    atraso_medio_dias: Optional[float] = None
+
+
 # ============= Dashboard Schemas =============
 
 class DashboardResumo(BaseModel):
@@ -157,6 +188,22 @@ class DashboardResumo(BaseModel):
     vencidos: int
 
 
+class PrevisaoGrupo(BaseModel):
+    laboratorio: Optional[str] = None
+    categoria: Optional[str] = None
+    vencidos: int
+    total: int
+    por_semana: List[int]
+
+
+class PrevisaoResponse(BaseModel):
+    inicio: date
+    semanas: int
+    inicio_semanas: List[date]
+    total_por_semana: List[int]
+    grupos: List[PrevisaoGrupo]
+
+
 # ============= Alert Schemas =============
 
 class AlertaResponse(BaseModel):
@@ -165,7 +212,7 @@ class AlertaResponse(BaseModel):
     equipamento_codigo: Optional[str] = None
     equipamento_descricao: Optional[str] = None
     tipo_alerta: str
-    data_envio: datetime
+    data_envio: Optional[datetime] = None
     destinatarios: Optional[str]
     sucesso: bool
     
@@ -173,11 +220,171 @@ class AlertaResponse(BaseModel):
         from_attributes = True
 
 
+class AlertaHistoricoResponse(BaseModel):
+    items: List[AlertaResponse]
+    proximo_cursor: Optional[str] = None  # Pass as `cursor` to get the next page
+
+
+class LatenciaCanal(BaseModel):
+    envios: int
+    falhas: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
 class ProcessarAlertasResponse(BaseModel):
+    execucao_id: int
     processados: int
     alertas_enviados: int
     erros: int
-    detalhes: List[dict]
+    fases: Dict[str, float]  # ms per phase
+    latencias: Dict[str, LatenciaCanal]  # Per channel
+
+
+class SimulacaoDia(BaseModel):
+    data: date
+    alertas: int
+    emails: int
+    por_tipo: Dict[str, int]
+
+
+class SimulacaoDestinatario(BaseModel):
+    email: str
+    alertas: int
+    emails: int
+    resumo_diario: bool
+
+
+class SimulacaoMensagem(BaseModel):
+    data: date
+    equipamento_codigo: str
+    tipo_alerta: str
+    assunto: str
+    html: str
+
+
+class SimulacaoResponse(BaseModel):
+    inicio: date
+    fim: date
+    equipamentos: int
+    total_alertas: int
+    total_emails: int
+    por_tipo: Dict[str, int]
+    dias: List[SimulacaoDia]
+    destinatarios: List[SimulacaoDestinatario]
+    amostras: List[SimulacaoMensagem]
+
+
+class ExecucaoAlertaResponse(BaseModel):
+    id: int
+    origem: str
+    instancia: Optional[str] = None
+    status: str
+    iniciado_em: datetime
+    finalizado_em: Optional[datetime] = None
+    duracao_ms: Optional[int] = None
+    processados: Optional[int] = None
+    alertas_enviados: Optional[int] = None
+    erros: Optional[int] = None
+    mensagem_erro: Optional[str] = None
+    fases: Optional[Dict[str, float]] = None
+    latencias: Optional[Dict[str, LatenciaCanal]] = None
+    
+    @field_validator("fases", "latencias", mode="before")
+    @classmethod
+    def _json(cls, valor):
+        return json.loads(valor) if isinstance(valor, str) else valor
+    
+    class Config:
+        from_attributes = True
+
+
+class ExecucaoAlertaItemResponse(BaseModel):
+    id: int
+    equipamento_codigo: str
+    tipo_alerta: Optional[str] = None
+    status: str
+    destinatarios: Optional[List[str]] = None
+    mensagem_erro: Optional[str] = None
+    
+    @field_validator("destinatarios", mode="before")
+    @classmethod
+    def _json(cls, valor):
+        return json.loads(valor) if isinstance(valor, str) else valor
+    
+    class Config:
+        from_attributes = True
+
+
+class ExecucaoAlertaItensResponse(BaseModel):
+    items: List[ExecucaoAlertaItemResponse]
+    proximo_cursor: Optional[int] = None  # Pass as `cursor` to get the next page
+
+
+class RegraAlertaBase(BaseModel):
+    categoria: Optional[str] = Field(None, max_length=100)  # None = any category
+    laboratorio: Optional[str] = Field(None, max_length=100)  # None = any laboratory
+    dias_inicial: int = Field(60, ge=1, le=730)
+    intervalo_lembrete: int = Field(15, ge=1)
+    dias_urgente: int = Field(30, ge=0)
+    intervalo_urgente: int = Field(7, ge=1)
+    intervalo_vencido: int = Field(7, ge=1)
+
+
+class RegraAlertaCreate(RegraAlertaBase):
+    pass
+
+
+class RegraAlertaUpdate(BaseModel):
+    categoria: Optional[str] = Field(None, max_length=100)
+    laboratorio: Optional[str] = Field(None, max_length=100)
+    dias_inicial: Optional[int] = Field(None, ge=1, le=730)
+    intervalo_lembrete: Optional[int] = Field(None, ge=1)
+    dias_urgente: Optional[int] = Field(None, ge=0)
+    intervalo_urgente: Optional[int] = Field(None, ge=1)
+    intervalo_vencido: Optional[int] = Field(None, ge=1)
+
+
+class RegraAlertaResponse(RegraAlertaBase):
+    id: int
+    criado_em: Optional[datetime] = None
+    atualizado_em: Optional[datetime] = None
+    equipamentos_reagendados: Optional[int] = None  # Set on create/update/delete
+    
+    class Config:
+        from_attributes = True
+
+
+class NotificacaoFalhaResponse(BaseModel):
+    id: int
+    chave: str
+    canal: str
+    origem: Optional[str] = None
+    status: str
+    tentativas: int
+    ultimo_erro: Optional[str] = None
+    proxima_tentativa: Optional[datetime] = None
+    criado_em: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class FilaNotificacoesResponse(BaseModel):
+    por_canal: Dict[str, Dict[str, int]]  # {canal: {status: total}}
+    falhas: List[NotificacaoFalhaResponse]  # Most recent erro/falhou rows
+
+
+# ============= Voice Schemas =============
+
+class AudioRequest(BaseModel):
+    texto: str = Field(..., min_length=1, max_length=1000)
+
+
+class AudioResponse(BaseModel):
+    url: str
 
 
 # ============= Audit Schemas =============
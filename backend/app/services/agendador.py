@@ -0,0 +1,288 @@
+"""
+CalibraCore Lab - Alert Scheduler
+Runs the daily alert job inside the app. A DB lease makes sure only one
+worker/instance runs it at a time; every run is recorded in execucoes_alertas.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, insert_ignore
+from app.models import ExecucaoAlerta, ExecucaoAlertaItem, TarefaLease
+from app.services.alerta_service import process_alerts
+from app.services.outbox import prune_outbox
+from app.services.retencao import archive_alerts, retention_cutoff
+
+logger = logging.getLogger(__name__)
+
+LEASE_ALERTAS = "alertas_diarios"
+LEASE_RETENCAO = "retencao_alertas"
+
+# Identifies this process (recorded with each run)
+INSTANCIA = f"{socket.gethostname()[:60]}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+def acquire_lease(db: Session, nome: str, segundos: int) -> Optional[str]:
+    """
+    Take the named lease if it is free or expired; commits. Returns the
+    holder token to renew and release it with, or None when it is held,
+    also by another run in this same process.
+    """
+    dono = f"{INSTANCIA}:{uuid4().hex[:8]}"
+    agora = datetime.utcnow()
+    db.execute(insert_ignore(TarefaLease, ["nome"]).values(nome=nome, atualizado_em=agora))
+    resultado = db.execute(
+        update(TarefaLease)
+        .where(
+            TarefaLease.nome == nome,
+            or_(TarefaLease.dono.is_(None), TarefaLease.expira_em < agora)
+        )
+        .values(dono=dono, expira_em=agora + timedelta(seconds=segundos), atualizado_em=agora)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return dono if resultado.rowcount == 1 else None
+
+
+def renew_lease(db: Session, nome: str, dono: str, segundos: int) -> bool:
+    """Extend a lease still held by `dono`; commits. False when it was lost."""
+    agora = datetime.utcnow()
+    resultado = db.execute(
+        update(TarefaLease)
+        .where(TarefaLease.nome == nome, TarefaLease.dono == dono)
+        .values(expira_em=agora + timedelta(seconds=segundos), atualizado_em=agora)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return resultado.rowcount == 1
+
+
+def release_lease(db: Session, nome: str, dono: str) -> None:
+    """Free the lease if `dono` still holds it; commits"""
+    db.execute(
+        update(TarefaLease)
+        .where(TarefaLease.nome == nome, TarefaLease.dono == dono)
+        .values(dono=None, expira_em=None, atualizado_em=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _inicio_do_dia_utc(dia: date) -> datetime:
+    """Local midnight of `dia` as naive UTC (iniciado_em is stored in UTC)"""
+    return datetime.combine(dia, datetime.min.time()) + (datetime.utcnow() - datetime.now())
+
+
+def ran_today(db: Session, origem: str) -> bool:
+    """Whether a successful run from `origem` already happened today (local)"""
+    return db.query(ExecucaoAlerta.id).filter(
+        ExecucaoAlerta.origem == origem,
+        ExecucaoAlerta.status == "sucesso",
+        ExecucaoAlerta.iniciado_em >= _inicio_do_dia_utc(date.today())
+    ).first() is not None
+
+
+async def _renovar(nome: str, dono: str) -> None:
+    """Keep the lease alive while the job runs"""
+    while True:
+        await asyncio.sleep(settings.SCHEDULER_LEASE_SECONDS / 3)
+        db = SessionLocal()
+        try:
+            if not renew_lease(db, nome, dono, settings.SCHEDULER_LEASE_SECONDS):
+                logger.warning("Lease do processamento de alertas perdido durante a execução")
+        except Exception as e:
+            logger.error(f"Erro ao renovar lease: {e}")
+        finally:
+            db.close()
+
+
+def record_run_items(db: Session, execucao_id: int, detalhes: list) -> None:
+    """Store the per-equipment outcomes of a run (does not commit)"""
+    for inicio in range(0, len(detalhes), 1000):
+        db.execute(insert(ExecucaoAlertaItem), [
+            {
+                "execucao_id": execucao_id,
+                "equipamento_codigo": detalhe["equipamento"],
+                "tipo_alerta": detalhe.get("tipo_alerta"),
+                "status": detalhe["status"],
+                "destinatarios": json.dumps(detalhe["destinatarios"]) if detalhe.get("destinatarios") else None,
+                "mensagem_erro": detalhe.get("mensagem_erro")
+            }
+            for detalhe in detalhes[inicio:inicio + 1000]
+        ])
+
+
+async def run_alert_job(
+    origem: str,
+    uma_vez_por_dia: bool = False,
+    executor: Optional[Callable[[Session], Awaitable[dict]]] = None
+) -> Optional[dict]:
+    """
+    Run process_alerts (or `executor`, e.g. the sharded variant) under the
+    alert lease and record the run, with its
+    phase timings, send latencies and one row per equipment outcome.
+    Returns the result (counts, fases, latencias and execucao_id; the
+    per-equipment details are only in the DB), or None when another worker
+    holds the lease (or, with `uma_vez_por_dia`, when today's run already
+    happened).
+    """
+    db = SessionLocal()
+    renovacao = None
+    dono = None
+    try:
+        dono = acquire_lease(db, LEASE_ALERTAS, settings.SCHEDULER_LEASE_SECONDS)
+        if not dono:
+            logger.info(f"Processamento de alertas já em execução ({origem} ignorado)")
+            return None
+        if uma_vez_por_dia and ran_today(db, origem):
+            return None
+
+        execucao = ExecucaoAlerta(origem=origem, instancia=INSTANCIA, status="executando")
+        db.add(execucao)
+        db.commit()
+
+        renovacao = asyncio.create_task(_renovar(LEASE_ALERTAS, dono))
+        inicio = time.perf_counter()
+        try:
+            resultado = await (executor or process_alerts)(db)
+        except Exception as e:
+            db.rollback()
+            execucao.status = "erro"
+            execucao.mensagem_erro = str(e)
+            raise
+        else:
+            inicio_registro = time.perf_counter()
+            record_run_items(db, execucao.id, resultado.pop("detalhes"))
+            resultado["fases"]["registro"] = round((time.perf_counter() - inicio_registro) * 1000, 1)
+            execucao.status = "sucesso"
+            execucao.processados = resultado["processados"]
+            execucao.alertas_enviados = resultado["alertas_enviados"]
+            execucao.erros = resultado["erros"]
+            execucao.fases = json.dumps(resultado["fases"])
+            execucao.latencias = json.dumps(resultado["latencias"])
+            resultado["execucao_id"] = execucao.id
+            return resultado
+        finally:
+            execucao.finalizado_em = datetime.utcnow()
+            execucao.duracao_ms = int((time.perf_counter() - inicio) * 1000)
+            db.commit()
+            logger.info(
+                f"Processamento de alertas ({origem}) {execucao.status} em {execucao.duracao_ms} ms"
+            )
+    finally:
+        if renovacao:
+            renovacao.cancel()
+        if dono:
+            try:
+                release_lease(db, LEASE_ALERTAS, dono)
+            except Exception as e:
+                logger.error(f"Erro ao liberar lease: {e}")
+        db.close()
+
+
+def prune_run_items(db: Session, hoje: Optional[date] = None) -> int:
+    """
+    Delete the per-equipment rows of runs older than ALERT_RETENTION_MONTHS
+    (the run rows themselves are kept); commits
+    """
+    limite = _inicio_do_dia_utc(retention_cutoff(hoje or date.today(), settings.ALERT_RETENTION_MONTHS))
+    resultado = db.execute(
+        delete(ExecucaoAlertaItem)
+        .where(ExecucaoAlertaItem.execucao_id.in_(
+            select(ExecucaoAlerta.id).where(ExecucaoAlerta.iniciado_em < limite)
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return resultado.rowcount
+
+
+def run_retention_job() -> Optional[dict]:
+    """
+    Archive alert history past ALERT_RETENTION_MONTHS (and drop the per-item
+    rows of runs that old, and finished notifications past
+    OUTBOX_RETENTION_DAYS) under its own lease.
+    Blocking; returns None when another worker holds the lease.
+    """
+    db = SessionLocal()
+    try:
+        dono = acquire_lease(db, LEASE_RETENCAO, settings.SCHEDULER_LEASE_SECONDS)
+        if not dono:
+            return None
+        try:
+            resultado = archive_alerts(db)
+            resultado["itens_execucoes_removidos"] = prune_run_items(db)
+            resultado["notificacoes_removidas"] = prune_outbox(db)
+            return resultado
+        finally:
+            db.rollback()
+            release_lease(db, LEASE_RETENCAO, dono)
+    finally:
+        db.close()
+
+
+class AlertScheduler:
+    """
+    Fires the alert job every day at ALERT_SCHEDULE_TIME (local time),
+    followed by the history retention job. On startup after that time it
+    runs right away if today's run is missing.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _horario() -> Tuple[int, int]:
+        horas, minutos = settings.ALERT_SCHEDULE_TIME.split(":")
+        return int(horas), int(minutos)
+
+    def _proxima_execucao(self, agora: datetime) -> datetime:
+        horas, minutos = self._horario()
+        alvo = agora.replace(hour=horas, minute=minutos, second=0, microsecond=0)
+        return alvo if alvo > agora else alvo + timedelta(days=1)
+
+    async def _run(self) -> None:
+        agora = datetime.now()
+        if self._proxima_execucao(agora).date() > agora.date():
+            # Today's time already passed (e.g. restart/deploy): catch up now
+            await self._executar()
+        while True:
+            agora = datetime.now()
+            await asyncio.sleep((self._proxima_execucao(agora) - agora).total_seconds())
+            await self._executar()
+
+    async def _executar(self) -> None:
+        try:
+            await run_alert_job("agendador", uma_vez_por_dia=True)
+        except Exception as e:
+            logger.error(f"Erro no processamento agendado de alertas: {e}")
+        try:
+            await asyncio.to_thread(run_retention_job)
+        except Exception as e:
+            logger.error(f"Erro no arquivamento do histórico de alertas: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+alert_scheduler = AlertScheduler()
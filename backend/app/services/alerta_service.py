@@ -2,98 +2,273 @@
 CalibraCore Lab - Alert Service
 Logic for processing calibration expiration alerts
 """
-from datetime import date, datetime
-from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import FrozenSet, List, Dict, Optional, Set, Tuple
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session, joinedload
 import logging
-import json
 
 from app.models import Equipamento, AlertaEnviado
 from app.config import settings
-from app.services.email_service import send_email, get_alert_email_html
+from app.database import insert_ignore
+from app.services.email_service import get_alert_email_html, get_alert_digest_email_html
+from app.services.email_templates import render_subject
+from app.services.metricas import ColetorLatencia, Cronometro, coletar_latencias
+from app.services.outbox import enqueue, outbox_worker
+from app.services.rate_limit import prioridade_alerta
+from app.services.regras_alerta import REGRA_PADRAO, PlanoRegras, Regra, alert_rules
+from app.services.retencao import link_recipients
+from app.services.dashboard_stream import dashboard_broadcaster
 
 logger = logging.getLogger(__name__)
 
 
-def should_send_alert(dias_para_vencer: int, tipo_alerta: str) -> bool:
+def should_send_alert(dias_para_vencer: int, tipo_alerta: str, regra: Regra = REGRA_PADRAO) -> bool:
     """
     Determine if an alert should be sent based on the number of days until expiration
     
-    Rules:
+    Rules (defaults from the ALERT_* settings, overridden per category or
+    laboratory by regras_alerta):
     - 60 days: Initial alert
     - 59-30 days: Every 15 days
     - 30-0 days: Weekly
     - Vencido (< 0): Weekly
     """
-    if dias_para_vencer == 60:
-        return tipo_alerta == "inicial_60"
-    
-    elif 30 < dias_para_vencer < 60:
-        # Every 15 days: at days 45, 30
-        if (60 - dias_para_vencer) % 15 == 0:
-            return tipo_alerta == "lembrete_15"
-        return False
-    
-    elif 0 <= dias_para_vencer <= 30:
-        # Weekly: at days 28, 21, 14, 7, 0
-        if dias_para_vencer % 7 == 0:
-            return tipo_alerta == "urgente_7"
-        return False
-    
-    elif dias_para_vencer < 0:
-        # Expired: weekly reminders
-        if abs(dias_para_vencer) % 7 == 0:
-            return tipo_alerta == "vencido"
-        return False
-    
-    return False
+    return get_alert_type(dias_para_vencer, regra) == tipo_alerta
 
 
-def get_alert_type(dias_para_vencer: int) -> Optional[str]:
+def get_alert_type(dias_para_vencer: int, regra: Regra = REGRA_PADRAO) -> Optional[str]:
     """
     Get the alert type based on days until expiration
     """
-    if dias_para_vencer == 60:
-        return "inicial_60"
-    elif 30 < dias_para_vencer < 60:
-        if (60 - dias_para_vencer) % 15 == 0:
-            return "lembrete_15"
-    elif 0 <= dias_para_vencer <= 30:
-        if dias_para_vencer % 7 == 0:
-            return "urgente_7"
-    elif dias_para_vencer < 0:
-        if abs(dias_para_vencer) % 7 == 0:
-            return "vencido"
-    return None
+    return regra.tipo(dias_para_vencer)
+
+
+def next_alert_date(data_vencimento: date, a_partir_de: date, regra: Regra = REGRA_PADRAO) -> date:
+    """
+    First day on or after `a_partir_de` on which get_alert_type() fires
+    """
+    return regra.proxima(data_vencimento, a_partir_de)
+
+
+def last_alert_date(data_vencimento: date, ate: date, regra: Regra = REGRA_PADRAO) -> Optional[date]:
+    """
+    Last day on or before `ate` on which get_alert_type() fires, if any
+    """
+    return regra.ultima(data_vencimento, ate)
+
+
+def schedule_next_alert(
+    equipamento: Equipamento,
+    a_partir_de: Optional[date] = None,
+    plano: Optional[PlanoRegras] = None
+) -> None:
+    """
+    Recompute proxima_data_alerta after the due date (or the equipment's
+    category/laboratory, which select its rule) changes (does not commit)
+    """
+    regra = plano.regra_para(equipamento.categoria, equipamento.laboratorio) if plano else REGRA_PADRAO
+    equipamento.proxima_data_alerta = regra.proxima(
+        equipamento.data_vencimento, a_partir_de or date.today()
+    )
+
+
+def reschedule_alerts(db: Session, plano: PlanoRegras, *filtros) -> int:
+    """
+    Recompute proxima_data_alerta of the active equipment matching
+    `filtros` under `plano`, e.g. after a rule changed (does not commit).
+    Alerts already overdue stay due, so the next run still catches them up.
+    Returns how many rows were updated.
+    """
+    hoje = date.today()
+    rows = db.query(
+        Equipamento.id,
+        Equipamento.data_vencimento,
+        Equipamento.proxima_data_alerta,
+        plano.sql_indice().label("regra")
+    ).filter(Equipamento.ativo == True, *filtros).all()
+    agenda = [
+        {
+            "id": row.id,
+            "proxima_data_alerta": plano.regras[row.regra].proxima(
+                row.data_vencimento, min(row.proxima_data_alerta or hoje, hoje)
+            )
+        }
+        for row in rows
+    ]
+    if agenda:
+        db.execute(update(Equipamento), agenda)
+    return len(agenda)
 
 
 def was_alert_sent_today(db: Session, equipamento_id: int, tipo_alerta: str) -> bool:
     """
     Check if an alert of this type was already sent today for this equipment
     """
-    hoje = date.today()
-    alerta = db.query(AlertaEnviado).filter(
-        AlertaEnviado.equipamento_id == equipamento_id,
-        AlertaEnviado.tipo_alerta == tipo_alerta,
-        AlertaEnviado.data_envio >= datetime.combine(hoje, datetime.min.time()),
-        AlertaEnviado.data_envio < datetime.combine(hoje, datetime.max.time())
-    ).first()
-    return alerta is not None
+    return (equipamento_id, tipo_alerta) in alerts_sent_today(db, date.today(), [equipamento_id])
 
 
-async def process_alerts(db: Session) -> Dict:
+def alerts_sent_today(db: Session, hoje: date, equipamento_ids: Optional[List[int]] = None) -> Set[Tuple[int, str]]:
     """
-    Process all equipment and send alerts as needed
-    Returns a summary of actions taken
+    Load today's (equipamento_id, tipo_alerta) pairs in a single query
+    """
+    query = db.query(AlertaEnviado.equipamento_id, AlertaEnviado.tipo_alerta).filter(
+        AlertaEnviado.dia_envio == hoje
+    )
+    if equipamento_ids is not None:
+        query = query.filter(AlertaEnviado.equipamento_id.in_(equipamento_ids))
+    return {(row[0], row[1]) for row in query.all()}
+
+
+def get_alert_subject(tipo_alerta: str, dias: int, codigo: str) -> str:
+    """
+    E-mail subject for an alert type
+    """
+    return render_subject(tipo_alerta, dias, codigo)
+
+
+def claim_alerts(db: Session, hoje: date, envios: List[dict]) -> Dict[Tuple[int, str], int]:
+    """
+    Claim many alert slots in one INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Returns {(equipamento_id, tipo_alerta): alerta_id} for the slots this run owns.
+    Does not commit: the claim is committed together with the queued messages.
+    """
+    if not envios:
+        return {}
+    agora = datetime.utcnow()
+    stmt = insert_ignore(
+        AlertaEnviado, ["equipamento_id", "tipo_alerta", "dia_envio"]
+    ).values([
+        {
+            "equipamento_id": envio["equipamento"].id,
+            "tipo_alerta": envio["tipo_alerta"],
+            "dia_envio": hoje,
+            "data_envio": agora,
+            "sucesso": False,
+            "mensagem_erro": "Envio em andamento"
+        }
+        for envio in envios
+    ]).returning(AlertaEnviado.id, AlertaEnviado.equipamento_id, AlertaEnviado.tipo_alerta)
+    reservados = {(row[1], row[2]): row[0] for row in db.execute(stmt).all()}
+    link_recipients(db, {
+        reservados[chave]: envio["destinatarios"]
+        for envio in envios
+        if (chave := (envio["equipamento"].id, envio["tipo_alerta"])) in reservados
+    })
+    return reservados
+
+
+def is_digest_recipient(email: str) -> bool:
+    """
+    Whether this recipient gets one daily digest instead of one e-mail
+    per equipment (ALERT_DIGEST_RECIPIENTS: comma-separated, or "*" for all)
+    """
+    configurados = _digest_recipients(settings.ALERT_DIGEST_RECIPIENTS)
+    return "*" in configurados or email.strip().lower() in configurados
+
+
+@lru_cache(maxsize=8)
+def _digest_recipients(configuracao: str) -> FrozenSet[str]:
+    return frozenset(e.strip().lower() for e in configuracao.split(",") if e.strip())
+
+
+@lru_cache(maxsize=4096)
+def _data_br(data: date) -> str:
+    return data.strftime("%d/%m/%Y")
+
+
+def build_messages(envios: List[dict]) -> List[dict]:
     """
-    # Get all active equipment
-    equipamentos = db.query(Equipamento).filter(Equipamento.ativo == True).all()
+    Turn per-equipment alerts into the messages to send, grouped per channel
+    and recipient. Each message lists the alerts (envios) it covers.
+    """
+    mensagens = []
+    por_destinatario: Dict[Tuple[str, str], List[dict]] = {}
+
+    for envio in envios:
+        individuais = []
+        for email in envio["destinatarios"]:
+            if is_digest_recipient(email):
+                por_destinatario.setdefault(("email", email), []).append(envio)
+            else:
+                individuais.append(email)
+        if individuais:
+            mensagens.append({"canal": "email", "destinatarios": individuais, "envios": [envio]})
+
+    for (canal, email), itens in por_destinatario.items():
+        mensagens.append({"canal": canal, "destinatarios": [email], "envios": itens})
+
+    for mensagem in mensagens:
+        itens = mensagem["envios"]
+        if len(itens) == 1:
+            envio = itens[0]
+            eq = envio["equipamento"]
+            mensagem["subject"] = get_alert_subject(envio["tipo_alerta"], envio["dias"], eq.codigo_interno)
+            mensagem["html"] = get_alert_email_html(
+                equipamento_codigo=eq.codigo_interno,
+                equipamento_descricao=eq.descricao,
+                laboratorio=eq.laboratorio,
+                data_vencimento=_data_br(eq.data_vencimento),
+                dias_restantes=envio["dias"],
+                tipo_alerta=envio["tipo_alerta"]
+            )
+        else:
+            vencidos = sum(1 for envio in itens if envio["dias"] < 0)
+            mensagem["subject"] = (
+                f"[CalibraCore] Resumo de calibração: {len(itens)} equipamentos"
+                + (f" ({vencidos} vencidos)" if vencidos else "")
+            )
+            mensagem["html"] = get_alert_digest_email_html([
+                {
+                    "equipamento_codigo": envio["equipamento"].codigo_interno,
+                    "equipamento_descricao": envio["equipamento"].descricao,
+                    "laboratorio": envio["equipamento"].laboratorio,
+                    "data_vencimento": _data_br(envio["equipamento"].data_vencimento),
+                    "dias_restantes": envio["dias"],
+                    "tipo_alerta": envio["tipo_alerta"]
+                }
+                for envio in sorted(itens, key=lambda e: e["dias"])
+            ])
+    return mensagens
+
+
+def prepare_alerts(db: Session, hoje: date, cronometro: Cronometro, *filtros) -> Tuple[Dict, List[dict]]:
+    """
+    Select the equipment due for an alert (optionally narrowed by extra
+    `filtros`, e.g. one shard), advance their schedules, claim today's
+    alerts and queue their e-mails in the outbox. Does not commit: the
+    caller commits claims, schedules and messages together.
+    Returns the partial results and the alerts claimed by this run, as
+    {alerta_id, equipamento, tipo_alerta, destinatarios}.
+    """
+    # Only equipment whose next alert is due (index scan on proxima_data_alerta).
+    # Days missed by earlier runs are still <= today, so they are caught up;
+    # NULL means not scheduled yet (legacy rows, bulk imports).
+    # Rules compiled once per run; each row comes with its rule's index
+    plano = alert_rules(db)
+    rows = db.query(Equipamento, plano.sql_indice().label("regra")).options(
+        joinedload(Equipamento.responsavel_usuario)
+    ).filter(
+        Equipamento.ativo == True,
+        or_(
+            Equipamento.proxima_data_alerta <= hoje,
+            Equipamento.proxima_data_alerta.is_(None)
+        ),
+        *filtros
+    ).all()
+    equipamentos = [eq for eq, _ in rows]
+    cronometro.etapa("selecao")
     
     # Get alert recipients
     recipients = []
     if settings.ALERT_RECIPIENTS:
         recipients = [email.strip() for email in settings.ALERT_RECIPIENTS.split(",")]
     
+    # Alerts already sent today, loaded once
+    enviados = alerts_sent_today(db, hoje, [eq.id for eq in equipamentos])
+    cronometro.etapa("deduplicacao")
+    
     results = {
         "processados": len(equipamentos),
         "alertas_enviados": 0,
@@ -101,15 +276,30 @@ async def process_alerts(db: Session) -> Dict:
         "detalhes": []
     }
     
-    for eq in equipamentos:
-        dias = eq.dias_para_vencer
-        tipo_alerta = get_alert_type(dias)
+    # Collect due alerts
+    envios = []
+    for eq, indice in rows:
+        regra = plano.regras[indice]
+        dias = (eq.data_vencimento - hoje).days
+        pendente_desde = eq.proxima_data_alerta or hoje
+        dia_alerta = regra.ultima(eq.data_vencimento, hoje)
+        
+        # Advance the schedule; committed together with the queued alerts
+        eq.proxima_data_alerta = regra.proxima(eq.data_vencimento, hoje + timedelta(days=1))
         
-        if tipo_alerta is None:
+        if dia_alerta is None or dia_alerta < pendente_desde:
             continue
         
+        # Most recent alert due (today's, or the one a missed run skipped)
+        tipo_alerta = regra.tipo((eq.data_vencimento - dia_alerta).days)
+        if dias < 0:
+            # Caught up past the due date: it is overdue by now
+            tipo_alerta = "vencido"
+        if dia_alerta < hoje:
+            logger.info(f"Alerta {tipo_alerta} de {dia_alerta} recuperado para {eq.codigo_interno}")
+        
         # Check if alert was already sent today
-        if was_alert_sent_today(db, eq.id, tipo_alerta):
+        if (eq.id, tipo_alerta) in enviados:
             logger.debug(f"Alerta já enviado hoje para {eq.codigo_interno}")
             continue
         
@@ -128,61 +318,129 @@ async def process_alerts(db: Session) -> Dict:
             })
             continue
         
-        # Generate and send email
-        data_vencimento_str = eq.data_vencimento.strftime("%d/%m/%Y")
-        html_content = get_alert_email_html(
-            equipamento_codigo=eq.codigo_interno,
-            equipamento_descricao=eq.descricao,
-            laboratorio=eq.laboratorio,
-            data_vencimento=data_vencimento_str,
-            dias_restantes=dias,
-            tipo_alerta=tipo_alerta
-        )
-        
-        # Determine subject based on alert type
-        if tipo_alerta == "inicial_60":
-            subject = f"[CalibraCore] Aviso: Calibração vence em 60 dias - {eq.codigo_interno}"
-        elif tipo_alerta == "lembrete_15":
-            subject = f"[CalibraCore] Lembrete: Calibração vence em {dias} dias - {eq.codigo_interno}"
-        elif tipo_alerta == "urgente_7":
-            subject = f"[CalibraCore] URGENTE: Calibração vence em {dias} dias - {eq.codigo_interno}"
-        else:  # vencido
-            subject = f"[CalibraCore] ⚠️ VENCIDO: Calibração expirada - {eq.codigo_interno}"
-        
-        # Send email
-        success = await send_email(
-            to_emails=email_list,
-            subject=subject,
-            html_content=html_content
-        )
-        
-        # Record alert
-        alerta = AlertaEnviado(
-            equipamento_id=eq.id,
-            tipo_alerta=tipo_alerta,
-            destinatarios=json.dumps(email_list),
-            sucesso=success,
-            mensagem_erro=None if success else "Falha no envio do e-mail"
+        envios.append({
+            "equipamento": eq,
+            "tipo_alerta": tipo_alerta,
+            "dias": dias,
+            "destinatarios": email_list
+        })
+    cronometro.etapa("avaliacao")
+    
+    # Individual e-mails plus per-recipient digests, rendered before the
+    # claim so the write transaction stays short
+    mensagens = build_messages(envios)
+    cronometro.etapa("renderizacao")
+    
+    # Claim all slots at once so a concurrent run cannot send them too
+    reservados = claim_alerts(db, hoje, envios)
+    proprios = []
+    for envio in envios:
+        chave = (envio["equipamento"].id, envio["tipo_alerta"])
+        if chave in reservados:
+            envio["alerta_id"] = reservados[chave]
+            proprios.append(envio)
+        else:
+            logger.debug(f"Alerta já reservado por outra execução para {envio['equipamento'].codigo_interno}")
+    cronometro.etapa("reserva")
+    if len(proprios) < len(envios):
+        # Rare (another run claimed some): digests must not list those
+        mensagens = build_messages(proprios)
+        cronometro.etapa("renderizacao")
+    
+    # Queued in the outbox in the same transaction as the claim so nothing
+    # is lost if we crash here
+    origem = f"alertas:{hoje.isoformat()}"
+    for mensagem in mensagens:
+        alerta_ids = [envio["alerta_id"] for envio in mensagem["envios"]]
+        if len(alerta_ids) == 1:
+            chave = f"alerta:{alerta_ids[0]}:email"
+        else:
+            chave = f"alerta:{alerta_ids[0]}:resumo:{mensagem['destinatarios'][0]}"
+        enqueue(
+            db,
+            chave,
+            "email",
+            mensagem["html"],
+            destinatarios=mensagem["destinatarios"],
+            assunto=mensagem["subject"],
+            formato="html",
+            origem=origem,
+            alerta_ids=alerta_ids,
+            prioridade=min(prioridade_alerta(envio["tipo_alerta"]) for envio in mensagem["envios"])
         )
-        db.add(alerta)
+    cronometro.etapa("enfileiramento")
+    
+    alertas = [
+        {
+            "alerta_id": envio["alerta_id"],
+            "equipamento": envio["equipamento"].codigo_interno,
+            "tipo_alerta": envio["tipo_alerta"],
+            "destinatarios": envio["destinatarios"]
+        }
+        for envio in proprios
+    ]
+    return results, alertas
+
+
+async def deliver_alerts(db: Session, hoje: date, cronometro: Cronometro, results: Dict, alertas: List[dict]) -> Dict:
+    """
+    Deliver today's queued alert e-mails and add each claimed alert's
+    outcome, the phase timings and the send latencies to `results`
+    """
+    # Deliver now; failures stay in the outbox and are retried by the worker
+    with coletar_latencias(ColetorLatencia()) as latencias:
+        await outbox_worker.drain(f"alertas:{hoje.isoformat()}")
+    cronometro.etapa("envio")
+    
+    status = {}
+    for inicio in range(0, len(alertas), 1000):
+        status.update({
+            row.id: row
+            for row in db.query(AlertaEnviado.id, AlertaEnviado.sucesso, AlertaEnviado.mensagem_erro).filter(
+                AlertaEnviado.id.in_([alerta["alerta_id"] for alerta in alertas[inicio:inicio + 1000]])
+            )
+        })
+    
+    for alerta in alertas:
+        codigo = alerta["equipamento"]
+        tipo_alerta = alerta["tipo_alerta"]
+        registro = status[alerta["alerta_id"]]
         
-        if success:
+        if registro.sucesso:
             results["alertas_enviados"] += 1
             results["detalhes"].append({
-                "equipamento": eq.codigo_interno,
+                "equipamento": codigo,
                 "status": "enviado",
                 "tipo_alerta": tipo_alerta,
-                "destinatarios": email_list
+                "destinatarios": alerta["destinatarios"]
             })
-            logger.info(f"Alerta {tipo_alerta} enviado para {eq.codigo_interno}")
+            logger.info(f"Alerta {tipo_alerta} enviado para {codigo}")
         else:
             results["erros"] += 1
             results["detalhes"].append({
-                "equipamento": eq.codigo_interno,
+                "equipamento": codigo,
                 "status": "erro",
-                "tipo_alerta": tipo_alerta
+                "tipo_alerta": tipo_alerta,
+                "mensagem_erro": registro.mensagem_erro
             })
-            logger.error(f"Falha ao enviar alerta para {eq.codigo_interno}")
+            logger.error(f"Falha ao enviar alerta para {codigo}: {registro.mensagem_erro}")
     
-    db.commit()
+    dashboard_broadcaster.notify("alertas")
+    cronometro.etapa("consolidacao")
+    results["fases"] = cronometro.fases
+    results["latencias"] = latencias.resumo()
     return results
+
+
+async def process_alerts(db: Session) -> Dict:
+    """
+    Process all equipment and send alerts as needed
+    Returns a summary of actions taken, with the time spent in each phase
+    (ms) and the send latencies per channel
+    """
+    hoje = date.today()
+    cronometro = Cronometro()
+    results, alertas = prepare_alerts(db, hoje, cronometro)
+    db.commit()
+    cronometro.etapa("commit")
+    return await deliver_alerts(db, hoje, cronometro, results, alertas)
@@ -0,0 +1,167 @@
+"""
+CalibraCore Lab - Sharded Alert Runs
+Splits the daily alert run into shards (per laboratorio or per id range)
+prepared in parallel by a process pool. Each shard commits its claims,
+schedules, queued e-mails and its checkpoint in one transaction, so a run
+that dies halfway is resumed at the first unfinished shard and never sends
+twice. Delivery stays in the parent process: one sender honors the channel
+rate limits.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, or_
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.models import CheckpointAlerta, Equipamento
+from app.services.alerta_service import deliver_alerts, prepare_alerts
+from app.services.metricas import Cronometro
+
+logger = logging.getLogger(__name__)
+
+PARTICOES = ("laboratorio", "ids")
+
+
+def _candidatos(hoje: date):
+    return [
+        Equipamento.ativo == True,
+        or_(
+            Equipamento.proxima_data_alerta <= hoje,
+            Equipamento.proxima_data_alerta.is_(None)
+        )
+    ]
+
+
+def plan_shards(db: Session, hoje: date, particao: str, tamanho: int) -> List[str]:
+    """
+    Shards with equipment due today. Names are stable across reruns
+    (id ranges are aligned to `tamanho`), so checkpoints can be matched.
+    """
+    if particao == "laboratorio":
+        laboratorios = db.query(Equipamento.laboratorio).filter(*_candidatos(hoje)).distinct()
+        return sorted(f"laboratorio:{lab}" for lab, in laboratorios)
+    blocos = db.query((Equipamento.id // tamanho).label("bloco")).filter(*_candidatos(hoje)).distinct()
+    return [f"ids:{bloco * tamanho}-{(bloco + 1) * tamanho - 1}" for bloco in sorted(int(b) for b, in blocos)]
+
+
+def shard_filter(shard: str):
+    """SQL filter selecting the equipment of a shard"""
+    tipo, valor = shard.split(":", 1)
+    if tipo == "laboratorio":
+        return Equipamento.laboratorio == valor
+    inicio, fim = (int(limite) for limite in valor.split("-"))
+    return Equipamento.id.between(inicio, fim)
+
+
+def _iniciar_processo() -> None:
+    # Forked workers must not reuse the parent's pooled connections
+    engine.dispose(close=False)
+
+
+def process_shard(hoje: date, shard: str) -> Dict:
+    """
+    Prepare one shard (runs in a pool process) and commit it together with
+    its checkpoint. Returns the shard's results and claimed alerts.
+    """
+    db = SessionLocal()
+    cronometro = Cronometro()
+    try:
+        results, alertas = prepare_alerts(db, hoje, cronometro, shard_filter(shard))
+        db.execute(delete(CheckpointAlerta).where(CheckpointAlerta.dia == hoje, CheckpointAlerta.shard == shard))
+        db.add(CheckpointAlerta(
+            dia=hoje,
+            shard=shard,
+            processados=results["processados"],
+            alertas=len(alertas),
+            concluido_em=datetime.utcnow()
+        ))
+        db.commit()
+        cronometro.etapa("commit")
+    finally:
+        db.close()
+    logger.info(f"Shard {shard} concluído: {results['processados']} equipamentos, {len(alertas)} alertas (pid {os.getpid()})")
+    return {"shard": shard, "results": results, "alertas": alertas, "fases": cronometro.fases}
+
+
+async def process_alerts_sharded(
+    db: Session,
+    particao: str = "laboratorio",
+    workers: Optional[int] = None,
+    retomar: bool = False,
+    tamanho: int = 5000
+) -> Dict:
+    """
+    process_alerts() split into shards over a process pool of `workers`.
+    With `retomar`, shards already checkpointed today are skipped; their
+    alerts were committed with the checkpoint, so nothing is sent twice.
+    Raises RuntimeError after delivering the finished shards if any shard
+    failed (rerun with `retomar` to finish).
+
+    SQLite allows a single writer and a shard reads then writes in one
+    transaction, so concurrent shards fail with "database is locked": there
+    the shards run one at a time (still checkpointed and resumable).
+    """
+    if particao not in PARTICOES:
+        raise ValueError(f"Partição inválida: {particao}")
+    hoje = date.today()
+    cronometro = Cronometro()
+
+    # Checkpoints only matter for resuming today's run
+    db.execute(delete(CheckpointAlerta).where(CheckpointAlerta.dia < hoje))
+    db.commit()
+    shards = plan_shards(db, hoje, particao, tamanho)
+    concluidos = set()
+    if retomar:
+        concluidos = {
+            shard for shard, in db.query(CheckpointAlerta.shard).filter(CheckpointAlerta.dia == hoje)
+        }
+    pendentes = [shard for shard in shards if shard not in concluidos]
+    cronometro.etapa("planejamento")
+
+    if engine.dialect.name == "sqlite" and (workers or os.cpu_count()) > 1:
+        logger.warning("SQLite: shards processados em um único processo (use PostgreSQL para paralelizar)")
+        workers = 1
+
+    retornos = []
+    if pendentes:
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_iniciar_processo) as pool:
+            retornos = await asyncio.gather(
+                *(loop.run_in_executor(pool, process_shard, hoje, shard) for shard in pendentes),
+                return_exceptions=True
+            )
+    cronometro.etapa("shards")
+
+    results = {"processados": 0, "alertas_enviados": 0, "erros": 0, "detalhes": []}
+    alertas = []
+    falhas = []
+    for shard, retorno in zip(pendentes, retornos):
+        if isinstance(retorno, BaseException):
+            logger.error(f"Shard {shard} falhou: {retorno}")
+            falhas.append(f"{shard} ({retorno})")
+            continue
+        results["processados"] += retorno["results"]["processados"]
+        results["detalhes"].extend(retorno["results"]["detalhes"])
+        alertas.extend(retorno["alertas"])
+        # Summed over the pool processes
+        for fase, ms in retorno["fases"].items():
+            cronometro.fases[f"shards.{fase}"] = round(cronometro.fases.get(f"shards.{fase}", 0.0) + ms, 1)
+
+    # Also delivers what a crashed run queued and left unsent
+    results = await deliver_alerts(db, hoje, cronometro, results, alertas)
+    # Finished shards usually drop out of the plan (their equipment was
+    # rescheduled), so count them from the checkpoints
+    results["shards"] = {
+        "total": len(set(shards) | concluidos),
+        "executados": len(pendentes) - len(falhas),
+        "retomados": len(concluidos),
+        "falhas": len(falhas)
+    }
+    if falhas:
+        raise RuntimeError(f"Shards com falha (execute novamente com retomada): {', '.join(falhas)}")
+    return results
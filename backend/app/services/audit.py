@@ -3,10 +3,11 @@ from sqlalchemy.orm import Session
 from app.models import AuditLog
 import json
 
-def log_action(db: Session, user_id: int, action: str, table_name: str, record_id: int, changes: dict | None = None):
+def log_action(db: Session, user_id: int, action: str, table_name: str, record_id: int, changes: dict | None = None, commit: bool = True):
     """Create an audit log entry.
     action: 'CREATE', 'UPDATE', 'DELETE'
     changes: dict of field changes (for UPDATE), will be stored as JSON string.
+    commit=False adds it to the caller's transaction instead of committing.
     """
     audit = AuditLog(
         user_id=user_id,
@@ -14,8 +15,9 @@ def log_action(db: Session, user_id: int, action: str, table_name: str, record_i
         table_name=table_name,
         record_id=record_id,
         timestamp=datetime.utcnow(),
-        changes=json.dumps(changes) if changes else None,
+        changes=json.dumps(changes, default=str) if changes else None,
     )
     db.add(audit)
-    db.commit()
+    if commit:
+        db.commit()
     # Do not refresh; log is independent.
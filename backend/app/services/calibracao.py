@@ -0,0 +1,148 @@
+"""
+CalibraCore Lab - Calibration History Service
+"""
+import hashlib
+import os
+from datetime import date
+from typing import BinaryIO, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.database import dias_entre
+from app.models import Calibracao, Equipamento
+
+
+def hash_arquivo(caminho: Optional[str]) -> Optional[str]:
+    """SHA-256 of a certificate file, or None if there is no file"""
+    if not caminho or not os.path.exists(caminho):
+        return None
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(65536), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def salvar_certificado(origem: BinaryIO, caminho: str) -> str:
+    """
+    Write an uploaded certificate to `caminho` and return its SHA-256,
+    in one pass (blocking: run it in a thread)
+    """
+    sha = hashlib.sha256()
+    with open(caminho, "wb") as destino:
+        for bloco in iter(lambda: origem.read(65536), b""):
+            sha.update(bloco)
+            destino.write(bloco)
+    return sha.hexdigest()
+
+
+def registrar_historico(
+    db: Session,
+    equipamento: Equipamento,
+    data_calibracao: date,
+    data_vencimento: date,
+    numero_certificado: Optional[str] = None,
+    usuario_id: Optional[int] = None,
+    vencimento_anterior: Optional[date] = None,
+    hash_certificado: Optional[str] = None
+) -> Calibracao:
+    """
+    Append a calibration to the history. Call before overwriting the
+    equipment dates so the replaced due date is kept. The certificate
+    file on the equipment belongs to the previous calibration, so it is
+    not hashed here: pass `hash_certificado` or upload the new certificate
+    afterwards (registrar_certificado). Does not commit.
+    """
+    calibracao = Calibracao(
+        equipamento=equipamento,
+        data_calibracao=data_calibracao,
+        data_vencimento=data_vencimento,
+        vencimento_anterior=vencimento_anterior,
+        numero_certificado=numero_certificado,
+        hash_arquivo=hash_certificado,
+        registrado_por_id=usuario_id
+    )
+    db.add(calibracao)
+    return calibracao
+
+
+def registrar_certificado(
+    db: Session,
+    equipamento: Equipamento,
+    hash_certificado: str,
+    usuario_id: Optional[int] = None
+) -> Optional[Calibracao]:
+    """
+    Record the hash of a certificate uploaded for the equipment's latest
+    calibration. A calibration still waiting for its certificate gets the
+    hash; one that already has a different hash is kept as is and a
+    correction row is appended. Returns the row written, or None if the
+    equipment has no registered calibration. Does not commit.
+    """
+    original = db.query(Calibracao).filter(
+        Calibracao.equipamento_id == equipamento.id,
+        Calibracao.substitui_id.is_(None)
+    ).order_by(Calibracao.data_calibracao.desc(), Calibracao.id.desc()).first()
+    if original is None:
+        return None
+
+    atual = db.query(Calibracao).filter(
+        (Calibracao.id == original.id) | (Calibracao.substitui_id == original.id)
+    ).order_by(Calibracao.id.desc()).first()
+    if atual.hash_arquivo is None:
+        atual.hash_arquivo = hash_certificado
+        return atual
+    if atual.hash_arquivo == hash_certificado:
+        return atual
+
+    correcao = Calibracao(
+        equipamento_id=equipamento.id,
+        data_calibracao=original.data_calibracao,
+        data_vencimento=original.data_vencimento,
+        vencimento_anterior=original.vencimento_anterior,
+        numero_certificado=original.numero_certificado,
+        hash_arquivo=hash_certificado,
+        substitui_id=original.id,
+        registrado_por_id=usuario_id
+    )
+    db.add(correcao)
+    return correcao
+
+
+def estatisticas_por_categoria(db: Session, laboratorio: Optional[str] = None) -> List[dict]:
+    """
+    Average calibration interval and lateness per category, aggregated in SQL
+    """
+    intervalo = dias_entre(Calibracao.data_vencimento, Calibracao.data_calibracao)
+    atraso = dias_entre(Calibracao.data_calibracao, Calibracao.vencimento_anterior)
+    atrasada = case((Calibracao.data_calibracao > Calibracao.vencimento_anterior, 1), else_=0)
+
+    query = db.query(
+        Equipamento.categoria,
+        func.count(Calibracao.id),
+        func.avg(intervalo),
+        func.sum(atrasada),
+        func.avg(case((Calibracao.data_calibracao > Calibracao.vencimento_anterior, atraso), else_=None))
+    ).join(
+        Equipamento, Equipamento.id == Calibracao.equipamento_id
+    ).filter(
+        # Correction rows repeat a calibration already counted
+        Calibracao.substitui_id.is_(None)
+    )
+
+    if laboratorio:
+        query = query.filter(Equipamento.laboratorio == laboratorio)
+
+    rows = query.group_by(Equipamento.categoria).order_by(Equipamento.categoria).all()
+
+    return [
+        {
+            "categoria": categoria,
+            "calibracoes": total,
+            "intervalo_medio_dias": round(float(intervalo_medio), 1) if intervalo_medio is not None else None,
+            "calibracoes_atrasadas": int(atrasadas or 0),
+            "atraso_medio_dias": round(float(atraso_medio), 1) if atraso_medio is not None else None
+        }
+        for categoria, total, intervalo_medio, atrasadas, atraso_medio in rows
+    ]
@@ -0,0 +1,332 @@
+"""
+CalibraCore Lab - Notification Channels
+Every delivery channel implements send_many(lote): the outbox hands it a
+whole batch and the channel decides how to pipeline it (pooled SMTP
+connections, concurrent HTTP requests, one webhook call, one file write...).
+Enablement and batch size per channel come from Settings.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+from app.services.metricas import registrar_latencia
+from app.services.rate_limit import throttle
+from app.services.smtp_pool import get_smtp_pool
+from app.services.voz import voice_worker
+from app.services.whatsapp import get_whatsapp_client
+
+logger = logging.getLogger(__name__)
+
+# (sent, error message) for each message of a batch, in order
+Resultado = Tuple[bool, Optional[str]]
+
+
+class Mensagem:
+    """One notification, independent of how it was queued"""
+
+    def __init__(
+        self,
+        corpo: str,
+        destinatarios: Optional[List[str]] = None,
+        assunto: Optional[str] = None,
+        formato: str = "texto",
+        chave: Optional[str] = None,
+        message_id: Optional[str] = None,
+        texto_alternativo: Optional[str] = None
+    ):
+        self.corpo = corpo
+        self.destinatarios = destinatarios or []
+        self.assunto = assunto
+        self.formato = formato  # texto, html
+        self.chave = chave  # Idempotency key, when queued through the outbox
+        self.message_id = message_id
+        self.texto_alternativo = texto_alternativo  # Plain-text part of an HTML e-mail
+
+
+class Canal:
+    """
+    Base class for a notification channel. Subclasses set `nome` (the
+    outbox `canal` value), `prefixo` (of the {prefixo}_ENABLED and
+    {prefixo}_BATCH_SIZE settings) and implement send_many(), returning
+    one Resultado per message.
+    """
+
+    nome = ""
+    prefixo = ""
+
+    @property
+    def habilitado(self) -> bool:
+        return getattr(settings, f"{self.prefixo}_ENABLED")
+
+    @property
+    def configurado(self) -> bool:
+        """Has what it needs to send (credentials, URL...)"""
+        return True
+
+    @property
+    def tamanho_lote(self) -> int:
+        return max(1, getattr(settings, f"{self.prefixo}_BATCH_SIZE"))
+
+    async def send_many(self, lote: List[Mensagem]) -> List[Resultado]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release connections held for the running event loop"""
+
+
+async def _com_timeout(coro, timeout: Optional[float]) -> Resultado:
+    """Run one send with `timeout` (None = the send applies its own); errors become a Resultado"""
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        return False, "Tempo limite de envio excedido"
+    except Exception as e:
+        return False, f"Falha no envio: {e}"
+
+
+async def _enviar_concorrente(canal: str, envios, timeout: bool = True) -> List[Resultado]:
+    """
+    Run a batch's sends concurrently (at most ALERT_SEND_CONCURRENCY at a
+    time), each after the channel's rate limit, which is not counted in
+    its timeout nor in the latency reported to the run metrics. With
+    timeout=False the sends apply ALERT_SEND_TIMEOUT_SECONDS themselves.
+    """
+    semaforo = asyncio.Semaphore(settings.ALERT_SEND_CONCURRENCY)
+
+    async def enviar(envio) -> Resultado:
+        async with semaforo:
+            await throttle(canal)
+            inicio = time.perf_counter()
+            resultado = await _com_timeout(envio(), settings.ALERT_SEND_TIMEOUT_SECONDS if timeout else None)
+            registrar_latencia(canal, time.perf_counter() - inicio, resultado[0])
+            return resultado
+
+    return await asyncio.gather(*(enviar(envio) for envio in envios))
+
+
+class EmailChannel(Canal):
+    """SMTP via the shared connection pool: the batch is spread over its connections"""
+
+    nome = "email"
+    prefixo = "EMAIL"
+
+    @staticmethod
+    def build_message(mensagem: Mensagem):
+        remetente = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
+        if mensagem.formato == "html":
+            message = MIMEMultipart("alternative")
+            if mensagem.texto_alternativo:
+                message.attach(MIMEText(mensagem.texto_alternativo, "plain"))
+            message.attach(MIMEText(mensagem.corpo, "html"))
+        else:
+            message = EmailMessage()
+            message.set_content(mensagem.corpo)
+        message["Subject"] = mensagem.assunto or ""
+        message["From"] = remetente
+        message["To"] = ", ".join(mensagem.destinatarios)
+        if mensagem.message_id:
+            message["Message-ID"] = mensagem.message_id
+        return message
+
+    async def _enviar(self, pool, mensagem: Mensagem) -> Resultado:
+        # The pool times the send only, not the wait for a free connection
+        await pool.send_message(
+            self.build_message(mensagem),
+            sender=settings.SMTP_FROM_EMAIL,
+            recipients=mensagem.destinatarios,
+            timeout=settings.ALERT_SEND_TIMEOUT_SECONDS
+        )
+        logger.info(f"E-mail enviado para: {', '.join(mensagem.destinatarios)}")
+        return True, None
+
+    @property
+    def configurado(self) -> bool:
+        return bool(settings.SMTP_USER and settings.SMTP_PASSWORD)
+
+    async def send_many(self, lote: List[Mensagem]) -> List[Resultado]:
+        if not self.configurado:
+            logger.warning("SMTP não configurado. E-mail não enviado.")
+            return [(False, "SMTP não configurado")] * len(lote)
+        pool = get_smtp_pool(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            username=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            start_tls=settings.SMTP_TLS
+        )
+        return await _enviar_concorrente(self.nome, [functools.partial(self._enviar, pool, m) for m in lote], timeout=False)
+
+
+class WhatsAppChannel(Canal):
+    """Twilio over the shared keep-alive HTTP client: the batch is sent concurrently"""
+
+    nome = "whatsapp"
+    prefixo = "WHATSAPP"
+
+    async def _enviar(self, client, mensagem: Mensagem) -> Resultado:
+        for numero in mensagem.destinatarios:
+            await client.send(numero, mensagem.corpo)
+            logger.info(f"WhatsApp message sent to {numero}")
+        return True, None
+
+    @property
+    def configurado(self) -> bool:
+        return all([settings.TWILIO_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_WHATSAPP_NUMBER])
+
+    async def send_many(self, lote: List[Mensagem]) -> List[Resultado]:
+        if not self.configurado:
+            logger.warning("Twilio credentials not configured; skipping WhatsApp alert.")
+            return [(False, "Twilio não configurado")] * len(lote)
+        client = get_whatsapp_client(settings.TWILIO_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_WHATSAPP_NUMBER)
+        return await _enviar_concorrente(self.nome, [functools.partial(self._enviar, client, m) for m in lote])
+
+
+class VoiceChannel(Canal):
+    """Server-side speech: the voice thread already turns a batch into one summary"""
+
+    nome = "voz"
+    prefixo = "VOICE"
+
+    @property
+    def configurado(self) -> bool:
+        # False once the TTS engine failed to start
+        return voice_worker.disponivel
+
+    async def send_many(self, lote: List[Mensagem]) -> List[Resultado]:
+        resultados = []
+        for mensagem in lote:
+            ok = voice_worker.speak(mensagem.corpo)
+            resultados.append((ok, None if ok else "Mecanismo de voz indisponível"))
+        return resultados
+
+
+class WebhookChannel(Canal):
+    """POSTs the whole batch as one JSON array to WEBHOOK_URL"""
+
+    nome = "webhook"
+    prefixo = "WEBHOOK"
+
+    def __init__(self):
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        loop_id = id(asyncio.get_running_loop())
+        if loop_id not in self._clients:
+            self._clients[loop_id] = httpx.AsyncClient(timeout=settings.ALERT_SEND_TIMEOUT_SECONDS)
+        return self._clients[loop_id]
+
+    @property
+    def configurado(self) -> bool:
+        return bool(settings.WEBHOOK_URL)
+
+    async def send_many(self, lote: List[Mensagem]) -> List[Resultado]:
+        if not self.configurado:
+            return [(False, "WEBHOOK_URL não configurado")] * len(lote)
+        corpo = [
+            {
+                "chave": m.chave,
+                "destinatarios": m.destinatarios,
+                "assunto": m.assunto,
+                "formato": m.formato,
+                "corpo": m.corpo
+            }
+            for m in lote
+        ]
+        headers = {"Authorization": f"Bearer {settings.WEBHOOK_TOKEN}"} if settings.WEBHOOK_TOKEN else {}
+        try:
+            resposta = await self._client().post(settings.WEBHOOK_URL, json=corpo, headers=headers)
+            resposta.raise_for_status()
+        except httpx.HTTPError as e:
+            return [(False, f"Falha no webhook: {e}")] * len(lote)
+        return [(True, None)] * len(lote)
+
+    async def close(self) -> None:
+        client = self._clients.pop(id(asyncio.get_running_loop()), None)
+        if client:
+            await client.aclose()
+
+
+class FileSinkChannel(Canal):
+    """Appends the batch as JSON lines to FILE_SINK_PATH (development, audits, tests)"""
+
+    nome = "arquivo"
+    prefixo = "FILE_SINK"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _gravar(self, linhas: List[str]) -> None:
+        diretorio = os.path.dirname(settings.FILE_SINK_PATH)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        with self._lock, open(settings.FILE_SINK_PATH, "a", encoding="utf-8") as arquivo:
+            arquivo.write("".join(linha + "\n" for linha in linhas))
+
+    async def send_many(self, lote: List[Mensagem]) -> List[Resultado]:
+        agora = datetime.utcnow().isoformat()
+        linhas = [
+            json.dumps({
+                "registrado_em": agora,
+                "chave": m.chave,
+                "destinatarios": m.destinatarios,
+                "assunto": m.assunto,
+                "formato": m.formato,
+                "corpo": m.corpo
+            }, ensure_ascii=False)
+            for m in lote
+        ]
+        try:
+            await asyncio.to_thread(self._gravar, linhas)
+        except OSError as e:
+            return [(False, f"Falha ao gravar {settings.FILE_SINK_PATH}: {e}")] * len(lote)
+        return [(True, None)] * len(lote)
+
+
+_registro: Dict[str, Canal] = {}
+
+
+def register_channel(canal: Canal) -> None:
+    """Add (or replace) a channel in the registry"""
+    _registro[canal.nome] = canal
+
+
+def get_channel(nome: str) -> Canal:
+    """Registered channel by name; KeyError if unknown"""
+    return _registro[nome]
+
+
+def channel_enabled(nome: str) -> bool:
+    canal = _registro.get(nome)
+    return canal is not None and canal.habilitado
+
+
+def channel_ready(nome: str) -> bool:
+    """Enabled and configured: worth queueing optional notifications for"""
+    canal = _registro.get(nome)
+    return canal is not None and canal.habilitado and canal.configurado
+
+
+def enabled_channels() -> List[Canal]:
+    return [canal for canal in _registro.values() if canal.habilitado]
+
+
+async def close_channels() -> None:
+    """Close per-loop resources of every channel"""
+    for canal in _registro.values():
+        await canal.close()
+
+
+for _canal in (EmailChannel(), WhatsAppChannel(), VoiceChannel(), WebhookChannel(), FileSinkChannel()):
+    register_channel(_canal)
@@ -0,0 +1,225 @@
+"""
+CalibraCore Lab - Dashboard Stream Service
+In-process broadcaster for live dashboard updates (Server-Sent Events)
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Equipamento
+
+logger = logging.getLogger(__name__)
+
+
+def calcular_resumo(db: Session) -> Dict[str, int]:
+    """
+    Count active equipment by status in a single aggregate query
+    """
+    hoje = date.today()
+    limite_30 = hoje + timedelta(days=30)
+    limite_60 = hoje + timedelta(days=60)
+
+    vencidos = func.sum(case((Equipamento.data_vencimento < hoje, 1), else_=0))
+    vence_30 = func.sum(case(
+        ((Equipamento.data_vencimento >= hoje) & (Equipamento.data_vencimento <= limite_30), 1),
+        else_=0
+    ))
+    vence_60 = func.sum(case(
+        ((Equipamento.data_vencimento > limite_30) & (Equipamento.data_vencimento <= limite_60), 1),
+        else_=0
+    ))
+
+    total, n_vencidos, n_30, n_60 = db.query(
+        func.count(Equipamento.id), vencidos, vence_30, vence_60
+    ).filter(Equipamento.ativo == True).one()
+
+    total = total or 0
+    n_vencidos = n_vencidos or 0
+    n_30 = n_30 or 0
+    n_60 = n_60 or 0
+
+    return {
+        "total": total,
+        "em_dia": total - n_vencidos - n_30 - n_60,
+        "vence_60_dias": n_60,
+        "vence_30_dias": n_30,
+        "vencidos": n_vencidos
+    }
+
+
+def format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Serialize one Server-Sent Event frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class DashboardBroadcaster:
+    """
+    Fans a single computed dashboard payload out to every connected client.
+
+    Each published event gets a monotonically increasing id and is kept in a
+    bounded buffer so reconnecting clients can resume with Last-Event-ID.
+    """
+
+    def __init__(self, buffer_size: int = 100):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._buffer: Deque[Tuple[int, str, dict]] = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._resumo: Optional[Dict[str, int]] = None
+        self._lock = asyncio.Lock()
+        self._pending: Optional[asyncio.Task] = None
+        self._motivo_pendente: Optional[str] = None
+        self._midnight_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return queue in self._subscribers
+
+    def events_since(self, last_event_id: int) -> Optional[List[Tuple[int, str, dict]]]:
+        """
+        Return buffered events after `last_event_id`, or None when the client is
+        too far behind (or ahead) and needs a fresh snapshot instead
+        """
+        if last_event_id > self._last_id:
+            return None
+        if last_event_id == self._last_id:
+            return []
+        if not self._buffer or self._buffer[0][0] > last_event_id + 1:
+            return None
+        return [ev for ev in self._buffer if ev[0] > last_event_id]
+
+    async def snapshot(self) -> Dict[str, int]:
+        """Current summary, computed once and shared by all clients"""
+        if self._resumo is None:
+            async with self._lock:
+                if self._resumo is None:
+                    self._resumo = await asyncio.to_thread(self._compute)
+        return self._resumo
+
+    def notify(self, motivo: str) -> None:
+        """
+        Schedule a summary recompute after a write. Safe to call from sync or
+        async code and from other threads (scheduler jobs, to_thread workers);
+        calls made while a recompute is pending are coalesced.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._loop is not None and loop is not self._loop:
+            # Subscribers' queues belong to the app's loop: hand it over
+            try:
+                self._loop.call_soon_threadsafe(self.notify, motivo)
+            except RuntimeError:
+                # Loop already closed (shutdown)
+                self._resumo = None
+            return
+        if loop is None:
+            # No event loop (e.g. CLI scripts): nobody is listening
+            self._resumo = None
+            return
+
+        if not self._subscribers:
+            # Nobody listening: just drop the cache so the next snapshot is fresh
+            self._resumo = None
+            return
+
+        self._motivo_pendente = motivo
+        if self._pending and not self._pending.done():
+            return
+        self._pending = loop.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        # Writes that land while a recompute is running trigger one more pass
+        while self._motivo_pendente:
+            motivo = self._motivo_pendente
+            self._motivo_pendente = None
+            await self._publish(motivo)
+
+    async def _publish(self, motivo: str) -> None:
+        try:
+            async with self._lock:
+                anterior = self._resumo
+                atual = await asyncio.to_thread(self._compute)
+                self._resumo = atual
+
+                if anterior is None:
+                    delta = dict(atual)
+                else:
+                    delta = {k: v for k, v in atual.items() if anterior.get(k) != v}
+
+                if not delta:
+                    return
+
+                self._last_id += 1
+                payload = {"motivo": motivo, "alteracoes": delta}
+                evento = (self._last_id, "delta", payload)
+                self._buffer.append(evento)
+
+            for queue in list(self._subscribers):
+                try:
+                    queue.put_nowait(evento)
+                except asyncio.QueueFull:
+                    # Slow client: drop it, EventSource will reconnect and resume
+                    logger.warning("Cliente SSE lento removido do dashboard stream")
+                    self._subscribers.discard(queue)
+        except Exception as e:
+            logger.error(f"Erro ao publicar atualização do dashboard: {e}")
+
+    @staticmethod
+    def _compute() -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            return calcular_resumo(db)
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        """Start the midnight rollover task (call from the app startup event)"""
+        self._loop = asyncio.get_running_loop()
+        if self._midnight_task is None or self._midnight_task.done():
+            self._midnight_task = asyncio.get_running_loop().create_task(self._midnight_loop())
+
+    async def stop(self) -> None:
+        if self._midnight_task:
+            self._midnight_task.cancel()
+            try:
+                await self._midnight_task
+            except asyncio.CancelledError:
+                pass
+            self._midnight_task = None
+        self._loop = None
+
+    async def _midnight_loop(self) -> None:
+        while True:
+            agora = datetime.now()
+            meia_noite = datetime.combine(agora.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((meia_noite - agora).total_seconds() + 1)
+            self.notify("virada_dia")
+
+
+dashboard_broadcaster = DashboardBroadcaster(buffer_size=settings.SSE_BUFFER_SIZE)
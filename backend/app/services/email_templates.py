@@ -0,0 +1,277 @@
+"""
+CalibraCore Lab - Alert E-mail Templates
+Templates are compiled once at import: CSS is inlined into style attributes,
+everything static is baked in and the result is pre-split into literal
+chunks, so rendering a message is one str.join.
+"""
+import re
+from functools import lru_cache
+from html import escape
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+_LAYOUT = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: $largura; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #1e3a5f 0%, #2d5a87 100%); color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f8f9fa; padding: 30px; border: 1px solid #ddd; }
+        .alert-badge { display: inline-block; color: white; padding: 10px 20px; border-radius: 5px; font-weight: bold; font-size: 18px; }
+        .badge-small { display: inline-block; color: white; padding: 4px 10px; border-radius: 5px; font-weight: bold; font-size: 12px; white-space: nowrap; }
+        .info-table { width: 100%; margin: 20px 0; border-collapse: collapse; }
+        .th { text-align: left; padding: 10px; border-bottom: 2px solid #1e3a5f; }
+        .td { padding: 10px; border-bottom: 1px solid #ddd; vertical-align: top; }
+        .label { font-weight: bold; width: 40%; }
+        .footer { background: #1e3a5f; color: white; padding: 15px; text-align: center; border-radius: 0 0 10px 10px; font-size: 12px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>⚗️ CalibraCore Lab</h1>
+            <p>Sistema de Controle de Calibração</p>
+        </div>
+        <div class="content">
+            $conteudo
+            <p style="text-align: center;">
+                Por favor, providencie a recalibração o mais breve possível.
+            </p>
+        </div>
+        <div class="footer">
+            <p>Este é um e-mail automático do CalibraCore Lab.</p>
+            <p>Não responda a este e-mail.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_ALERTA = """<div style="text-align: center; margin-bottom: 20px;">
+                <span class="alert-badge" style="background: $cor;">$urgencia</span>
+            </div>
+
+            <p style="font-size: 16px; text-align: center;">{mensagem}</p>
+
+            <table class="info-table">
+                <tr>
+                    <td class="td label">Código:</td>
+                    <td class="td"><strong>{codigo}</strong></td>
+                </tr>
+                <tr>
+                    <td class="td label">Descrição:</td>
+                    <td class="td">{descricao}</td>
+                </tr>
+                <tr>
+                    <td class="td label">Laboratório:</td>
+                    <td class="td">{laboratorio}</td>
+                </tr>
+                <tr>
+                    <td class="td label">Data de Vencimento:</td>
+                    <td class="td"><strong style="color: $cor;">{data_vencimento}</strong></td>
+                </tr>
+            </table>
+            """
+
+_RESUMO = """<p style="font-size: 16px; text-align: center;">{quantidade} equipamentos precisam de atenção hoje.</p>
+
+            <table class="info-table">
+                <tr>
+                    <th class="th">Situação</th>
+                    <th class="th">Equipamento</th>
+                    <th class="th">Laboratório</th>
+                    <th class="th">Vencimento</th>
+                </tr>{linhas}
+            </table>
+            """
+
+_RESUMO_LINHA = """
+                <tr>
+                    <td class="td">{badge}</td>
+                    <td class="td"><strong>{codigo}</strong><br>{descricao}</td>
+                    <td class="td">{laboratorio}</td>
+                    <td class="td"><strong style="color: {cor};">{data_vencimento}</strong><br>{prazo}</td>
+                </tr>"""
+
+_BADGE_PEQUENO = """<span class="badge-small" style="background: {cor};">{urgencia}</span>"""
+
+# Badge colour and label per alert type. The type comes from the
+# equipment's rule, so it already reflects that rule's day thresholds
+ESTILO_ALERTA = {
+    "inicial": ("#ffc107", "🟡 ATENÇÃO"),
+    "lembrete": ("#ffc107", "🟡 ATENÇÃO"),
+    "urgente": ("#fd7e14", "🟠 URGENTE"),
+    "vencido": ("#dc3545", "🔴 VENCIDO"),
+}
+
+# {prazo}: the actual days left, e.g. "vence em 12 dias"
+ASSUNTO_ALERTA = {
+    "inicial": "[CalibraCore] Aviso: Calibração {prazo} - {codigo}",
+    "lembrete": "[CalibraCore] Lembrete: Calibração {prazo} - {codigo}",
+    "urgente": "[CalibraCore] URGENTE: Calibração {prazo} - {codigo}",
+    "vencido": "[CalibraCore] ⚠️ VENCIDO: Calibração expirada - {codigo}",
+}
+
+_REGRA_CSS = re.compile(r"([.\w-]+)\s*\{([^}]*)\}")
+_TAG = re.compile(r"<(\w+)((?:\s[^<>]*?)?)(/?)>")
+_ATRIBUTO = re.compile(r'\s(class|style)="([^"]*)"')
+_BLOCO_STYLE = re.compile(r"\s*<style>(.*?)</style>", re.S)
+
+
+def parse_css(css: str) -> Dict[str, str]:
+    """Rules of a simple stylesheet as {selector: declarations}"""
+    return {seletor: " ".join(decl.split()) for seletor, decl in _REGRA_CSS.findall(css)}
+
+
+def inline_css(html: str, regras: Dict[str, str]) -> str:
+    """
+    Copy CSS rules into style attributes (e-mail clients drop or mangle
+    <style>). Supports tag and single-class selectors; an element's own
+    style attribute wins over class rules.
+    """
+    def aplicar(tag: re.Match) -> str:
+        nome, atributos, fecha = tag.groups()
+        attrs = dict(_ATRIBUTO.findall(atributos))
+        estilos = [regras[nome]] if nome in regras else []
+        estilos += [regras["." + c] for c in attrs.get("class", "").split() if "." + c in regras]
+        if not estilos:
+            return tag.group(0)
+        if attrs.get("style"):
+            estilos.append(attrs["style"])
+        outros = _ATRIBUTO.sub("", atributos)
+        return f'<{nome}{outros} style="{" ".join(estilos)}"{fecha}>'
+
+    return _TAG.sub(aplicar, html)
+
+
+class CompiledTemplate:
+    """
+    Literal chunks with numbered slots for the per-message fields.
+    Rendering copies the chunk list, fills the slots and joins once, which
+    avoids re-parsing a multi-kilobyte format string for every message.
+    """
+    __slots__ = ("_pedacos", "_slots")
+
+    def __init__(self, formato: str):
+        self._pedacos: List[str] = []
+        self._slots: List[Tuple[int, str]] = []
+        for literal, campo, _, _ in Formatter().parse(formato):
+            self._pedacos.append(literal)
+            if campo is not None:
+                self._slots.append((len(self._pedacos), campo))
+                self._pedacos.append("")
+
+    def render(self, **valores: str) -> str:
+        pedacos = self._pedacos.copy()
+        for indice, campo in self._slots:
+            pedacos[indice] = str(valores[campo])
+        return "".join(pedacos)
+
+
+def _compile(html: str, **estaticos: str) -> CompiledTemplate:
+    """
+    Compile a template: `$nome` placeholders are filled now, the <style>
+    block is inlined, `{nome}` fields are left for each message.
+    """
+    for nome, valor in estaticos.items():
+        html = html.replace(f"${nome}", valor)
+    bloco = _BLOCO_STYLE.search(html)
+    regras = parse_css(bloco.group(1)) if bloco else {}
+    html = _BLOCO_STYLE.sub("", html)
+    html = inline_css(html, {**_REGRAS, **regras})
+    # Only {campo} placeholders are fields; any other brace is literal
+    html = html.replace("{", "{{").replace("}", "}}")
+    return CompiledTemplate(re.sub(r"\{\{(\w+)\}\}", r"{\1}", html))
+
+
+_REGRAS = parse_css(_BLOCO_STYLE.search(_LAYOUT).group(1))
+
+ALERT_TEMPLATES: Dict[str, CompiledTemplate] = {
+    tipo: _compile(_LAYOUT, largura="600px", conteudo=_ALERTA, cor=cor, urgencia=urgencia)
+    for tipo, (cor, urgencia) in ESTILO_ALERTA.items()
+}
+DIGEST_TEMPLATE = _compile(_LAYOUT, largura="700px", conteudo=_RESUMO)
+_DIGEST_LINHA = _compile(_RESUMO_LINHA)
+_BADGE = _compile(_BADGE_PEQUENO)
+
+
+def _dias(n: int) -> str:
+    return "1 dia" if n == 1 else f"{n} dias"
+
+
+# Bounded: overdue day counts keep growing in a long-running server
+@lru_cache(maxsize=4096)
+def alert_style(tipo_alerta: str, dias_restantes: int) -> Tuple[str, str, str]:
+    """
+    Color, urgency label and message for an alert type and the days until expiration
+    """
+    cor, urgencia = ESTILO_ALERTA.get(tipo_alerta, ESTILO_ALERTA["vencido"])
+    if dias_restantes < 0:
+        mensagem = f"O equipamento está com a calibração VENCIDA há {_dias(-dias_restantes)}!"
+    elif dias_restantes == 0:
+        mensagem = "A calibração vence hoje!"
+    elif tipo_alerta == "urgente":
+        mensagem = f"Restam apenas {_dias(dias_restantes)} para o vencimento!"
+    else:
+        mensagem = f"A calibração vence em {_dias(dias_restantes)}."
+    return cor, urgencia, mensagem
+
+
+@lru_cache(maxsize=4096)
+def _digest_fragmentos(tipo_alerta: str, dias_restantes: int) -> Tuple[str, str, str]:
+    """Badge, colour and deadline text of a digest row (static per type and day count)"""
+    cor, urgencia, _ = alert_style(tipo_alerta, dias_restantes)
+    prazo = f"vencido há {_dias(-dias_restantes)}" if dias_restantes < 0 else _dias(dias_restantes)
+    return _BADGE.render(cor=cor, urgencia=urgencia), cor, prazo
+
+
+@lru_cache(maxsize=65536)
+def _escape(valor: Optional[str]) -> str:
+    """HTML-escape a field; codes, labs and descriptions repeat across a run"""
+    return escape(valor or "")
+
+
+def render_subject(tipo_alerta: str, dias: int, codigo: str) -> str:
+    if dias < 0:
+        prazo = f"venceu há {_dias(-dias)}"
+    else:
+        prazo = "vence hoje" if dias == 0 else f"vence em {_dias(dias)}"
+    return ASSUNTO_ALERTA.get(tipo_alerta, ASSUNTO_ALERTA["vencido"]).format(prazo=prazo, codigo=codigo)
+
+
+def render_alert(
+    tipo_alerta: str,
+    codigo: str,
+    descricao: str,
+    laboratorio: str,
+    data_vencimento: str,
+    dias_restantes: int
+) -> str:
+    """Render one alert e-mail from its precompiled template"""
+    template = ALERT_TEMPLATES.get(tipo_alerta, ALERT_TEMPLATES["vencido"])
+    return template.render(
+        mensagem=alert_style(tipo_alerta, dias_restantes)[2],
+        codigo=_escape(codigo),
+        descricao=_escape(descricao),
+        laboratorio=_escape(laboratorio),
+        data_vencimento=data_vencimento
+    )
+
+
+def render_digest(itens: List[dict]) -> str:
+    """Render the digest e-mail (items as in get_alert_digest_email_html)"""
+    linhas = []
+    for item in itens:
+        badge, cor, prazo = _digest_fragmentos(item["tipo_alerta"], item["dias_restantes"])
+        linhas.append(_DIGEST_LINHA.render(
+            badge=badge,
+            cor=cor,
+            prazo=prazo,
+            codigo=_escape(item["equipamento_codigo"]),
+            descricao=_escape(item["equipamento_descricao"]),
+            laboratorio=_escape(item["laboratorio"]),
+            data_vencimento=item["data_vencimento"]
+        ))
+    return DIGEST_TEMPLATE.render(quantidade=len(itens), linhas="".join(linhas))
@@ -0,0 +1,81 @@
+"""
+CalibraCore Lab - Run Metrics
+Phase timings and per-channel send latencies of an alert run. Channels
+report their sends to the collector of the current context, so a run sees
+only its own sends even while the outbox worker delivers other messages.
+"""
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not valores:
+        return 0.0
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+class Cronometro:
+    """
+    Lap timer: etapa(nome) charges the time since the previous mark to
+    phase `nome` (ms, accumulated when a phase repeats)
+    """
+
+    def __init__(self):
+        self.fases: Dict[str, float] = {}
+        self._marca = time.perf_counter()
+
+    def etapa(self, nome: str) -> None:
+        agora = time.perf_counter()
+        self.fases[nome] = round(self.fases.get(nome, 0.0) + (agora - self._marca) * 1000, 1)
+        self._marca = agora
+
+
+class ColetorLatencia:
+    """Send latencies per channel (ms) and how many of those sends failed"""
+
+    def __init__(self):
+        self._amostras: Dict[str, List[float]] = {}
+        self._falhas: Dict[str, int] = {}
+
+    def registrar(self, canal: str, segundos: float, ok: bool) -> None:
+        self._amostras.setdefault(canal, []).append(segundos * 1000)
+        if not ok:
+            self._falhas[canal] = self._falhas.get(canal, 0) + 1
+
+    def resumo(self) -> Dict[str, dict]:
+        resumo = {}
+        for canal, amostras in self._amostras.items():
+            ordenadas = sorted(amostras)
+            resumo[canal] = {
+                "envios": len(ordenadas),
+                "falhas": self._falhas.get(canal, 0),
+                "p50_ms": round(percentil(ordenadas, 50), 1),
+                "p95_ms": round(percentil(ordenadas, 95), 1),
+                "p99_ms": round(percentil(ordenadas, 99), 1),
+                "max_ms": round(ordenadas[-1], 1)
+            }
+        return resumo
+
+
+_coletor: contextvars.ContextVar[Optional[ColetorLatencia]] = contextvars.ContextVar("coletor_latencia", default=None)
+
+
+@contextmanager
+def coletar_latencias(coletor: ColetorLatencia):
+    """Send latencies recorded in this context (and tasks it starts) go to `coletor`"""
+    token = _coletor.set(coletor)
+    try:
+        yield coletor
+    finally:
+        _coletor.reset(token)
+
+
+def registrar_latencia(canal: str, segundos: float, ok: bool) -> None:
+    """Record one send on the current collector, if any"""
+    coletor = _coletor.get()
+    if coletor is not None:
+        coletor.registrar(canal, segundos, ok)
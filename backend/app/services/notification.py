@@ -1,115 +1,97 @@
-import os
 import logging
-from typing import List
-from datetime import datetime
-from aiosmtplib import SMTP, SMTPException
-from twilio.rest import Client as TwilioClient
-import pyttsx3
+from typing import List, Optional, Tuple
 
-logger = logging.getLogger(__name__)
+from app.config import settings
+from app.services.canais import Mensagem, get_channel
+from app.services.email_templates import alert_style, render_subject
+from app.services.regras_alerta import Regra
+from app.services.voz import voice_worker
 
-# Email configuration (expects env vars)
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.example.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER", "user@example.com")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "password")
-FROM_EMAIL = os.getenv("FROM_EMAIL", SMTP_USER)
-ALERT_RECIPIENTS = os.getenv("ALERT_RECIPIENTS", "")
+logger = logging.getLogger(__name__)
 
-# Twilio configuration (expects env vars)
-TWILIO_SID = os.getenv("TWILIO_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")  # e.g., 'whatsapp:+14155238886'
 
-# Voice engine initialization (offline)
-try:
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)
-except Exception as e:
-    logger.warning(f"Voice engine initialization failed (expected on headless server): {e}")
-    engine = None
+async def _send_one(canal: str, mensagem: Mensagem) -> bool:
+    (ok, erro), = await get_channel(canal).send_many([mensagem])
+    if not ok:
+        logger.error(f"Failed to send {canal} notification: {erro}")
+    return ok
 
-async def send_email(to: List[str], subject: str, body: str) -> bool:
-    """Send an email to a list of recipients.
+async def send_email(to: List[str], subject: str, body: str, message_id: Optional[str] = None) -> bool:
+    """Send a plain-text email to a list of recipients (e-mail channel).
     Returns True on success, False otherwise.
     """
-    message = f"From: {FROM_EMAIL}\nTo: {', '.join(to)}\nSubject: {subject}\n\n{body}"
-    try:
-        smtp = SMTP(hostname=SMTP_HOST, port=SMTP_PORT, use_tls=False)
-        await smtp.connect()
-        await smtp.starttls()
-        await smtp.login(SMTP_USER, SMTP_PASSWORD)
-        await smtp.sendmail(FROM_EMAIL, to, message)
-        await smtp.quit()
-        logger.info(f"Email sent to {to}")
-        return True
-    except SMTPException as e:
-        logger.error(f"Failed to send email: {e}")
-        return False
+    return await _send_one("email", Mensagem(body, to, subject, message_id=message_id))
 
 async def send_whatsapp(to_number: str, message: str) -> bool:
-    """Send a WhatsApp message using Twilio.
+    """Send a WhatsApp message using Twilio (WhatsApp channel).
     `to_number` must be in the format 'whatsapp:+1234567890'.
     """
-    if not all([TWILIO_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER]):
-        logger.warning("Twilio credentials not configured; skipping WhatsApp alert.")
-        return False
-    try:
-        client = TwilioClient(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        client.messages.create(body=message, from_=TWILIO_WHATSAPP_NUMBER, to=to_number)
-        logger.info(f"WhatsApp message sent to {to_number}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send WhatsApp message: {e}")
-        return False
+    return await _send_one("whatsapp", Mensagem(message, [to_number]))
 
 def send_voice_alert(message: str) -> bool:
-    """Play a voice alert on the server (useful for local deployments)."""
-    try:
-        if engine:
-            engine.say(message)
-            engine.runAndWait()
-            logger.info("Voice alert played.")
-            return True
-        return False
-    except Exception as e:
-        logger.error(f"Voice alert failed: {e}")
-        return False
+    """Queue a voice alert on the server (useful for local deployments).
+    Returns immediately; the voice thread speaks it, coalescing bursts.
+    """
+    return voice_worker.speak(message)
 
-async def alert_expiration(equipment, recipients_email: List[str], recipients_whatsapp: List[str]):
-    """Determine alert level based on days to expiration and send notifications.
-    `equipment` is an instance of Equipamento model.
+def build_expiration_alert(equipment, regra: Regra) -> Optional[Tuple[str, str, str]]:
+    """Alert type, subject and body of the expiration alert for `equipment`
+    under its rule, or None when the rule's first alert is still ahead.
     """
     days = equipment.dias_para_vencer
+    # The type Regra.tipo() gives on the rule's days, also between them
+    tipo = regra.faixa(days)
+    if tipo is None:
+        return None  # No alert needed
+    subject = render_subject(tipo, days, equipment.codigo_interno)
     if days < 0:
-        level = "VENCIDO"
-        subject = f"⚠️ Equipamento vencido: {equipment.codigo_interno}"
         body = f"O equipamento {equipment.codigo_interno} ({equipment.descricao}) está vencido desde {equipment.data_vencimento}."
-    elif days <= 7:
-        level = "URGENTE"
-        subject = f"⏰ Aviso urgente: equipamento próximo ao vencimento ({days} dias)"
-        body = f"O equipamento {equipment.codigo_interno} vence em {days} dias ({equipment.data_vencimento})."
-    elif days <= 15:
-        level = "LEMBRETE"
-        subject = f"🔔 Lembrete: equipamento vence em {days} dias"
-        body = f"O equipamento {equipment.codigo_interno} ({equipment.descricao}) vence em {days} dias ({equipment.data_vencimento})."
     else:
-        return  # No alert needed
+        body = f"O equipamento {equipment.codigo_interno} ({equipment.descricao}): {alert_style(tipo, days)[2]} Vencimento: {equipment.data_vencimento}."
+    return tipo, subject, body
 
-    # Merge with default recipients
+def merge_alert_recipients(recipients_email: List[str]) -> List[str]:
+    """Add the default ALERT_RECIPIENTS and deduplicate."""
     final_emails = list(recipients_email)
-    if ALERT_RECIPIENTS:
-        final_emails.extend([e.strip() for e in ALERT_RECIPIENTS.split(",") if e.strip()])
-    
-    # Deduplicate
-    final_emails = list(set(final_emails))
+    if settings.ALERT_RECIPIENTS:
+        final_emails.extend([e.strip() for e in settings.ALERT_RECIPIENTS.split(",") if e.strip()])
+    return list(dict.fromkeys(final_emails))
+
+def expiration_alert_recipients(equipment) -> Tuple[List[str], List[str]]:
+    """E-mails (ALERT_RECIPIENTS, the responsible user, the equipment's
+    contact) and WhatsApp numbers (the equipment's contact) for `equipment`.
+    """
+    emails = []
+    responsavel = equipment.responsavel_usuario
+    if responsavel and responsavel.ativo and responsavel.email:
+        emails.append(responsavel.email)
+    if equipment.email_contato:
+        emails.append(equipment.email_contato)
+    whatsapps = []
+    if equipment.telefone_contato:
+        num = equipment.telefone_contato
+        whatsapps.append(num if num.startswith("whatsapp:") else f"whatsapp:{num}")
+    return merge_alert_recipients(emails), whatsapps
+
+async def alert_expiration(
+    equipment, recipients_email: List[str], recipients_whatsapp: List[str], regra: Optional[Regra] = None
+):
+    """Determine alert level from the equipment's rule (default: ALERT_*
+    settings) and send notifications. `equipment` is an instance of
+    Equipamento model. Each enabled channel gets its messages as one batch.
+    """
+    alert = build_expiration_alert(equipment, regra or Regra.padrao())
+    if alert is None:
+        return  # No alert needed
+    _, subject, body = alert
 
-    # Send email
-    if final_emails:
-        await send_email(final_emails, subject, body)
-    
-    # Send WhatsApp for each number
-    for num in recipients_whatsapp:
-        await send_whatsapp(num, body)
-    # Voice alert (optional)
-    send_voice_alert(body)
+    final_emails = merge_alert_recipients(recipients_email)
+    lotes = {
+        "email": [Mensagem(body, final_emails, subject)] if final_emails else [],
+        "whatsapp": [Mensagem(body, [num]) for num in recipients_whatsapp],
+        "voz": [Mensagem(body)],
+    }
+    for nome, lote in lotes.items():
+        canal = get_channel(nome)
+        if lote and canal.habilitado:
+            await canal.send_many(lote)
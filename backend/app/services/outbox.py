@@ -0,0 +1,484 @@
+"""
+CalibraCore Lab - Notification Outbox
+Durable notification queue and the async worker that delivers it
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, insert_ignore
+from app.models import AlertaEnviado, NotificacaoAlerta, NotificacaoOutbox
+from app.services import notification
+from app.services.canais import Mensagem, Resultado, channel_enabled, channel_ready, get_channel
+from app.services.rate_limit import (
+    PRIORIDADE_PADRAO, channel_limits, prioridade_alerta, quota_window
+)
+from app.services.regras_alerta import alert_rules
+
+logger = logging.getLogger(__name__)
+
+# Poll interval of drain() while another worker finishes rows it claimed
+ESPERA_DRENAGEM_SEGUNDOS = 0.2
+
+
+def enqueue(
+    db: Session,
+    chave: str,
+    canal: str,
+    corpo: str,
+    destinatarios: Optional[List[str]] = None,
+    assunto: Optional[str] = None,
+    formato: str = "texto",
+    origem: Optional[str] = None,
+    alerta_ids: Optional[List[int]] = None,
+    prioridade: int = PRIORIDADE_PADRAO
+) -> None:
+    """
+    Queue a notification in the caller's transaction (does not commit).
+    Enqueueing the same idempotency key twice is a no-op, and so is
+    enqueueing on a disabled channel.
+    """
+    if not channel_enabled(canal):
+        return
+    agora = datetime.utcnow()
+    inserido = db.execute(insert_ignore(NotificacaoOutbox, ["chave"]).values(
+        chave=chave,
+        canal=canal,
+        formato=formato,
+        destinatarios=json.dumps(destinatarios or []),
+        assunto=assunto,
+        corpo=corpo,
+        origem=origem,
+        alerta_ids=json.dumps(alerta_ids) if alerta_ids else None,
+        prioridade=prioridade,
+        status="pendente",
+        tentativas=0,
+        proxima_tentativa=agora,
+        criado_em=agora
+    ).returning(NotificacaoOutbox.id)).scalar()
+    if inserido is not None and alerta_ids:
+        db.execute(insert(NotificacaoAlerta), [
+            {"notificacao_id": inserido, "alerta_id": alerta_id} for alerta_id in alerta_ids
+        ])
+
+
+def enqueue_equipment_notification(
+    db: Session,
+    equipment,
+    motivo: str,
+    subject: str,
+    body: str,
+    prioridade: int = PRIORIDADE_PADRAO,
+    voz: bool = True
+) -> int:
+    """
+    Queue a notification about `equipment` to its recipients
+    (notification.expiration_alert_recipients) on every channel that is
+    enabled and configured; nothing is queued just to fail and be retried.
+    Returns how many messages were queued. Does not commit.
+    """
+    emails, whatsapps = notification.expiration_alert_recipients(equipment)
+    origem = f"equipamento:{equipment.id}"
+    versao = f"{origem}:{motivo}:{uuid4().hex}"
+    filas = 0
+    if emails and channel_ready("email"):
+        enqueue(db, f"{versao}:email", "email", body, emails, subject, origem=origem, prioridade=prioridade)
+        filas += 1
+    if channel_ready("whatsapp"):
+        for num in whatsapps:
+            enqueue(db, f"{versao}:whatsapp:{num}", "whatsapp", body, [num], origem=origem, prioridade=prioridade)
+            filas += 1
+    if voz and channel_ready("voz"):
+        enqueue(db, f"{versao}:voz", "voz", body, origem=origem, prioridade=prioridade)
+        filas += 1
+    return filas
+
+
+def enqueue_expiration_alert(db: Session, equipment, motivo: str) -> bool:
+    """
+    Queue the expiration alert for `equipment` under its alert rule.
+    Returns False when the rule's first alert is still ahead. Does not commit.
+    """
+    regra = alert_rules(db).regra_para(equipment.categoria, equipment.laboratorio)
+    alert = notification.build_expiration_alert(equipment, regra)
+    if alert is None:
+        return False
+    tipo, subject, body = alert
+    enqueue_equipment_notification(db, equipment, motivo, subject, body, prioridade_alerta(tipo))
+    return True
+
+
+def cancel_pending(db: Session, origem: str) -> int:
+    """
+    Cancel the undelivered notifications of `origem` (e.g. of an equipment
+    that was deactivated); rows already being sent are left alone.
+    Does not commit.
+    """
+    resultado = db.execute(
+        update(NotificacaoOutbox)
+        .where(NotificacaoOutbox.origem == origem, NotificacaoOutbox.status.in_(["pendente", "erro"]))
+        .values(status="cancelado", ultimo_erro="Cancelada: equipamento desativado")
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount
+
+
+def prune_outbox(db: Session) -> int:
+    """
+    Delete final rows (sent, failed, cancelled) older than
+    OUTBOX_RETENTION_DAYS, with their alert links; commits
+    """
+    limite = datetime.utcnow() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    finais = and_(
+        NotificacaoOutbox.status.in_(["enviado", "falhou", "cancelado"]),
+        NotificacaoOutbox.criado_em < limite
+    )
+    db.execute(
+        delete(NotificacaoAlerta)
+        .where(NotificacaoAlerta.notificacao_id.in_(select(NotificacaoOutbox.id).where(finais)))
+        .execution_options(synchronize_session=False)
+    )
+    removidas = db.execute(
+        delete(NotificacaoOutbox).where(finais).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return removidas
+
+
+def link_legacy_alert_ids(conn) -> None:
+    """Create the alert links of unfinished rows queued before notificacoes_alertas existed"""
+    sem_vinculo = conn.execute(
+        select(NotificacaoOutbox.id, NotificacaoOutbox.alerta_ids).where(
+            NotificacaoOutbox.alerta_ids.isnot(None),
+            NotificacaoOutbox.status.in_(["pendente", "processando", "erro"]),
+            ~NotificacaoOutbox.id.in_(select(NotificacaoAlerta.notificacao_id))
+        )
+    ).all()
+    vinculos = [
+        {"notificacao_id": notificacao_id, "alerta_id": alerta_id}
+        for notificacao_id, alerta_ids in sem_vinculo
+        for alerta_id in json.loads(alerta_ids)
+    ]
+    if vinculos:
+        conn.execute(insert(NotificacaoAlerta), vinculos)
+
+
+def _backoff(tentativas: int) -> timedelta:
+    segundos = settings.OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(tentativas - 1, 0))
+    return timedelta(seconds=min(segundos, settings.OUTBOX_BACKOFF_MAX_SECONDS))
+
+
+def _mensagem(item: NotificacaoOutbox) -> Mensagem:
+    return Mensagem(
+        item.corpo,
+        destinatarios=json.loads(item.destinatarios or "[]"),
+        assunto=item.assunto,
+        formato=item.formato or "texto",
+        chave=item.chave,
+        message_id=f"<{item.chave.replace(':', '.')}@calibracore.lab>"
+    )
+
+
+async def _send_batch(canal: str, itens: List[NotificacaoOutbox]) -> List[Resultado]:
+    """Hand a channel its whole batch; failures of the call fail every item"""
+    try:
+        envio = get_channel(canal).send_many([_mensagem(item) for item in itens])
+    except KeyError:
+        return [(False, f"Canal desconhecido: {canal}")] * len(itens)
+    try:
+        resultados = await envio
+    except Exception as e:
+        logger.error(f"Erro no canal {canal}: {e}")
+        return [(False, f"Falha no envio: {e}")] * len(itens)
+    return [
+        (ok, erro or (None if ok else f"Falha no envio ({canal})"))
+        for ok, erro in resultados
+    ]
+
+
+class OutboxWorker:
+    """
+    Claims due outbox rows in batches (with a lease so a crashed worker's rows
+    are picked up again), hands each channel its batch and records the
+    outcome, retrying failures with exponential backoff.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._parar = False
+
+    @staticmethod
+    def _disponivel(agora: datetime):
+        return or_(
+            and_(
+                NotificacaoOutbox.status.in_(["pendente", "erro"]),
+                NotificacaoOutbox.proxima_tentativa <= agora
+            ),
+            # Lease expired: the worker sending it died
+            and_(
+                NotificacaoOutbox.status == "processando",
+                NotificacaoOutbox.bloqueado_ate < agora
+            )
+        )
+
+    @staticmethod
+    def _quota_restante(db: Session, canal: str, inicio_janela: datetime) -> Optional[int]:
+        """Messages this channel may still send today, None if unlimited"""
+        _, por_dia = channel_limits(canal)
+        if por_dia <= 0:
+            return None
+        usados = db.query(func.count(NotificacaoOutbox.id)).filter(
+            NotificacaoOutbox.canal == canal,
+            or_(
+                NotificacaoOutbox.enviado_em >= inicio_janela,
+                NotificacaoOutbox.status == "processando"
+            )
+        ).scalar()
+        return max(por_dia - usados, 0)
+
+    def _defer(self, db: Session, canal: str, filtro, fim_janela: datetime) -> None:
+        """Push a channel's due messages to the next quota window (no attempt used)"""
+        ids = [
+            row[0] for row in db.query(NotificacaoOutbox.id).filter(
+                filtro, NotificacaoOutbox.canal == canal, NotificacaoOutbox.alerta_ids.isnot(None)
+            )
+        ]
+        adiados = db.execute(
+            update(NotificacaoOutbox)
+            .where(filtro, NotificacaoOutbox.canal == canal)
+            .values(
+                status="pendente",
+                proxima_tentativa=fim_janela,
+                bloqueado_ate=None,
+                token_lote=None,
+                ultimo_erro=f"Cota diária de {canal} esgotada, adiado para a próxima janela"
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if adiados:
+            logger.warning(f"Cota diária de {canal} esgotada: {adiados} notificações adiadas")
+        self._sync_alertas(db, ids)
+
+    def _claim(self, db: Session, origem: Optional[str] = None) -> List[NotificacaoOutbox]:
+        agora = datetime.utcnow()
+        inicio_janela, fim_janela = quota_window()
+        filtro = self._disponivel(agora)
+        if origem:
+            filtro = and_(filtro, NotificacaoOutbox.origem == origem)
+
+        canais = [row[0] for row in db.query(NotificacaoOutbox.canal).filter(filtro).distinct()]
+        ids = []
+        for canal in canais:
+            try:
+                registrado = get_channel(canal)
+            except KeyError:
+                registrado = None  # Claimed anyway, so it fails and is reported
+            if registrado is not None and not registrado.habilitado:
+                continue  # Disabled channel: keep its rows until it is enabled again
+
+            restante = self._quota_restante(db, canal, inicio_janela)
+            if restante == 0:
+                self._defer(db, canal, filtro, fim_janela)
+                continue
+
+            quantidade = registrado.tamanho_lote if registrado else settings.OUTBOX_BATCH_SIZE
+            if restante is not None:
+                quantidade = min(quantidade, restante)
+            por_minuto, _ = channel_limits(canal)
+            if por_minuto > 0:
+                # Do not claim more than the rate limit lets us send within the lease
+                quantidade = min(quantidade, max(1, por_minuto * settings.OUTBOX_LEASE_SECONDS // 120))
+
+            # Most urgent alerts first, so a short quota goes to overdue equipment
+            ids.extend(
+                row[0] for row in db.query(NotificacaoOutbox.id).filter(
+                    filtro, NotificacaoOutbox.canal == canal
+                ).order_by(
+                    func.coalesce(NotificacaoOutbox.prioridade, PRIORIDADE_PADRAO),
+                    NotificacaoOutbox.proxima_tentativa,
+                    NotificacaoOutbox.id
+                ).limit(quantidade)
+            )
+
+        if not ids:
+            db.commit()
+            return []
+
+        token = uuid4().hex
+        db.execute(
+            update(NotificacaoOutbox)
+            .where(NotificacaoOutbox.id.in_(ids), self._disponivel(agora))
+            .values(
+                status="processando",
+                token_lote=token,
+                bloqueado_ate=agora + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return db.query(NotificacaoOutbox).filter(NotificacaoOutbox.token_lote == token).all()
+
+    async def process_batch(self, origem: Optional[str] = None) -> int:
+        """Claim and deliver one batch; returns how many rows were processed"""
+        db = SessionLocal()
+        try:
+            itens = self._claim(db, origem)
+            if not itens:
+                return 0
+
+            # One batch per channel, all channels in parallel
+            por_canal: Dict[str, List[NotificacaoOutbox]] = {}
+            for item in itens:
+                por_canal.setdefault(item.canal, []).append(item)
+            lotes = await asyncio.gather(*(_send_batch(canal, lote) for canal, lote in por_canal.items()))
+            itens = [item for lote in por_canal.values() for item in lote]
+            resultados = [resultado for lote in lotes for resultado in lote]
+
+            agora = datetime.utcnow()
+            atualizacoes = []
+            for item, (ok, erro) in zip(itens, resultados):
+                tentativas = item.tentativas + 1
+                if ok:
+                    valores = {"status": "enviado", "enviado_em": agora, "ultimo_erro": None}
+                elif tentativas >= settings.OUTBOX_MAX_TENTATIVAS:
+                    valores = {"status": "falhou", "ultimo_erro": erro}
+                    logger.error(f"Notificação {item.chave} descartada após {tentativas} tentativas: {erro}")
+                else:
+                    valores = {
+                        "status": "erro",
+                        "ultimo_erro": erro,
+                        "proxima_tentativa": agora + _backoff(tentativas)
+                    }
+                    logger.warning(f"Notificação {item.chave} falhou (tentativa {tentativas}): {erro}")
+                atualizacoes.append({
+                    "id": item.id,
+                    "tentativas": tentativas,
+                    "bloqueado_ate": None,
+                    "token_lote": None,
+                    **valores
+                })
+
+            db.execute(update(NotificacaoOutbox), atualizacoes)
+            self._sync_alertas(db, [item.id for item in itens if item.alerta_ids])
+            db.commit()
+            return len(itens)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _sync_alertas(db: Session, notificacao_ids: List[int]) -> None:
+        """
+        Reflect outbox outcomes on AlertaEnviado: an alert succeeds once every
+        message covering it was sent, and fails if any of them gave up. Only
+        the alerts covered by `notificacao_ids` are looked at.
+        """
+        if not notificacao_ids:
+            return
+        cobertos = select(NotificacaoAlerta.alerta_id).where(NotificacaoAlerta.notificacao_id.in_(notificacao_ids))
+        mensagens = db.query(
+            NotificacaoAlerta.alerta_id, NotificacaoOutbox.status, NotificacaoOutbox.ultimo_erro
+        ).join(
+            NotificacaoOutbox, NotificacaoOutbox.id == NotificacaoAlerta.notificacao_id
+        ).filter(NotificacaoAlerta.alerta_id.in_(cobertos)).all()
+
+        estado: Dict[int, Tuple[str, Optional[str]]] = {}
+        for alerta_id, status, erro in mensagens:
+            atual = estado.get(alerta_id, ("enviado", None))
+            if atual[0] == "falhou":
+                continue
+            if status == "falhou":
+                estado[alerta_id] = ("falhou", erro)
+            elif status != "enviado":
+                estado[alerta_id] = ("pendente", erro)
+            else:
+                estado.setdefault(alerta_id, atual)
+
+        atualizacoes = []
+        for alerta_id, (status, erro) in estado.items():
+            if status == "enviado":
+                atualizacoes.append({"id": alerta_id, "sucesso": True, "mensagem_erro": None})
+            elif status == "falhou":
+                atualizacoes.append({"id": alerta_id, "sucesso": False, "mensagem_erro": erro})
+            elif erro:
+                atualizacoes.append({
+                    "id": alerta_id,
+                    "sucesso": False,
+                    "mensagem_erro": f"Nova tentativa agendada: {erro}"
+                })
+        if atualizacoes:
+            db.execute(update(AlertaEnviado), atualizacoes)
+
+    @staticmethod
+    def _em_envio(origem: Optional[str]) -> bool:
+        """Whether another worker still holds (unexpired) rows of `origem`"""
+        db = SessionLocal()
+        try:
+            query = db.query(NotificacaoOutbox.id).filter(
+                NotificacaoOutbox.status == "processando",
+                NotificacaoOutbox.bloqueado_ate >= datetime.utcnow()
+            )
+            if origem:
+                query = query.filter(NotificacaoOutbox.origem == origem)
+            return query.first() is not None
+        finally:
+            db.close()
+
+    async def drain(self, origem: Optional[str] = None) -> None:
+        """
+        Deliver everything currently due (optionally for one origin). Also
+        waits for rows the background worker claimed first, so outcomes
+        read afterwards are final (sent, or waiting for a retry).
+        """
+        while True:
+            while await self.process_batch(origem):
+                pass
+            if not self._em_envio(origem):
+                return
+            await asyncio.sleep(ESPERA_DRENAGEM_SEGUNDOS)
+
+    def wake(self) -> None:
+        """Signal new work (call after committing enqueued rows)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._parar:
+            try:
+                processados = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Erro no worker de notificações: {e}")
+                processados = 0
+            if processados:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._parar = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        self._parar = True
+        if self._task:
+            self.wake()
+            try:
+                await asyncio.wait_for(self._task, timeout=settings.ALERT_SEND_TIMEOUT_SECONDS)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+
+
+outbox_worker = OutboxWorker()
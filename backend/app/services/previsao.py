@@ -0,0 +1,115 @@
+"""
+CalibraCore Lab - Expiration Forecast Service
+Vectorized weekly expiration forecast per laboratory and category
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import String, cast
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Equipamento
+
+
+def _load_arrays(db: Session, laboratorio: Optional[str], categoria: Optional[str]):
+    """
+    Load only the columns needed and convert dates to int64 day numbers.
+    Dates are selected as ISO text and parsed by NumPy in one pass instead
+    of building a Python date object per row.
+    """
+    query = db.query(
+        Equipamento.laboratorio,
+        Equipamento.categoria,
+        cast(Equipamento.data_ultima_calibracao, String),
+        cast(Equipamento.data_vencimento, String)
+    ).filter(Equipamento.ativo == True)
+
+    if laboratorio:
+        query = query.filter(Equipamento.laboratorio == laboratorio)
+    if categoria:
+        query = query.filter(Equipamento.categoria == categoria)
+
+    rows = query.all()
+    n = len(rows)
+    if n == 0:
+        vazio = np.zeros(0, dtype=np.int64)
+        return [], vazio, vazio, vazio
+
+    labs, cats, ultimas, vencimentos = zip(*rows)
+
+    grupos: Dict[tuple, int] = {}
+    codigos = np.fromiter(
+        (grupos.setdefault(chave, len(grupos)) for chave in zip(labs, cats)),
+        dtype=np.int64, count=n
+    )
+
+    vencimento = np.array(vencimentos, dtype="datetime64[D]").astype(np.int64)
+    # Missing last calibration (NULL -> NaT) yields a zero interval, i.e. "unknown"
+    ultima = np.array(ultimas, dtype="datetime64[D]")
+    ultima = np.where(np.isnat(ultima), vencimento, ultima.astype(np.int64))
+    return list(grupos.keys()), codigos, ultima, vencimento
+
+
+def calcular_previsao(
+    db: Session,
+    semanas: int = 52,
+    laboratorio: Optional[str] = None,
+    categoria: Optional[str] = None
+) -> dict:
+    """
+    Count expirations per week over the next `semanas` weeks, per
+    (laboratorio, categoria). Each instrument recurs every calibration
+    interval (data_vencimento - data_ultima_calibracao), falling back to
+    PREVISAO_INTERVALO_PADRAO_DIAS when unknown.
+    """
+    hoje = date.today()
+    inicio = int(np.datetime64(hoje, "D").astype(np.int64))
+    fim = inicio + semanas * 7
+
+    grupos, codigos, ultima, vencimento = _load_arrays(db, laboratorio, categoria)
+    n_grupos = len(grupos)
+
+    intervalo = vencimento - ultima
+    intervalo = np.where(
+        intervalo >= settings.PREVISAO_INTERVALO_MINIMO_DIAS,
+        intervalo,
+        settings.PREVISAO_INTERVALO_PADRAO_DIAS
+    )
+
+    vencidos = np.bincount(codigos[vencimento < inicio], minlength=n_grupos)
+
+    # First occurrence on or after today (overdue items roll forward by whole intervals)
+    atraso = np.maximum(inicio - vencimento, 0)
+    ocorrencia = vencimento + (-(-atraso // intervalo)) * intervalo
+
+    contagem = np.zeros(n_grupos * semanas, dtype=np.int64)
+    ativos = ocorrencia < fim
+    while ativos.any():
+        occ = ocorrencia[ativos]
+        indice = codigos[ativos] * semanas + (occ - inicio) // 7
+        contagem += np.bincount(indice, minlength=n_grupos * semanas)
+        ocorrencia = ocorrencia + intervalo
+        ativos = ocorrencia < fim
+
+    contagem = contagem.reshape(n_grupos, semanas) if n_grupos else np.zeros((0, semanas), dtype=np.int64)
+
+    itens: List[dict] = []
+    for i, (lab, cat) in enumerate(grupos):
+        itens.append({
+            "laboratorio": lab,
+            "categoria": cat,
+            "vencidos": int(vencidos[i]),
+            "total": int(contagem[i].sum()),
+            "por_semana": contagem[i].tolist()
+        })
+    itens.sort(key=lambda g: (g["laboratorio"] or "", g["categoria"] or ""))
+
+    return {
+        "inicio": hoje,
+        "semanas": semanas,
+        "inicio_semanas": [hoje + timedelta(days=7 * s) for s in range(semanas)],
+        "total_por_semana": contagem.sum(axis=0).tolist(),
+        "grupos": itens
+    }
@@ -0,0 +1,89 @@
+"""
+CalibraCore Lab - Channel Rate Limiting
+Per-channel token buckets (per-minute) and daily quotas for notifications
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+# Lower value = delivered first when a channel's daily quota runs short
+PRIORIDADE_ALERTA = {
+    "vencido": 0,
+    "urgente": 1,
+    "lembrete": 2,
+    "inicial": 3,
+}
+PRIORIDADE_PADRAO = 4
+
+
+def prioridade_alerta(tipo_alerta: Optional[str]) -> int:
+    return PRIORIDADE_ALERTA.get(tipo_alerta, PRIORIDADE_PADRAO)
+
+
+def channel_limits(canal: str) -> Tuple[int, int]:
+    """(per minute, per day) for a channel; 0 means unlimited"""
+    limites = {
+        "email": (settings.EMAIL_RATE_PER_MINUTE, settings.EMAIL_QUOTA_PER_DAY),
+        "whatsapp": (settings.WHATSAPP_RATE_PER_MINUTE, settings.WHATSAPP_QUOTA_PER_DAY),
+    }
+    return limites.get(canal, (0, 0))
+
+
+def quota_window() -> Tuple[datetime, datetime]:
+    """
+    Current daily quota window as naive UTC datetimes (local midnight to
+    local midnight), matching the utcnow() timestamps stored in the DB
+    """
+    agora = datetime.now()
+    deslocamento = datetime.utcnow() - agora
+    inicio = datetime.combine(agora.date(), datetime.min.time())
+    return inicio + deslocamento, inicio + timedelta(days=1) + deslocamento
+
+
+class TokenBucket:
+    """
+    Async token bucket: bursts up to `capacidade`, refills at `por_minuto`.
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, por_minuto: int, capacidade: Optional[int] = None):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = float(capacidade or por_minuto)
+        self._tokens = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.taxa)
+                self._refill()
+            self._tokens -= 1
+
+
+_buckets: Dict[Tuple[int, str], Optional[TokenBucket]] = {}
+
+
+def get_rate_limiter(canal: str) -> Optional[TokenBucket]:
+    """Shared per-minute limiter for a channel (one per event loop), None if unlimited"""
+    chave = (id(asyncio.get_running_loop()), canal)
+    if chave not in _buckets:
+        por_minuto, _ = channel_limits(canal)
+        _buckets[chave] = TokenBucket(por_minuto) if por_minuto > 0 else None
+    return _buckets[chave]
+
+
+async def throttle(canal: str) -> None:
+    """Wait for a send slot on this channel"""
+    limiter = get_rate_limiter(canal)
+    if limiter is not None:
+        await limiter.acquire()
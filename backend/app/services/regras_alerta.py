@@ -0,0 +1,226 @@
+"""
+CalibraCore Lab - Alert Rules
+Per-category/laboratory alert schedules (regras_alerta) compiled once into
+a plan: a SQL CASE giving each equipment row the index of its rule, and
+per-rule lookup tables of the alert type for each day before expiration.
+The plan is cached and rebuilt when the table (or the ALERT_* defaults)
+change, also when the change was made by another process.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, case, func, literal, true, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import AlertaEnviado, Equipamento, ExecucaoAlertaItem, RegraAlerta, ResumoAlertaMensal
+
+# Alert types; each rule sets its own day thresholds, templates are keyed on them
+TIPOS_ALERTA = ("inicial", "lembrete", "urgente", "vencido")
+# Names stored before per-rule schedules (they carried the default thresholds)
+TIPOS_LEGADOS = {"inicial_60": "inicial", "lembrete_15": "lembrete", "urgente_7": "urgente"}
+
+
+class Regra:
+    """
+    One alert schedule:
+    - dias_inicial: initial alert
+    - until dias_urgente (exclusive): every intervalo_lembrete days after it
+    - dias_urgente to 0: on multiples of intervalo_urgente
+    - expired: every intervalo_vencido days
+    """
+
+    def __init__(
+        self,
+        dias_inicial: int,
+        intervalo_lembrete: int,
+        dias_urgente: int,
+        intervalo_urgente: int,
+        intervalo_vencido: int
+    ):
+        if min(dias_inicial, intervalo_lembrete, intervalo_urgente, intervalo_vencido) < 1:
+            raise ValueError("Dias e intervalos devem ser maiores que zero")
+        if not 0 <= dias_urgente < dias_inicial:
+            raise ValueError("dias_urgente deve ser menor que dias_inicial")
+        self.dias_inicial = dias_inicial
+        self.intervalo_lembrete = intervalo_lembrete
+        self.dias_urgente = dias_urgente
+        self.intervalo_urgente = intervalo_urgente
+        self.intervalo_vencido = intervalo_vencido
+
+        # Alert type code (0 = none, 1..4 = TIPOS_ALERTA index + 1) per day before expiration
+        self.tabela = np.zeros(dias_inicial + 1, dtype=np.int8)
+        self.tabela[dias_inicial] = 1
+        for dias in range(dias_urgente + 1, dias_inicial):
+            if (dias_inicial - dias) % intervalo_lembrete == 0:
+                self.tabela[dias] = 2
+        self.tabela[0:dias_urgente + 1:intervalo_urgente] = 3
+        # Days before expiration on which the rule fires, latest first
+        self.dias_disparo: Tuple[int, ...] = tuple(int(d) for d in np.flatnonzero(self.tabela)[::-1])
+
+    @classmethod
+    def padrao(cls) -> "Regra":
+        """Schedule from the ALERT_* settings"""
+        return cls(
+            settings.ALERT_INITIAL_DAYS,
+            settings.ALERT_REMINDER_INTERVAL_DAYS,
+            settings.ALERT_URGENT_DAYS,
+            settings.ALERT_URGENT_INTERVAL_DAYS,
+            settings.ALERT_OVERDUE_INTERVAL_DAYS
+        )
+
+    def tipo(self, dias_para_vencer: int) -> Optional[str]:
+        """Alert type due `dias_para_vencer` days before expiration, if any"""
+        if dias_para_vencer < 0:
+            return "vencido" if -dias_para_vencer % self.intervalo_vencido == 0 else None
+        if dias_para_vencer > self.dias_inicial:
+            return None
+        codigo = int(self.tabela[dias_para_vencer])
+        return TIPOS_ALERTA[codigo - 1] if codigo else None
+
+    def faixa(self, dias_para_vencer: int) -> Optional[str]:
+        """Alert type of the band `dias_para_vencer` falls in, whether or not the rule fires that day"""
+        if dias_para_vencer < 0:
+            return "vencido"
+        if dias_para_vencer <= self.dias_urgente:
+            return "urgente"
+        if dias_para_vencer < self.dias_inicial:
+            return "lembrete"
+        return "inicial" if dias_para_vencer == self.dias_inicial else None
+
+    def proxima(self, data_vencimento: date, a_partir_de: date) -> date:
+        """First day on or after `a_partir_de` on which the rule fires"""
+        for dias in self.dias_disparo:
+            data = data_vencimento - timedelta(days=dias)
+            if data >= a_partir_de:
+                return data
+        passos = max(1, -(-(a_partir_de - data_vencimento).days // self.intervalo_vencido))
+        return data_vencimento + timedelta(days=passos * self.intervalo_vencido)
+
+    def ultima(self, data_vencimento: date, ate: date) -> Optional[date]:
+        """Last day on or before `ate` on which the rule fires, if any"""
+        if ate > data_vencimento:
+            passos = (ate - data_vencimento).days // self.intervalo_vencido
+            return data_vencimento + timedelta(days=passos * self.intervalo_vencido)
+        for dias in reversed(self.dias_disparo):
+            data = data_vencimento - timedelta(days=dias)
+            if data <= ate:
+                return data
+        return None
+
+
+REGRA_PADRAO = Regra.padrao()
+
+
+class PlanoRegras:
+    """
+    Rules compiled for one run. Index 0 is the default (settings) rule;
+    sql_indice() picks the most specific rule for each equipment row in
+    the query itself, and tabela/intervalo_vencido serve vectorized lookups.
+    """
+
+    def __init__(self, padrao: Regra, regras: List[RegraAlerta]):
+        # Most specific first: categoria + laboratorio, categoria, laboratorio, global
+        regras = sorted(regras, key=lambda r: (r.categoria is None, r.laboratorio is None, r.id))
+        self.regras: List[Regra] = [padrao]
+        self._escopos: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+        for regra in regras:
+            self._escopos[(regra.categoria, regra.laboratorio)] = len(self.regras)
+            self.regras.append(Regra(
+                regra.dias_inicial,
+                regra.intervalo_lembrete,
+                regra.dias_urgente,
+                regra.intervalo_urgente,
+                regra.intervalo_vencido
+            ))
+
+        largura = max(regra.dias_inicial for regra in self.regras) + 1
+        self.tabela = np.zeros((len(self.regras), largura), dtype=np.int8)
+        for i, regra in enumerate(self.regras):
+            self.tabela[i, :len(regra.tabela)] = regra.tabela
+        self.intervalo_vencido = np.array([regra.intervalo_vencido for regra in self.regras], dtype=np.int64)
+
+    def indice(self, categoria: Optional[str], laboratorio: Optional[str]) -> int:
+        """Index of the most specific rule for an equipment (0 = default)"""
+        for escopo in ((categoria, laboratorio), (categoria, None), (None, laboratorio), (None, None)):
+            if escopo in self._escopos:
+                return self._escopos[escopo]
+        return 0
+
+    def regra_para(self, categoria: Optional[str], laboratorio: Optional[str]) -> Regra:
+        return self.regras[self.indice(categoria, laboratorio)]
+
+    def sql_indice(self):
+        """SQL expression with the rule index of each Equipamento row"""
+        quando = []
+        padrao = 0
+        for (categoria, laboratorio), i in self._escopos.items():
+            if categoria is None and laboratorio is None:
+                padrao = i
+            else:
+                quando.append((scope_filter(categoria, laboratorio), i))
+        if not quando:
+            return literal(padrao)
+        return case(*quando, else_=padrao)
+
+    def codigos(self, indices: np.ndarray, dias: np.ndarray) -> np.ndarray:
+        """
+        Vectorized Regra.tipo(): alert type codes for an (equipment x day)
+        matrix of days before expiration, given each row's rule index
+        """
+        linhas = np.broadcast_to(indices[:, None], dias.shape)
+        codigos = np.zeros(dias.shape, dtype=np.int8)
+        antes = (dias >= 0) & (dias < self.tabela.shape[1])
+        codigos[antes] = self.tabela[linhas[antes], dias[antes]]
+        vencido = dias < 0
+        codigos[vencido & (-dias % self.intervalo_vencido[linhas] == 0)] = 4
+        return codigos
+
+
+def scope_filter(categoria: Optional[str], laboratorio: Optional[str]):
+    """SQL filter selecting the equipment a rule's scope covers"""
+    condicoes = [true()]
+    if categoria is not None:
+        condicoes.append(Equipamento.categoria == categoria)
+    if laboratorio is not None:
+        condicoes.append(Equipamento.laboratorio == laboratorio)
+    return and_(*condicoes)
+
+
+_plano: Optional[Tuple[tuple, PlanoRegras]] = None
+
+
+def alert_rules(db: Session) -> PlanoRegras:
+    """
+    Compiled plan of the current rules. Rebuilt only when regras_alerta
+    (row count, last id or last update) or the ALERT_* settings change.
+    """
+    global _plano
+    versao = db.query(
+        func.count(RegraAlerta.id), func.max(RegraAlerta.id), func.max(RegraAlerta.atualizado_em)
+    ).one()
+    chave = (
+        tuple(versao),
+        settings.ALERT_INITIAL_DAYS,
+        settings.ALERT_REMINDER_INTERVAL_DAYS,
+        settings.ALERT_URGENT_DAYS,
+        settings.ALERT_URGENT_INTERVAL_DAYS,
+        settings.ALERT_OVERDUE_INTERVAL_DAYS
+    )
+    if _plano is None or _plano[0] != chave:
+        _plano = (chave, PlanoRegras(Regra.padrao(), db.query(RegraAlerta).all()))
+    return _plano[1]
+
+
+def invalidate_alert_rules() -> None:
+    """Drop the cached plan (the next alert_rules() call recompiles)"""
+    global _plano
+    _plano = None
+
+
+def rename_legacy_alert_types(conn) -> None:
+    """Store the old alert type names (TIPOS_LEGADOS) under the current ones"""
+    for tabela in (AlertaEnviado, ResumoAlertaMensal, ExecucaoAlertaItem):
+        for antigo, novo in TIPOS_LEGADOS.items():
+            conn.execute(update(tabela).where(tabela.tipo_alerta == antigo).values(tipo_alerta=novo))
@@ -0,0 +1,213 @@
+"""
+CalibraCore Lab - Alert History Retention
+Recipients are stored once (destinatarios) and linked to each alert.
+Alerts older than ALERT_RETENTION_MONTHS are counted into resumo_alertas_mensal,
+written to one gzip JSONL file per month and removed from alertas_enviados.
+"""
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import insert_ignore
+from app.models import AlertaDestinatario, AlertaEnviado, Destinatario, ResumoAlertaMensal
+
+logger = logging.getLogger(__name__)
+
+
+def intern_recipients(db: Session, emails: Iterable[str]) -> Dict[str, int]:
+    """
+    Ids of the given addresses, inserting the ones not seen before.
+    Does not commit.
+    """
+    unicos = sorted({e.strip() for e in emails if e and e.strip()})
+    if not unicos:
+        return {}
+    db.execute(insert_ignore(Destinatario, ["email"]).values([{"email": e} for e in unicos]))
+    return dict(
+        db.query(Destinatario.email, Destinatario.id).filter(Destinatario.email.in_(unicos)).all()
+    )
+
+
+def link_recipients(db: Session, por_alerta: Dict[int, List[str]]) -> None:
+    """
+    Record the recipients of each alert ({alerta_id: [emails]}). Does not commit.
+    """
+    ids = intern_recipients(db, (e for emails in por_alerta.values() for e in emails))
+    vinculos = {
+        (alerta_id, ids[e.strip()])
+        for alerta_id, emails in por_alerta.items()
+        for e in emails if e and e.strip()
+    }
+    if vinculos:
+        db.execute(
+            insert_ignore(AlertaDestinatario, ["alerta_id", "destinatario_id"]).values([
+                {"alerta_id": alerta_id, "destinatario_id": destinatario_id}
+                for alerta_id, destinatario_id in sorted(vinculos)
+            ])
+        )
+
+
+def recipients_by_alert(db: Session, alerta_ids: List[int]) -> Dict[int, List[str]]:
+    """
+    {alerta_id: [emails]} for the given alerts, in one query
+    """
+    if not alerta_ids:
+        return {}
+    rows = db.query(AlertaDestinatario.alerta_id, Destinatario.email).join(
+        Destinatario, Destinatario.id == AlertaDestinatario.destinatario_id
+    ).filter(AlertaDestinatario.alerta_id.in_(alerta_ids)).order_by(Destinatario.email).all()
+    resultado: Dict[int, List[str]] = defaultdict(list)
+    for alerta_id, email in rows:
+        resultado[alerta_id].append(email)
+    return resultado
+
+
+def normalize_legacy_recipients(db: Session, lote: Optional[int] = None) -> int:
+    """
+    Move the JSON `destinatarios` of older rows into alertas_destinatarios.
+    Commits per batch; returns the number of rows converted.
+    """
+    lote = lote or settings.ALERT_ARCHIVE_BATCH_SIZE
+    total = 0
+    while True:
+        rows = db.query(AlertaEnviado.id, AlertaEnviado.destinatarios).filter(
+            AlertaEnviado.destinatarios.isnot(None)
+        ).order_by(AlertaEnviado.id).limit(lote).all()
+        if not rows:
+            return total
+        por_alerta = {}
+        for alerta_id, bruto in rows:
+            try:
+                emails = json.loads(bruto)
+            except ValueError:
+                emails = []
+            por_alerta[alerta_id] = [e for e in emails if isinstance(e, str)] if isinstance(emails, list) else []
+        link_recipients(db, por_alerta)
+        db.query(AlertaEnviado).filter(AlertaEnviado.id.in_(list(por_alerta))).update(
+            {AlertaEnviado.destinatarios: None}, synchronize_session=False
+        )
+        db.commit()
+        total += len(rows)
+
+
+def retention_cutoff(hoje: date, meses: int) -> date:
+    """
+    First day of the month `meses` months before `hoje`: whole months older
+    than this are archived
+    """
+    indice = hoje.year * 12 + hoje.month - 1 - meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _caminho_arquivo(mes: date) -> str:
+    return os.path.join(settings.ALERT_ARCHIVE_DIR, f"alertas_enviados_{mes:%Y-%m}.jsonl.gz")
+
+
+def _gravar_arquivo(linhas_por_mes: Dict[date, List[str]]) -> None:
+    """
+    Append the lines to each month's file and fsync. Every batch is a new
+    gzip member, which gzip readers concatenate transparently.
+    """
+    os.makedirs(settings.ALERT_ARCHIVE_DIR, exist_ok=True)
+    for mes, linhas in linhas_por_mes.items():
+        with open(_caminho_arquivo(mes), "ab") as bruto:
+            with gzip.GzipFile(fileobj=bruto, mode="wb") as arquivo:
+                arquivo.write(("\n".join(linhas) + "\n").encode("utf-8"))
+            bruto.flush()
+            os.fsync(bruto.fileno())
+
+
+def _acumular_resumo(db: Session, contagens: Dict[Tuple[int, date, str], dict]) -> None:
+    """Add this batch's counts to resumo_alertas_mensal. Does not commit."""
+    existentes = {
+        (r.equipamento_id, r.mes, r.tipo_alerta): r
+        for r in db.query(ResumoAlertaMensal).filter(
+            ResumoAlertaMensal.equipamento_id.in_(list({k[0] for k in contagens})),
+            ResumoAlertaMensal.mes.in_(list({k[1] for k in contagens}))
+        )
+    }
+    for chave, c in contagens.items():
+        resumo = existentes.get(chave)
+        if resumo is None:
+            equipamento_id, mes, tipo_alerta = chave
+            db.add(ResumoAlertaMensal(equipamento_id=equipamento_id, mes=mes, tipo_alerta=tipo_alerta, **c))
+            continue
+        resumo.total += c["total"]
+        resumo.sucessos += c["sucessos"]
+        resumo.falhas += c["falhas"]
+        resumo.primeiro_envio = min(filter(None, (resumo.primeiro_envio, c["primeiro_envio"])), default=None)
+        resumo.ultimo_envio = max(filter(None, (resumo.ultimo_envio, c["ultimo_envio"])), default=None)
+
+
+def archive_alerts(db: Session, meses: Optional[int] = None, hoje: Optional[date] = None) -> dict:
+    """
+    Roll up, archive and delete alerts sent before the retention cutoff, in
+    batches of ALERT_ARCHIVE_BATCH_SIZE. The archive file is synced before
+    each batch is deleted; lines carry the row id, so a batch written again
+    after a crash can be told apart.
+    """
+    meses = settings.ALERT_RETENTION_MONTHS if meses is None else meses
+    resultado = {"normalizados": normalize_legacy_recipients(db), "arquivados": 0, "meses": []}
+    if meses <= 0:
+        return resultado
+
+    corte = retention_cutoff(hoje or date.today(), meses)
+    limite = datetime.combine(corte, time.min)
+    meses_arquivados = set()
+    while True:
+        alertas = db.query(AlertaEnviado).filter(
+            AlertaEnviado.data_envio < limite
+        ).order_by(AlertaEnviado.id).limit(settings.ALERT_ARCHIVE_BATCH_SIZE).all()
+        if not alertas:
+            break
+        ids = [a.id for a in alertas]
+        destinatarios = recipients_by_alert(db, ids)
+
+        linhas: Dict[date, List[str]] = defaultdict(list)
+        contagens: Dict[Tuple[int, date, str], dict] = {}
+        for a in alertas:
+            mes = a.data_envio.date().replace(day=1)
+            linhas[mes].append(json.dumps({
+                "id": a.id,
+                "equipamento_id": a.equipamento_id,
+                "tipo_alerta": a.tipo_alerta,
+                "data_envio": a.data_envio.isoformat(),
+                "dia_envio": a.dia_envio.isoformat() if a.dia_envio else None,
+                "destinatarios": destinatarios.get(a.id, []),
+                "sucesso": bool(a.sucesso),
+                "mensagem_erro": a.mensagem_erro
+            }, ensure_ascii=False))
+            c = contagens.setdefault((a.equipamento_id, mes, a.tipo_alerta), {
+                "total": 0, "sucessos": 0, "falhas": 0,
+                "primeiro_envio": a.data_envio, "ultimo_envio": a.data_envio
+            })
+            c["total"] += 1
+            c["sucessos" if a.sucesso else "falhas"] += 1
+            c["primeiro_envio"] = min(c["primeiro_envio"], a.data_envio)
+            c["ultimo_envio"] = max(c["ultimo_envio"], a.data_envio)
+
+        _gravar_arquivo(linhas)
+        _acumular_resumo(db, contagens)
+        db.query(AlertaDestinatario).filter(
+            AlertaDestinatario.alerta_id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.query(AlertaEnviado).filter(AlertaEnviado.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        db.expunge_all()
+
+        resultado["arquivados"] += len(ids)
+        meses_arquivados.update(linhas)
+
+    resultado["meses"] = [f"{m:%Y-%m}" for m in sorted(meses_arquivados)]
+    if resultado["arquivados"]:
+        logger.info(
+            f"{resultado['arquivados']} alertas anteriores a {corte:%m/%Y} arquivados em {settings.ALERT_ARCHIVE_DIR}"
+        )
+    return resultado
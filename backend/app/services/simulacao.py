@@ -0,0 +1,177 @@
+"""
+CalibraCore Lab - Alert Simulation Service
+Dry run of the alert rules over a date range, vectorized over the
+(equipment x day) matrix. Nothing is sent and nothing is written.
+"""
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import String, cast
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Equipamento, Usuario
+from app.services.alerta_service import get_alert_subject, is_digest_recipient
+from app.services.email_templates import render_alert
+from app.services.regras_alerta import TIPOS_ALERTA, alert_rules
+
+# Cells per chunk of the (equipment x day) matrix, bounds memory use
+CELULAS_POR_BLOCO = 4_000_000
+
+
+def simular_alertas(db: Session, inicio: date, fim: date, amostras: int = 1) -> dict:
+    """
+    Evaluate the alert rules for every active equipment on every day from
+    `inicio` to `fim` (inclusive), assuming one run per day. Returns per-day
+    and per-recipient counts plus up to `amostras` rendered messages per
+    alert type.
+    """
+    plano = alert_rules(db)
+    rows = db.query(
+        Equipamento.codigo_interno,
+        Equipamento.descricao,
+        Equipamento.laboratorio,
+        cast(Equipamento.data_vencimento, String),
+        Usuario.email,
+        plano.sql_indice()
+    ).outerjoin(
+        Usuario, Usuario.id == Equipamento.responsavel_id
+    ).filter(Equipamento.ativo == True).all()
+
+    globais = [e.strip() for e in settings.ALERT_RECIPIENTS.split(",") if e.strip()]
+    globais_digest = [e for e in globais if is_digest_recipient(e)]
+    globais_individuais = [e for e in globais if not is_digest_recipient(e)]
+
+    n_dias = (fim - inicio).days + 1
+    dia0 = int(np.datetime64(inicio, "D").astype(np.int64))
+    dias_abs = np.arange(dia0, dia0 + n_dias, dtype=np.int64)
+
+    n = len(rows)
+    if n:
+        codigos_eq, descricoes, laboratorios, vencimentos, responsaveis, indices = zip(*rows)
+        vencimento = np.array(vencimentos, dtype="datetime64[D]").astype(np.int64)
+        regra_eq = np.array(indices, dtype=np.int64)
+    else:
+        codigos_eq = descricoes = laboratorios = responsaveis = ()
+        vencimento = np.zeros(0, dtype=np.int64)
+        regra_eq = np.zeros(0, dtype=np.int64)
+
+    # Responsible users beyond the global list get a code each (-1 = none)
+    emails_resp: Dict[str, int] = {}
+    codigo_resp = np.fromiter(
+        (
+            -1 if not email or email in globais else emails_resp.setdefault(email, len(emails_resp))
+            for email in responsaveis
+        ),
+        dtype=np.int64, count=n
+    )
+    lista_resp = list(emails_resp)
+    resp_digest = np.array([is_digest_recipient(e) for e in lista_resp], dtype=bool)
+    n_resp = len(lista_resp)
+
+    # Equipment that produces an individual e-mail (some non-digest recipient)
+    tem_individual = np.full(n, bool(globais_individuais))
+    if n_resp:
+        com_resp = codigo_resp >= 0
+        tem_individual[com_resp] |= ~resp_digest[codigo_resp[com_resp]]
+
+    por_tipo = np.zeros((len(TIPOS_ALERTA), n_dias), dtype=np.int64)
+    emails_individuais = np.zeros(n_dias, dtype=np.int64)
+    algum_alerta = np.zeros(n_dias, dtype=bool)
+    alertas_por_eq = np.zeros(n, dtype=np.int64)
+    resp_ativo = np.zeros((n_resp, n_dias), dtype=bool)
+    exemplos: Dict[int, List[tuple]] = {}
+
+    bloco = max(1, CELULAS_POR_BLOCO // max(n_dias, 1))
+    for a in range(0, n, bloco):
+        b = min(a + bloco, n)
+        codigos = plano.codigos(regra_eq[a:b], vencimento[a:b, None] - dias_abs[None, :])
+        alerta = codigos > 0
+
+        for t in range(len(TIPOS_ALERTA)):
+            por_tipo[t] += (codigos == t + 1).sum(axis=0)
+        emails_individuais += alerta[tem_individual[a:b]].sum(axis=0)
+        algum_alerta |= alerta.any(axis=0)
+        alertas_por_eq[a:b] = alerta.sum(axis=1)
+
+        if n_resp:
+            linhas, colunas = np.nonzero(alerta & (codigo_resp[a:b, None] >= 0))
+            resp_ativo.flat[codigo_resp[a + linhas] * n_dias + colunas] = True
+
+        for t in range(1, len(TIPOS_ALERTA) + 1):
+            if len(exemplos.get(t, ())) < amostras:
+                linhas, colunas = np.nonzero(codigos == t)
+                faltam = amostras - len(exemplos.get(t, ()))
+                exemplos.setdefault(t, []).extend(
+                    (a + int(i), int(j)) for i, j in zip(linhas[:faltam], colunas[:faltam])
+                )
+
+    # Digest recipients get one e-mail on each day with at least one alert
+    emails_por_dia = (
+        emails_individuais
+        + algum_alerta.astype(np.int64) * len(globais_digest)
+        + resp_ativo[resp_digest].sum(axis=0)
+    )
+    total_alertas = int(alertas_por_eq.sum())
+
+    dias = [
+        {
+            "data": inicio + timedelta(days=j),
+            "alertas": int(por_tipo[:, j].sum()),
+            "emails": int(emails_por_dia[j]),
+            "por_tipo": {tipo: int(por_tipo[t, j]) for t, tipo in enumerate(TIPOS_ALERTA)}
+        }
+        for j in range(n_dias)
+    ]
+
+    destinatarios = [
+        {
+            "email": email,
+            "alertas": total_alertas,
+            "emails": int(algum_alerta.sum()) if email in globais_digest else total_alertas,
+            "resumo_diario": email in globais_digest
+        }
+        for email in globais
+    ]
+    if n_resp:
+        alertas_resp = np.bincount(codigo_resp[codigo_resp >= 0], weights=alertas_por_eq[codigo_resp >= 0], minlength=n_resp)
+        dias_resp = resp_ativo.sum(axis=1)
+        for r, email in enumerate(lista_resp):
+            destinatarios.append({
+                "email": email,
+                "alertas": int(alertas_resp[r]),
+                "emails": int(dias_resp[r]) if resp_digest[r] else int(alertas_resp[r]),
+                "resumo_diario": bool(resp_digest[r])
+            })
+    destinatarios.sort(key=lambda d: -d["emails"])
+
+    mensagens = []
+    for t, posicoes in sorted(exemplos.items()):
+        for i, j in posicoes:
+            dia = inicio + timedelta(days=j)
+            venc = date.fromisoformat(vencimentos[i])
+            restantes = (venc - dia).days
+            tipo = TIPOS_ALERTA[t - 1]
+            mensagens.append({
+                "data": dia,
+                "equipamento_codigo": codigos_eq[i],
+                "tipo_alerta": tipo,
+                "assunto": get_alert_subject(tipo, restantes, codigos_eq[i]),
+                "html": render_alert(
+                    tipo, codigos_eq[i], descricoes[i], laboratorios[i],
+                    venc.strftime("%d/%m/%Y"), restantes
+                )
+            })
+
+    return {
+        "inicio": inicio,
+        "fim": fim,
+        "equipamentos": n,
+        "total_alertas": total_alertas,
+        "total_emails": int(emails_por_dia.sum()),
+        "por_tipo": {tipo: int(por_tipo[t].sum()) for t, tipo in enumerate(TIPOS_ALERTA)},
+        "dias": dias,
+        "destinatarios": destinatarios,
+        "amostras": mensagens
+    }
@@ -0,0 +1,198 @@
+"""
+CalibraCore Lab - SMTP Connection Pool
+Shared, persistent SMTP connections so each e-mail does not pay
+TCP + TLS + AUTH again
+"""
+import asyncio
+import logging
+import time
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+from aiosmtplib import SMTP, SMTPResponseException, SMTPServerDisconnected, SMTPConnectError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the connection is unusable (retry on a fresh one)
+CONNECTION_ERRORS = (SMTPServerDisconnected, SMTPConnectError, ConnectionError, OSError)
+
+
+class _SMTPRastreado(SMTP):
+    """SMTP that remembers whether DATA was started for the current message"""
+
+    dados_iniciados = False
+
+    async def data(self, *args, **kwargs):
+        self.dados_iniciados = True
+        return await super().data(*args, **kwargs)
+
+
+class _PooledConnection:
+    def __init__(self, smtp: SMTP):
+        self.smtp = smtp
+        self.enviadas = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Keep-alive pool of authenticated SMTP connections.
+
+    - at most `tamanho` connections, callers wait for a free one
+    - idle connections are checked with NOOP before reuse
+    - broken connections are dropped and the send is retried once, unless
+      DATA had started (the server may already have accepted the message)
+    - a connection is closed on any other error or cancellation, so a
+      failed send never keeps it checked out
+    - a connection is recycled after `max_mensagens` messages
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: Optional[bool] = None,
+        tamanho: int = 5,
+        max_mensagens: int = 100,
+        idle_segundos: float = 30.0,
+        timeout: float = 30.0
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username or None
+        self.password = password or None
+        self.start_tls = start_tls
+        self.max_mensagens = max_mensagens
+        self.idle_segundos = idle_segundos
+        self.timeout = timeout
+        self._livres: List[_PooledConnection] = []
+        self._slots = asyncio.Semaphore(tamanho)
+        self._fechado = False
+
+    async def _conectar(self) -> _PooledConnection:
+        smtp = _SMTPRastreado(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        return _PooledConnection(smtp)
+
+    async def _fechar(self, conn: _PooledConnection) -> None:
+        try:
+            if conn.smtp.is_connected:
+                await conn.smtp.quit()
+        except Exception:
+            conn.smtp.close()
+
+    async def _obter(self) -> _PooledConnection:
+        while self._livres:
+            conn = self._livres.pop()
+            if not conn.smtp.is_connected:
+                continue
+            if time.monotonic() - conn.ultimo_uso > self.idle_segundos:
+                # Server may have dropped an idle connection: health check
+                try:
+                    await conn.smtp.noop()
+                except Exception:
+                    await self._fechar(conn)
+                    continue
+            return conn
+        return await self._conectar()
+
+    def _devolver(self, conn: _PooledConnection) -> None:
+        conn.ultimo_uso = time.monotonic()
+        if self._fechado or conn.enviadas >= self.max_mensagens:
+            asyncio.ensure_future(self._fechar(conn))
+        else:
+            self._livres.append(conn)
+
+    async def send_message(
+        self,
+        message: Message,
+        sender: Optional[str] = None,
+        recipients: Optional[List[str]] = None,
+        timeout: Optional[float] = None
+    ) -> None:
+        """
+        Send a message on a pooled connection; raises on failure.
+        `timeout` covers the send only, not the wait for a free connection.
+        """
+        async with self._slots:
+            await asyncio.wait_for(self._enviar(message, sender, recipients), timeout)
+
+    async def _enviar(self, message: Message, sender: Optional[str], recipients: Optional[List[str]]) -> None:
+        for tentativa in range(2):
+            conn = await self._obter()
+            conn.smtp.dados_iniciados = False
+            reutilizavel = False
+            try:
+                await conn.smtp.send_message(message, sender=sender, recipients=recipients)
+                reutilizavel = True
+                return
+            except SMTPResponseException:
+                # Server rejected this message (aiosmtplib resets the
+                # envelope); the connection is still fine
+                reutilizavel = True
+                raise
+            except CONNECTION_ERRORS as e:
+                if tentativa == 0 and not conn.smtp.dados_iniciados:
+                    logger.warning(f"Conexão SMTP perdida, reconectando: {e}")
+                    continue
+                raise
+            finally:
+                if reutilizavel:
+                    conn.enviadas += 1
+                    self._devolver(conn)
+                else:
+                    # Broken, in an unknown state or cancelled mid-command
+                    conn.smtp.close()
+
+    async def close(self) -> None:
+        self._fechado = True
+        livres, self._livres = self._livres, []
+        for conn in livres:
+            await self._fechar(conn)
+
+
+_pools: Dict[Tuple, SMTPPool] = {}
+
+
+def get_smtp_pool(
+    hostname: str,
+    port: int,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    start_tls: Optional[bool] = None
+) -> SMTPPool:
+    """Shared pool for this server/account (one per event loop)"""
+    loop = asyncio.get_running_loop()
+    chave = (id(loop), hostname, port, username, start_tls)
+    pool = _pools.get(chave)
+    if pool is None:
+        pool = SMTPPool(
+            hostname,
+            port,
+            username=username,
+            password=password,
+            start_tls=start_tls,
+            tamanho=settings.SMTP_POOL_SIZE,
+            max_mensagens=settings.SMTP_POOL_MAX_MESSAGES,
+            idle_segundos=settings.SMTP_POOL_IDLE_SECONDS
+        )
+        _pools[chave] = pool
+    return pool
+
+
+async def close_smtp_pools() -> None:
+    """Close every pooled connection of the running event loop"""
+    loop_id = id(asyncio.get_running_loop())
+    for chave in [k for k in _pools if k[0] == loop_id]:
+        await _pools.pop(chave).close()
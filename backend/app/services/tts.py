@@ -0,0 +1,117 @@
+"""
+CalibraCore Lab - Text-to-Speech Audio Cache
+Phrases spoken by the dashboard assistant are rendered once with pyttsx3
+(on the voice thread) and kept on disk, addressed by a hash of
+(text, voice, rate), so repeated phrases cost no synthesis
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services.voz import voice_worker
+
+logger = logging.getLogger(__name__)
+
+CHAVE_VALIDA = re.compile(r"^[0-9a-f]{64}$")
+
+
+class TTSIndisponivel(Exception):
+    """The server cannot synthesize audio right now"""
+
+
+def audio_key(texto: str) -> str:
+    """Cache key of `texto` for the configured voice and rate"""
+    dados = json.dumps([texto, settings.VOICE_ID, settings.VOICE_RATE], ensure_ascii=False)
+    return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Directory of rendered phrases ({key}.wav).
+
+    - a hit refreshes the file's mtime, which is the LRU order
+    - after each new file, the oldest ones are removed while the directory
+      is over TTS_CACHE_MAX_MB
+    - concurrent requests for the same phrase share one synthesis
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes: Dict[str, Future] = {}
+
+    @staticmethod
+    def path(chave: str) -> str:
+        return os.path.join(settings.TTS_CACHE_DIR, f"{chave}.wav")
+
+    def get(self, chave: str) -> Optional[str]:
+        """Path of a cached file (marking it as recently used), or None"""
+        if not CHAVE_VALIDA.match(chave):
+            return None
+        caminho = self.path(chave)
+        try:
+            os.utime(caminho)
+        except OSError:
+            return None
+        return caminho
+
+    async def render(self, texto: str) -> str:
+        """
+        Key of the audio for `texto`, synthesizing it on a miss.
+        Raises TTSIndisponivel or asyncio.TimeoutError.
+        """
+        chave = audio_key(texto)
+        if self.get(chave):
+            return chave
+
+        with self._lock:
+            futuro = self._pendentes.get(chave)
+            novo = futuro is None
+            if novo:
+                os.makedirs(settings.TTS_CACHE_DIR, exist_ok=True)
+                futuro = voice_worker.synthesize(texto, self.path(chave))
+                self._pendentes[chave] = futuro
+        if novo:
+            # Outside the lock: runs right away if the future already failed
+            futuro.add_done_callback(lambda f: self._concluir(chave, f))
+
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), settings.TTS_TIMEOUT_SECONDS)
+        except RuntimeError as e:
+            raise TTSIndisponivel(str(e)) from e
+        return chave
+
+    def _concluir(self, chave: str, futuro: Future) -> None:
+        with self._lock:
+            self._pendentes.pop(chave, None)
+        if not futuro.cancelled() and futuro.exception() is None:
+            self._evict()
+
+    def _evict(self) -> None:
+        limite = settings.TTS_CACHE_MAX_MB * 1024 * 1024
+        try:
+            arquivos = [e for e in os.scandir(settings.TTS_CACHE_DIR) if CHAVE_VALIDA.match(e.name[:-4]) and e.name.endswith(".wav")]
+        except OSError:
+            return
+        total = sum(e.stat().st_size for e in arquivos)
+        if total <= limite:
+            return
+        for entrada in sorted(arquivos, key=lambda e: e.stat().st_mtime):
+            if total <= limite * 0.9:
+                break
+            try:
+                tamanho = entrada.stat().st_size
+                os.remove(entrada.path)
+                total -= tamanho
+            except OSError:
+                continue
+        logger.info(f"Cache de voz reduzido para {total // 1024} KB")
+
+
+tts_cache = TTSCache()
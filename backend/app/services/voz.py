@@ -0,0 +1,219 @@
+"""
+CalibraCore Lab - Voice Alert Worker
+pyttsx3 blocks while it speaks and its engine must stay on one thread, so
+every voice alert (and every audio file rendered for the browser) goes
+through a single background thread fed by a bounded queue. Bursts (e.g. a
+bulk import) become one summary utterance.
+"""
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PARAR = object()
+
+
+class _Sintese:
+    """Request to render `texto` into the audio file `caminho`"""
+
+    def __init__(self, texto: str, caminho: str):
+        self.texto = texto
+        self.caminho = caminho
+        self.futuro: Future = Future()
+
+
+def resumo_falado(mensagens: List[str], descartadas: int = 0) -> str:
+    """
+    What to say for a batch of pending alerts: the alert itself when there
+    is only one, otherwise a single summary
+    """
+    total = len(mensagens) + descartadas
+    if total == 1:
+        return mensagens[0]
+    return f"Atenção: {total} novos alertas de calibração. Consulte o painel do CalibraCore para os detalhes."
+
+
+class VoiceWorker:
+    """
+    Single thread that owns the pyttsx3 engine.
+
+    - speak() never blocks: it queues the text (VOICE_QUEUE_SIZE at most),
+      also while the engine is still starting
+    - messages arriving within VOICE_COALESCE_SECONDS of the first one
+      are spoken together, as one summary
+    - when the queue is full, new messages are only counted in the summary
+    """
+
+    def __init__(self):
+        self._fila: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._descartadas = 0
+        self._pronto = threading.Event()
+        self.disponivel = True  # False once the engine failed to start
+
+    def start(self) -> None:
+        """Start the thread and wait for the engine; blocking, so off the event loop"""
+        self._iniciar()
+        self._pronto.wait(10)
+
+    def _iniciar(self) -> None:
+        """Start the thread if it is not running, without waiting for the engine"""
+        with self._lock:
+            if not self.disponivel or (self._thread and self._thread.is_alive()):
+                return
+            self._fila = queue.Queue(maxsize=settings.VOICE_QUEUE_SIZE)
+            self._pronto.clear()
+            self._thread = threading.Thread(target=self._run, name="voz", daemon=True)
+            self._thread.start()
+
+    def speak(self, texto: str) -> bool:
+        """Queue `texto` to be spoken; returns False when voice is unavailable"""
+        if not self.disponivel:
+            return False
+        self._iniciar()
+        try:
+            self._fila.put_nowait(texto)
+        except queue.Full:
+            with self._lock:
+                self._descartadas += 1
+        return True
+
+    def synthesize(self, texto: str, caminho: str) -> Future:
+        """
+        Render `texto` to the audio file `caminho` on the voice thread.
+        The future fails with RuntimeError when voice is unavailable or
+        the queue is full.
+        """
+        sintese = _Sintese(texto, caminho)
+        self._iniciar()
+        if not self.disponivel:
+            sintese.futuro.set_exception(RuntimeError("Mecanismo de voz indisponível"))
+            return sintese.futuro
+        try:
+            self._fila.put_nowait(sintese)
+        except queue.Full:
+            sintese.futuro.set_exception(RuntimeError("Fila de voz cheia"))
+        return sintese.futuro
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the thread to finish after the current utterance"""
+        with self._lock:
+            thread, fila = self._thread, self._fila
+            self._thread = None
+        if thread and thread.is_alive():
+            try:
+                fila.put_nowait(_PARAR)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+
+    def _iniciar_engine(self):
+        if sys.platform == "win32":
+            # SAPI5 is a COM object: this thread needs its own COM apartment
+            import comtypes
+            comtypes.CoInitialize()
+        import pyttsx3
+        engine = pyttsx3.init()
+        engine.setProperty("rate", settings.VOICE_RATE)
+        if settings.VOICE_ID:
+            engine.setProperty("voice", settings.VOICE_ID)
+        return engine
+
+    @staticmethod
+    def _sintetizar(engine, sintese: _Sintese) -> None:
+        if not sintese.futuro.set_running_or_notify_cancel():
+            return
+        temporario = f"{sintese.caminho}.tmp.wav"
+        try:
+            engine.save_to_file(sintese.texto, temporario)
+            engine.runAndWait()
+            if not os.path.exists(temporario) or os.path.getsize(temporario) == 0:
+                raise RuntimeError("Mecanismo de voz não gerou o arquivo")
+            os.replace(temporario, sintese.caminho)
+        except Exception as e:
+            logger.error(f"Voice synthesis failed: {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            sintese.futuro.set_exception(e)
+        else:
+            sintese.futuro.set_result(sintese.caminho)
+
+    def _coletar(self, primeira: str) -> tuple:
+        """Take the first message plus everything that arrives within the window"""
+        mensagens = [primeira]
+        sinteses = []
+        parar = False
+        fim = time.monotonic() + settings.VOICE_COALESCE_SECONDS
+        while True:
+            try:
+                item = self._fila.get(timeout=max(fim - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _PARAR:
+                parar = True
+                break
+            if isinstance(item, _Sintese):
+                sinteses.append(item)
+            else:
+                mensagens.append(item)
+        with self._lock:
+            descartadas, self._descartadas = self._descartadas, 0
+        return mensagens, descartadas, sinteses, parar
+
+    def _descartar_pendentes(self) -> None:
+        """Fail the syntheses queued while the engine was starting"""
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, _Sintese) and item.futuro.set_running_or_notify_cancel():
+                item.futuro.set_exception(RuntimeError("Mecanismo de voz indisponível"))
+
+    def _run(self) -> None:
+        try:
+            engine = self._iniciar_engine()
+        except Exception as e:
+            logger.warning(f"Voice engine initialization failed (expected on headless server): {e}")
+            self.disponivel = False
+            self._pronto.set()
+            self._descartar_pendentes()
+            return
+        self.disponivel = True
+        self._pronto.set()
+
+        while True:
+            item = self._fila.get()
+            if item is _PARAR:
+                return
+            if isinstance(item, _Sintese):
+                self._sintetizar(engine, item)
+                continue
+            mensagens, descartadas, sinteses, parar = self._coletar(item)
+            texto = resumo_falado(mensagens, descartadas)
+            inicio = time.perf_counter()
+            try:
+                engine.say(texto)
+                engine.runAndWait()
+                logger.info(
+                    f"Voice alert played ({len(mensagens) + descartadas} alerta(s), "
+                    f"{time.perf_counter() - inicio:.1f} s)"
+                )
+            except Exception as e:
+                logger.error(f"Voice alert failed: {e}")
+            for sintese in sinteses:
+                self._sintetizar(engine, sintese)
+            if parar:
+                return
+
+
+voice_worker = VoiceWorker()
@@ -0,0 +1,116 @@
+"""
+CalibraCore Lab - Async WhatsApp Client
+Sends WhatsApp messages through the Twilio REST API on a shared, pooled
+HTTP client (keep-alive, HTTP/2 when the `h2` package is installed), so
+bulk alerts neither block the event loop nor reconnect per message
+"""
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+HTTP2_DISPONIVEL = importlib.util.find_spec("h2") is not None
+
+
+class WhatsAppError(Exception):
+    """Twilio rejected the message or could not be reached"""
+
+    def __init__(self, mensagem: str, status_code: Optional[int] = None, codigo: Optional[int] = None):
+        super().__init__(mensagem)
+        self.status_code = status_code
+        self.codigo = codigo  # Twilio error code, when given
+
+
+class TwilioWhatsAppClient:
+    """
+    Minimal async client for Twilio's Messages endpoint.
+
+    - one httpx.AsyncClient with at most `max_conexoes` connections;
+      extra sends wait for a free one (up to `timeout`)
+    - connections are kept alive between messages
+    - `base_url` can point to a local fake Twilio for tests
+    """
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        base_url: str = "https://api.twilio.com",
+        timeout: float = 15.0,
+        max_conexoes: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.account_sid = account_sid
+        self.from_number = from_number
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=HTTP2_DISPONIVEL,
+                limits=httpx.Limits(max_connections=max_conexoes, max_keepalive_connections=max_conexoes),
+                retries=1  # Reconnect once when a kept-alive connection was dropped
+            )
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(account_sid, auth_token),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            transport=transport
+        )
+
+    async def send(self, to_number: str, body: str) -> str:
+        """Send one message; returns the Twilio message SID, raises WhatsAppError"""
+        try:
+            resposta = await self._client.post(
+                f"/2010-04-01/Accounts/{self.account_sid}/Messages.json",
+                data={"To": to_number, "From": self.from_number, "Body": body}
+            )
+        except httpx.HTTPError as e:
+            raise WhatsAppError(f"Falha de conexão com o Twilio: {e!r}") from e
+
+        try:
+            dados = resposta.json()
+        except ValueError:
+            dados = {}
+        if resposta.status_code >= 400:
+            raise WhatsAppError(
+                dados.get("message") or f"Twilio respondeu HTTP {resposta.status_code}",
+                status_code=resposta.status_code,
+                codigo=dados.get("code")
+            )
+        return dados.get("sid", "")
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+_clients: Dict[Tuple, TwilioWhatsAppClient] = {}
+
+
+def get_whatsapp_client(account_sid: str, auth_token: str, from_number: str) -> TwilioWhatsAppClient:
+    """Shared client for this Twilio account (one per event loop)"""
+    loop = asyncio.get_running_loop()
+    chave = (id(loop), account_sid, from_number)
+    client = _clients.get(chave)
+    if client is None:
+        client = TwilioWhatsAppClient(
+            account_sid,
+            auth_token,
+            from_number,
+            base_url=settings.TWILIO_API_BASE_URL,
+            timeout=settings.WHATSAPP_TIMEOUT_SECONDS,
+            max_conexoes=settings.WHATSAPP_MAX_CONNECTIONS
+        )
+        _clients[chave] = client
+    return client
+
+
+async def close_whatsapp_clients() -> None:
+    """Close the pooled connections of the running event loop"""
+    loop_id = id(asyncio.get_running_loop())
+    for chave in [k for k in _clients if k[0] == loop_id]:
+        await _clients.pop(chave).close()
@@ -11,7 +11,7 @@ a = Analysis(
         ('../frontend', 'frontend'),
         ('calibracore.db', '.')
     ],
-    hiddenimports=['uvicorn.logging', 'uvicorn.loops', 'uvicorn.loops.auto', 'uvicorn.protocols', 'uvicorn.protocols.http', 'uvicorn.protocols.http.auto', 'uvicorn.lifespan', 'uvicorn.lifespan.on', 'app.routers.auth', 'app.routers.equipamentos', 'app.routers.usuarios', 'app.routers.dashboard', 'app.routers.alertas', 'email_validator'],
+    hiddenimports=['uvicorn.logging', 'uvicorn.loops', 'uvicorn.loops.auto', 'uvicorn.protocols', 'uvicorn.protocols.http', 'uvicorn.protocols.http.auto', 'uvicorn.lifespan', 'uvicorn.lifespan.on', 'app.routers.auth', 'app.routers.equipamentos', 'app.routers.usuarios', 'app.routers.dashboard', 'app.routers.alertas', 'app.routers.voz', 'email_validator'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
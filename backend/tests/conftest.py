@@ -0,0 +1,60 @@
+"""
+CalibraCore Lab - Test fixtures
+Tests run against a throwaway SQLite database; background workers
+(outbox, scheduler, voice) are off so each test drives them itself.
+"""
+import os
+import sys
+import tempfile
+
+_diretorio = tempfile.mkdtemp(prefix="calibracore-testes-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_diretorio}/testes.db",
+    OUTBOX_WORKER_ENABLED="false",
+    SCHEDULER_ENABLED="false",
+    VOICE_ENABLED="false",
+    ALERT_ARCHIVE_DIR=os.path.join(_diretorio, "arquivo"),
+    FILE_SINK_PATH=os.path.join(_diretorio, "notificacoes.jsonl"),
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.database import Base, SessionLocal, engine, init_db
+from app.main import app
+
+init_db()
+
+
+@pytest.fixture
+def db():
+    sessao = SessionLocal()
+    try:
+        yield sessao
+    finally:
+        sessao.rollback()
+        sessao.close()
+
+
+@pytest.fixture
+def client():
+    """TestClient logged in as the default admin"""
+    with TestClient(app) as cliente:
+        resposta = cliente.post("/api/auth/login", data={
+            "username": settings.ADMIN_EMAIL,
+            "password": settings.ADMIN_PASSWORD
+        })
+        cliente.headers["Authorization"] = f"Bearer {resposta.json()['access_token']}"
+        yield cliente
+
+
+@pytest.fixture(autouse=True)
+def _limpar_banco():
+    """Each test starts with only the default users"""
+    yield
+    with engine.begin() as conn:
+        for tabela in reversed(Base.metadata.sorted_tables):
+            if tabela.name != "usuarios":
+                conn.execute(tabela.delete())
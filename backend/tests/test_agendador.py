@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models import ExecucaoAlerta, TarefaLease
+from app.services.agendador import LEASE_ALERTAS, acquire_lease, release_lease, renew_lease, run_alert_job
+
+
+def test_second_run_in_the_same_process_is_refused_while_the_first_runs(db):
+    async def cenario():
+        liberar = asyncio.Event()
+        iniciou = asyncio.Event()
+
+        async def lento(sessao):
+            iniciou.set()
+            await liberar.wait()
+            return {"processados": 0, "alertas_enviados": 0, "erros": 0, "detalhes": [], "fases": {}, "latencias": {}}
+
+        primeira = asyncio.create_task(run_alert_job("agendada", executor=lento))
+        await iniciou.wait()
+        segunda = await run_alert_job("manual", executor=lento)
+        liberar.set()
+        return await primeira, segunda
+
+    primeira, segunda = asyncio.run(cenario())
+    assert segunda is None
+    assert primeira is not None
+    assert [e.origem for e in db.query(ExecucaoAlerta)] == ["agendada"]
+    # Released by its own run: the lease is free again
+    db.expire_all()
+    assert db.get(TarefaLease, LEASE_ALERTAS).dono is None
+
+
+def test_lease_is_renewed_and_released_only_by_its_holder(db):
+    dono = acquire_lease(db, "teste", 60)
+    assert dono
+    assert acquire_lease(db, "teste", 60) is None
+    assert not renew_lease(db, "teste", "outro", 60)
+    release_lease(db, "teste", "outro")
+    assert acquire_lease(db, "teste", 60) is None
+
+    # An expired lease can be taken over; the old holder can no longer renew it
+    db.query(TarefaLease).filter(TarefaLease.nome == "teste").update(
+        {TarefaLease.expira_em: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    novo = acquire_lease(db, "teste", 60)
+    assert novo and novo != dono
+    assert not renew_lease(db, "teste", dono, 60)
+    assert renew_lease(db, "teste", novo, 60)
+    release_lease(db, "teste", novo)
+    db.expire_all()
+    assert db.get(TarefaLease, "teste").dono is None
@@ -0,0 +1,114 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.alerta_service import get_alert_type, last_alert_date, next_alert_date
+from app.services.regras_alerta import TIPOS_ALERTA, PlanoRegras, Regra
+
+INICIO = date(2026, 1, 1)
+
+
+def _tipo_esperado(dias: int):
+    """The original hard-coded schedule (60/15/30/7/7)"""
+    if dias > 60:
+        return None
+    if dias == 60:
+        return TIPOS_ALERTA[0]
+    if 30 < dias < 60:
+        return TIPOS_ALERTA[1] if (60 - dias) % 15 == 0 else None
+    if 0 <= dias <= 30:
+        return TIPOS_ALERTA[2] if dias % 7 == 0 else None
+    return TIPOS_ALERTA[3] if -dias % 7 == 0 else None
+
+
+def _conferir(regra: Regra, vencimentos, dias_calendario):
+    """codigos(), proxima() and ultima() against the scalar Regra.tipo()"""
+    plano = PlanoRegras(regra, [])
+    venc = np.array([(v - INICIO).days for v in vencimentos], dtype=np.int64)
+    dias = np.arange(len(dias_calendario), dtype=np.int64)
+    codigos = plano.codigos(np.zeros(len(vencimentos), dtype=np.int64), venc[:, None] - dias[None, :])
+
+    for i, vencimento in enumerate(vencimentos):
+        disparos = [
+            hoje for hoje in dias_calendario
+            if regra.tipo((vencimento - hoje).days) is not None
+        ]
+        for j, hoje in enumerate(dias_calendario):
+            tipo = regra.tipo((vencimento - hoje).days)
+            assert codigos[i, j] == (TIPOS_ALERTA.index(tipo) + 1 if tipo else 0)
+            # The scheduler lands exactly on the next day the rule fires
+            proximo = next((d for d in disparos if d >= hoje), None)
+            if proximo is not None:
+                assert regra.proxima(vencimento, hoje) == proximo
+            # ...and finds the last one, scanning back to the initial alert
+            primeiro = vencimento - timedelta(days=regra.dias_inicial)
+            anterior = next((
+                hoje - timedelta(days=k) for k in range((hoje - primeiro).days + 1)
+                if regra.tipo((vencimento - hoje).days + k) is not None
+            ), None)
+            assert regra.ultima(vencimento, hoje) == anterior
+
+
+def test_default_rule_matches_the_original_schedule():
+    assert all(get_alert_type(d) == _tipo_esperado(d) for d in range(-200, 200))
+
+
+def test_vectorized_and_scheduled_alerts_match_the_scalar_rule_over_random_dates():
+    aleatorio = random.Random(29)
+    calendario = [INICIO + timedelta(days=d) for d in range(240)]
+    vencimentos = [INICIO + timedelta(days=aleatorio.randint(-30, 300)) for _ in range(40)]
+    _conferir(Regra.padrao(), vencimentos, calendario)
+
+    for vencimento in vencimentos:
+        hoje = calendario[aleatorio.randrange(len(calendario))]
+        assert next_alert_date(vencimento, hoje) == Regra.padrao().proxima(vencimento, hoje)
+        assert last_alert_date(vencimento, hoje) == Regra.padrao().ultima(vencimento, hoje)
+
+
+@pytest.mark.parametrize("ajustes", [
+    {"ALERT_INITIAL_DAYS": 90, "ALERT_REMINDER_INTERVAL_DAYS": 30, "ALERT_URGENT_DAYS": 14,
+     "ALERT_URGENT_INTERVAL_DAYS": 2, "ALERT_OVERDUE_INTERVAL_DAYS": 3},
+    {"ALERT_INITIAL_DAYS": 10, "ALERT_REMINDER_INTERVAL_DAYS": 4, "ALERT_URGENT_DAYS": 0,
+     "ALERT_URGENT_INTERVAL_DAYS": 1, "ALERT_OVERDUE_INTERVAL_DAYS": 1},
+])
+def test_alert_settings_overrides(monkeypatch, ajustes):
+    for nome, valor in ajustes.items():
+        monkeypatch.setattr(settings, nome, valor)
+    regra = Regra.padrao()
+    assert regra.dias_inicial == ajustes["ALERT_INITIAL_DAYS"]
+
+    aleatorio = random.Random(ajustes["ALERT_INITIAL_DAYS"])
+    calendario = [INICIO + timedelta(days=d) for d in range(200)]
+    vencimentos = [INICIO + timedelta(days=aleatorio.randint(-20, 250)) for _ in range(30)]
+    _conferir(regra, vencimentos, calendario)
+
+
+def test_indexed_selection_picks_exactly_the_equipment_due_today(db):
+    from app.models import Equipamento
+    from app.services.alerta_service import schedule_next_alert
+
+    hoje = date.today()
+    aleatorio = random.Random(2029)
+    for i in range(300):
+        equipamento = Equipamento(
+            codigo_interno=f"SEL-{i}",
+            descricao="Equipamento",
+            laboratorio="Metrologia",
+            data_vencimento=hoje + timedelta(days=aleatorio.randint(-60, 120))
+        )
+        # As left by yesterday's run
+        schedule_next_alert(equipamento, hoje)
+        db.add(equipamento)
+    db.commit()
+
+    selecionados = {
+        codigo for codigo, in db.query(Equipamento.codigo_interno).filter(Equipamento.proxima_data_alerta <= hoje)
+    }
+    esperados = {
+        e.codigo_interno for e in db.query(Equipamento)
+        if get_alert_type((e.data_vencimento - hoje).days) is not None
+    }
+    assert selecionados == esperados
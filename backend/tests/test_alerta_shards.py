@@ -0,0 +1,43 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+from app.models import CheckpointAlerta, Equipamento
+from app.services import alerta_shards
+
+
+def test_sqlite_connections_wait_for_locks():
+    with engine.connect() as conn:
+        espera = conn.execute(text("PRAGMA busy_timeout")).scalar()
+    assert espera == int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)
+
+
+def test_shards_run_in_one_process_on_sqlite(db, monkeypatch):
+    for i, laboratorio in enumerate(["Metrologia", "Química", "Física"]):
+        db.add(Equipamento(
+            codigo_interno=f"SH-{i}",
+            descricao="Manômetro",
+            categoria="Pressão",
+            laboratorio=laboratorio,
+            data_ultima_calibracao=date.today() - timedelta(days=360),
+            data_vencimento=date.today() + timedelta(days=7)
+        ))
+    db.commit()
+
+    processos = []
+
+    class _Pool(ThreadPoolExecutor):
+        def __init__(self, max_workers=None, initializer=None):
+            processos.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(alerta_shards, "ProcessPoolExecutor", _Pool)
+    resultado = asyncio.run(alerta_shards.process_alerts_sharded(db, workers=4))
+
+    assert processos == [1]
+    assert resultado["processados"] == 3
+    assert db.query(CheckpointAlerta).count() == 3
@@ -0,0 +1,58 @@
+from datetime import date, datetime, timedelta
+
+from app.models import AlertaEnviado, Equipamento
+
+
+def _equipamento(db, codigo, dias_para_vencer, **campos):
+    equipamento = Equipamento(
+        codigo_interno=codigo,
+        descricao="Paquímetro",
+        categoria=campos.pop("categoria", "Dimensional"),
+        laboratorio=campos.pop("laboratorio", "Metrologia"),
+        data_ultima_calibracao=date.today() - timedelta(days=300),
+        data_vencimento=date.today() + timedelta(days=dias_para_vencer),
+        **campos
+    )
+    db.add(equipamento)
+    db.commit()
+    return equipamento
+
+
+def test_simulation_runs_on_its_own_session(client, db):
+    _equipamento(db, "SIM-1", 10)
+    resposta = client.get("/api/alertas/simulacao", params={"fim": (date.today() + timedelta(days=20)).isoformat()})
+    assert resposta.status_code == 200, resposta.text
+    simulacao = resposta.json()
+    assert simulacao["equipamentos"] == 1
+    assert simulacao["total_alertas"] > 0
+
+
+def test_history_pages_through_rows_without_data_envio(client, db):
+    equipamento = _equipamento(db, "HIST-1", 30)
+    agora = datetime(2026, 5, 1, 12, 0)
+    for i in range(3):
+        db.add(AlertaEnviado(equipamento_id=equipamento.id, tipo_alerta="vencido", data_envio=agora - timedelta(days=i)))
+    for _ in range(3):
+        db.add(AlertaEnviado(equipamento_id=equipamento.id, tipo_alerta="vencido"))
+    db.flush()
+    # Legacy rows: the default filled data_envio, clear it
+    db.query(AlertaEnviado).filter(AlertaEnviado.data_envio > agora).update({AlertaEnviado.data_envio: None})
+    db.commit()
+
+    vistos, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resposta = client.get("/api/alertas/historico", params=params)
+        assert resposta.status_code == 200, resposta.text
+        pagina = resposta.json()
+        vistos.extend(pagina["items"])
+        cursor = pagina["proximo_cursor"]
+        if not cursor:
+            break
+
+    assert len({item["id"] for item in vistos}) == len(vistos) == 6
+    datas = [item["data_envio"] for item in vistos]
+    assert datas[3:] == [None, None, None]
+    assert datas[:3] == sorted(datas[:3], reverse=True)
@@ -0,0 +1,75 @@
+import json
+from datetime import date, timedelta
+
+from app.config import settings
+from app.models import NotificacaoOutbox
+
+
+def _criar_equipamento(client, **campos):
+    dados = {
+        "codigo_interno": "ALR-1",
+        "descricao": "Termômetro",
+        "categoria": "Temperatura",
+        "laboratorio": "Metrologia",
+        "data_ultima_calibracao": (date.today() - timedelta(days=360)).isoformat(),
+        "data_vencimento": (date.today() + timedelta(days=5)).isoformat(),
+        "email_contato": "lab@example.org",
+        "telefone_contato": "+5511999990000",
+        "notificar_automaticamente": True
+    }
+    dados.update(campos)
+    resposta = client.post("/api/equipamentos", json=dados)
+    assert resposta.status_code == 201, resposta.text
+    return resposta.json()["id"]
+
+
+def test_nothing_is_queued_for_channels_that_are_not_configured(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_USER", "")
+    monkeypatch.setattr(settings, "TWILIO_SID", "")
+    equipamento_id = _criar_equipamento(client)
+    client.put(f"/api/equipamentos/{equipamento_id}", json={"descricao": "Termômetro digital"})
+    client.post(f"/api/equipamentos/{equipamento_id}/alerta/manual")
+
+    assert db.query(NotificacaoOutbox).count() == 0
+    fila = client.get("/api/alertas/notificacoes").json()
+    assert fila["falhas"] == []
+
+
+def test_alerts_go_to_the_configured_recipients_only(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_USER", "alertas@example.org")
+    monkeypatch.setattr(settings, "SMTP_PASSWORD", "segredo")
+    monkeypatch.setattr(settings, "TWILIO_SID", "")
+    monkeypatch.setattr(settings, "ALERT_RECIPIENTS", "qualidade@example.org")
+    _criar_equipamento(client)
+
+    filas = db.query(NotificacaoOutbox).all()
+    assert [f.canal for f in filas] == ["email"]
+    destinatarios = json.loads(filas[0].destinatarios)
+    # ALERT_RECIPIENTS, the responsible user (the creator) and the equipment's contact
+    assert sorted(destinatarios) == sorted([settings.ADMIN_EMAIL, "lab@example.org", "qualidade@example.org"])
+    assert not any("example.com" in d for d in destinatarios)
+
+
+def test_manual_alert_type_follows_the_equipment_rule(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_USER", "alertas@example.org")
+    monkeypatch.setattr(settings, "SMTP_PASSWORD", "segredo")
+    resposta = client.post("/api/alertas/regras", json={
+        "categoria": "Pressão", "dias_inicial": 120, "intervalo_lembrete": 20, "dias_urgente": 40
+    })
+    assert resposta.status_code == 201, resposta.text
+
+    casos = [
+        # Past this rule's first alert, still far by the defaults
+        ("MAN-1", "Pressão", 90, "[CalibraCore] Lembrete: Calibração vence em 90 dias - MAN-1"),
+        ("MAN-2", "Pressão", 35, "[CalibraCore] URGENTE: Calibração vence em 35 dias - MAN-2"),
+        ("MAN-3", "Temperatura", 90, "🔔 [Manual] Lembrete de Equipamento: MAN-3"),
+    ]
+    for codigo, categoria, dias, _ in casos:
+        equipamento_id = _criar_equipamento(
+            client, codigo_interno=codigo, categoria=categoria, notificar_automaticamente=False,
+            data_vencimento=(date.today() + timedelta(days=dias)).isoformat()
+        )
+        assert client.post(f"/api/equipamentos/{equipamento_id}/alerta/manual").status_code == 200
+
+    assuntos = {a for a, in db.query(NotificacaoOutbox.assunto).filter(NotificacaoOutbox.canal == "email")}
+    assert assuntos == {assunto for *_, assunto in casos}
@@ -0,0 +1,59 @@
+import hashlib
+from datetime import date, timedelta
+
+
+def _criar_equipamento(client, codigo="CAL-1"):
+    resposta = client.post("/api/equipamentos", json={
+        "codigo_interno": codigo,
+        "descricao": "Balança analítica",
+        "categoria": "Balanças",
+        "laboratorio": "Metrologia",
+        "data_ultima_calibracao": (date.today() - timedelta(days=300)).isoformat(),
+        "data_vencimento": (date.today() + timedelta(days=65)).isoformat()
+    })
+    assert resposta.status_code == 201
+    return resposta.json()["id"]
+
+
+def _enviar_certificado(client, equipamento_id, conteudo: bytes):
+    resposta = client.post(
+        f"/api/equipamentos/{equipamento_id}/comprovante",
+        files={"file": ("certificado.pdf", conteudo, "application/pdf")}
+    )
+    assert resposta.status_code == 200, resposta.text
+
+
+def test_history_keeps_the_hash_of_the_certificate_uploaded_for_the_calibration(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    equipamento_id = _criar_equipamento(client)
+    _enviar_certificado(client, equipamento_id, b"%PDF certificado anterior")
+
+    resposta = client.post(f"/api/equipamentos/{equipamento_id}/registrar-calibracao", params={
+        "data_calibracao": date.today().isoformat(),
+        "data_novo_vencimento": (date.today() + timedelta(days=365)).isoformat(),
+        "numero_certificado": "CERT-2"
+    })
+    assert resposta.status_code == 200
+    historico = client.get(f"/api/equipamentos/{equipamento_id}/calibracoes").json()
+    # The previous calibration's file is not this calibration's certificate
+    assert historico[0]["hash_arquivo"] is None
+
+    novo = b"%PDF certificado novo"
+    _enviar_certificado(client, equipamento_id, novo)
+    historico = client.get(f"/api/equipamentos/{equipamento_id}/calibracoes").json()
+    assert len(historico) == 1
+    assert historico[0]["hash_arquivo"] == hashlib.sha256(novo).hexdigest()
+
+    # A replaced certificate is appended, the original row is kept
+    corrigido = b"%PDF certificado corrigido"
+    _enviar_certificado(client, equipamento_id, corrigido)
+    historico = client.get(f"/api/equipamentos/{equipamento_id}/calibracoes").json()
+    assert len(historico) == 2
+    correcao, original = historico
+    assert original["hash_arquivo"] == hashlib.sha256(novo).hexdigest()
+    assert correcao["hash_arquivo"] == hashlib.sha256(corrigido).hexdigest()
+    assert correcao["substitui_id"] == original["id"]
+
+    # Corrections are not counted as calibrations
+    stats = client.get("/api/dashboard/calibracoes-stats").json()
+    assert [s["calibracoes"] for s in stats if s["categoria"] == "Balanças"] == [1]
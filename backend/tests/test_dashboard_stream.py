@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+from app.services.dashboard_stream import DashboardBroadcaster
+
+
+def test_stream_token_only_opens_the_stream(client):
+    stream = client.post("/api/dashboard/stream-token").json()["token"]
+    acesso = client.headers["Authorization"].split()[1]
+
+    # The stream token is not an access token...
+    resposta = client.get("/api/dashboard/resumo", headers={"Authorization": f"Bearer {stream}"})
+    assert resposta.status_code == 401
+    # ...and the access token does not open the stream
+    assert client.get(f"/api/dashboard/stream?token={acesso}").status_code == 401
+
+
+def test_notify_from_another_thread_reaches_subscribers():
+    async def cenario():
+        broadcaster = DashboardBroadcaster()
+        broadcaster._compute = lambda: {"total": 1}
+        broadcaster.start()
+        fila = broadcaster.subscribe()
+        try:
+            threading.Thread(target=broadcaster.notify, args=("agendador",)).start()
+            return await asyncio.wait_for(fila.get(), timeout=5)
+        finally:
+            await broadcaster.stop()
+
+    event_id, evento, dados = asyncio.run(cenario())
+    assert evento == "delta"
+    assert dados == {"motivo": "agendador", "alteracoes": {"total": 1}}
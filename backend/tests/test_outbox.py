@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import AlertaEnviado, Equipamento, NotificacaoAlerta, NotificacaoOutbox
+from app.services.outbox import enqueue, outbox_worker, prune_outbox
+
+
+def test_drain_waits_for_rows_another_worker_is_sending(db, monkeypatch):
+    monkeypatch.setattr("app.services.outbox.ESPERA_DRENAGEM_SEGUNDOS", 0.01)
+    enqueue(db, "teste:1", "email", "corpo", ["lab@example.org"], "Assunto", origem="alertas:hoje")
+    db.commit()
+    # Claimed by the background worker, still being sent
+    db.execute(update(NotificacaoOutbox).values(
+        status="processando", bloqueado_ate=datetime.utcnow() + timedelta(minutes=5)
+    ))
+    db.commit()
+
+    async def cenario():
+        drenagem = asyncio.create_task(outbox_worker.drain("alertas:hoje"))
+        await asyncio.sleep(0.1)
+        assert not drenagem.done()
+
+        outra = SessionLocal()
+        try:
+            outra.execute(update(NotificacaoOutbox).values(status="enviado", bloqueado_ate=None))
+            outra.commit()
+        finally:
+            outra.close()
+        await asyncio.wait_for(drenagem, 2)
+
+    asyncio.run(cenario())
+
+
+def _alertas(db, quantidade):
+    equipamento = Equipamento(codigo_interno="OUT-1", descricao="Balança", laboratorio="Metrologia", data_vencimento=date(2026, 6, 1))
+    db.add(equipamento)
+    db.flush()
+    alertas = [AlertaEnviado(equipamento_id=equipamento.id, tipo_alerta="vencido", sucesso=False) for _ in range(quantidade)]
+    db.add_all(alertas)
+    db.flush()
+    return [alerta.id for alerta in alertas]
+
+
+def _status(db, chave, status, erro=None):
+    db.query(NotificacaoOutbox).filter(NotificacaoOutbox.chave == chave).update(
+        {NotificacaoOutbox.status: status, NotificacaoOutbox.ultimo_erro: erro}
+    )
+
+
+def test_outcomes_only_touch_the_alerts_of_the_batch(db):
+    a1, a2, a3 = _alertas(db, 3)
+    enqueue(db, "alerta:1:email", "email", "corpo", ["a@example.org"], "Assunto", origem="alertas:dia", alerta_ids=[a1])
+    enqueue(db, "alerta:1:resumo", "email", "corpo", ["b@example.org"], "Resumo", origem="alertas:dia", alerta_ids=[a1, a2])
+    enqueue(db, "alerta:3:email", "email", "corpo", ["c@example.org"], "Assunto", origem="alertas:dia", alerta_ids=[a3])
+    db.commit()
+    ids = dict(db.query(NotificacaoOutbox.chave, NotificacaoOutbox.id))
+
+    # a1 also waits for the digest; a3 is in the same origin but not in the batch
+    _status(db, "alerta:1:email", "enviado")
+    _status(db, "alerta:3:email", "enviado")
+    outbox_worker._sync_alertas(db, [ids["alerta:1:email"]])
+    db.commit()
+    assert [db.get(AlertaEnviado, a).sucesso for a in (a1, a2, a3)] == [False, False, False]
+
+    _status(db, "alerta:1:resumo", "enviado")
+    outbox_worker._sync_alertas(db, [ids["alerta:1:resumo"]])
+    db.commit()
+    db.expire_all()
+    assert [db.get(AlertaEnviado, a).sucesso for a in (a1, a2, a3)] == [True, True, False]
+
+
+def test_finished_notifications_are_pruned_after_the_retention(db, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_RETENTION_DAYS", 30)
+    (alerta,) = _alertas(db, 1)
+    for chave in ("antiga:enviada", "antiga:pendente", "recente:enviada"):
+        enqueue(db, chave, "email", "corpo", ["a@example.org"], "Assunto", alerta_ids=[alerta])
+    db.commit()
+    _status(db, "antiga:enviada", "enviado")
+    _status(db, "recente:enviada", "enviado")
+    db.query(NotificacaoOutbox).filter(NotificacaoOutbox.chave.like("antiga:%")).update(
+        {NotificacaoOutbox.criado_em: datetime.utcnow() - timedelta(days=31)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert prune_outbox(db) == 1
+    assert sorted(c for c, in db.query(NotificacaoOutbox.chave)) == ["antiga:pendente", "recente:enviada"]
+    assert db.query(NotificacaoAlerta).count() == 2
@@ -0,0 +1,161 @@
+import itertools
+import random
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+from app.models import AlertaEnviado, Equipamento, NotificacaoOutbox, RegraAlerta
+from app.services.alerta_service import prepare_alerts
+from app.services.email_templates import alert_style, render_alert, render_subject
+from app.services.metricas import Cronometro
+from app.services.regras_alerta import (
+    TIPOS_ALERTA, PlanoRegras, Regra, alert_rules, invalidate_alert_rules, rename_legacy_alert_types
+)
+
+VENCIMENTO = date(2026, 6, 1)
+CATEGORIAS = ["Balanças", "Pressão", None]
+LABORATORIOS = ["Metrologia", "Química", "Física"]
+
+
+def _regras(db):
+    """One rule per scope kind, with different thresholds"""
+    regras = [
+        RegraAlerta(categoria=None, laboratorio=None, dias_inicial=90, intervalo_lembrete=30, dias_urgente=20, intervalo_urgente=5, intervalo_vencido=3),
+        RegraAlerta(categoria="Balanças", laboratorio=None, dias_inicial=45, intervalo_lembrete=10, dias_urgente=15, intervalo_urgente=3, intervalo_vencido=2),
+        RegraAlerta(categoria=None, laboratorio="Química", dias_inicial=30, intervalo_lembrete=7, dias_urgente=10, intervalo_urgente=2, intervalo_vencido=1),
+        RegraAlerta(categoria="Balanças", laboratorio="Química", dias_inicial=120, intervalo_lembrete=20, dias_urgente=40, intervalo_urgente=10, intervalo_vencido=14),
+    ]
+    db.add_all(regras)
+    db.commit()
+    return regras
+
+
+def test_sql_rule_index_matches_python_lookup(db):
+    _regras(db)
+    for i, (categoria, laboratorio) in enumerate(itertools.product(CATEGORIAS, LABORATORIOS)):
+        db.add(Equipamento(
+            codigo_interno=f"EQ-{i}",
+            descricao="Instrumento",
+            categoria=categoria,
+            laboratorio=laboratorio,
+            data_vencimento=VENCIMENTO
+        ))
+    db.commit()
+
+    for plano in (PlanoRegras(Regra.padrao(), db.query(RegraAlerta).all()), PlanoRegras(Regra.padrao(), [])):
+        linhas = db.query(Equipamento.categoria, Equipamento.laboratorio, plano.sql_indice()).all()
+        assert len(linhas) == 9
+        for categoria, laboratorio, indice in linhas:
+            assert indice == plano.indice(categoria, laboratorio), (categoria, laboratorio)
+
+
+def test_vectorized_codes_match_each_rule(db):
+    plano = PlanoRegras(Regra.padrao(), _regras(db))
+    aleatorio = random.Random(50)
+    indices = np.array([aleatorio.randrange(len(plano.regras)) for _ in range(40)], dtype=np.int64)
+    dias = np.array([[aleatorio.randint(-60, 150) for _ in range(30)] for _ in indices], dtype=np.int64)
+
+    codigos = plano.codigos(indices, dias)
+    for i, indice in enumerate(indices):
+        regra = plano.regras[indice]
+        for j, d in enumerate(dias[i]):
+            tipo = regra.tipo(int(d))
+            assert codigos[i, j] == (TIPOS_ALERTA.index(tipo) + 1 if tipo else 0)
+            # Whenever the rule fires, the type is the band the day falls in
+            if tipo:
+                assert regra.faixa(int(d)) == tipo
+
+
+def test_rule_changes_invalidate_the_cached_plan(client, db):
+    invalidate_alert_rules()
+    assert len(alert_rules(db).regras) == 1
+    assert alert_rules(db) is alert_rules(db)
+
+    resposta = client.post("/api/alertas/regras", json={"categoria": "Balanças", "dias_inicial": 45, "dias_urgente": 15})
+    assert resposta.status_code == 201, resposta.text
+    plano = alert_rules(db)
+    assert plano.regra_para("Balanças", "Metrologia").dias_inicial == 45
+
+    regra_id = resposta.json()["id"]
+    resposta = client.put(f"/api/alertas/regras/{regra_id}", json={"dias_inicial": 50})
+    assert resposta.status_code == 200, resposta.text
+    assert alert_rules(db).regra_para("Balanças", None).dias_inicial == 50
+
+    # Changed by another process: the fingerprint (count, max id, last update) moves
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE regras_alerta SET dias_inicial = 70, atualizado_em = '2999-01-01 00:00:00.000000'"
+        ))
+    db.expire_all()
+    assert alert_rules(db).regra_para("Balanças", None).dias_inicial == 70
+
+    assert client.delete(f"/api/alertas/regras/{regra_id}").status_code == 200
+    assert alert_rules(db).regra_para("Balanças", None).dias_inicial == settings.ALERT_INITIAL_DAYS
+
+
+def test_subject_and_style_follow_the_rule_and_actual_days():
+    regra = Regra(dias_inicial=120, intervalo_lembrete=20, dias_urgente=40, intervalo_urgente=10, intervalo_vencido=14)
+    assert regra.tipo(120) == "inicial"
+    assert render_subject("inicial", 120, "BAL-1") == "[CalibraCore] Aviso: Calibração vence em 120 dias - BAL-1"
+
+    # 40 days is urgent under this rule, not "attention" as with the defaults
+    tipo = regra.tipo(40)
+    assert tipo == "urgente"
+    assert render_subject(tipo, 40, "BAL-1") == "[CalibraCore] URGENTE: Calibração vence em 40 dias - BAL-1"
+    cor, urgencia, mensagem = alert_style(tipo, 40)
+    assert urgencia == "🟠 URGENTE" and "40 dias" in mensagem
+    html = render_alert(tipo, "BAL-1", "Balança", "Metrologia", "01/06/2026", 40)
+    assert "URGENTE" in html and "40 dias" in html and "60 dias" not in html
+
+    assert render_subject("urgente", 0, "BAL-1") == "[CalibraCore] URGENTE: Calibração vence hoje - BAL-1"
+    assert "há 1 dia!" in alert_style("vencido", -1)[2]
+
+
+def test_legacy_alert_type_names_are_renamed(db):
+    equipamento = Equipamento(codigo_interno="LEG-1", descricao="Pipeta", laboratorio="Química", data_vencimento=VENCIMENTO)
+    db.add(equipamento)
+    db.flush()
+    for tipo in ("inicial_60", "lembrete_15", "urgente_7", "vencido"):
+        db.add(AlertaEnviado(equipamento_id=equipamento.id, tipo_alerta=tipo))
+    db.commit()
+
+    with engine.begin() as conn:
+        rename_legacy_alert_types(conn)
+    db.expire_all()
+    assert sorted(t for t, in db.query(AlertaEnviado.tipo_alerta)) == sorted(TIPOS_ALERTA)
+
+
+def test_alert_caught_up_after_the_due_date_is_sent_as_overdue(db, monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_RECIPIENTS", "qualidade@example.org")
+    hoje = date.today()
+    # The urgent alert of the due date (dias 0) was missed; today it is 1 day overdue
+    db.add(Equipamento(
+        codigo_interno="ATR-1",
+        descricao="Balança",
+        laboratorio="Metrologia",
+        data_vencimento=hoje - timedelta(days=1),
+        proxima_data_alerta=hoje - timedelta(days=1)
+    ))
+    db.commit()
+
+    _, alertas = prepare_alerts(db, hoje, Cronometro())
+    db.commit()
+    assert [a["tipo_alerta"] for a in alertas] == ["vencido"]
+    (assunto,) = [a for a, in db.query(NotificacaoOutbox.assunto)]
+    assert assunto == "[CalibraCore] ⚠️ VENCIDO: Calibração expirada - ATR-1"
+    assert "VENCIDA há 1 dia" in db.query(NotificacaoOutbox.corpo).scalar()
+
+    assert render_subject("urgente", -3, "ATR-1") == "[CalibraCore] URGENTE: Calibração venceu há 3 dias - ATR-1"
+
+
+def test_template_caches_are_bounded():
+    from app.services.email_templates import _digest_fragmentos
+
+    for dias in range(-10000, 0):
+        alert_style("vencido", dias)
+        _digest_fragmentos("vencido", dias)
+    assert alert_style.cache_info().currsize <= alert_style.cache_info().maxsize
+    assert _digest_fragmentos.cache_info().currsize <= _digest_fragmentos.cache_info().maxsize
@@ -0,0 +1,106 @@
+import asyncio
+import socket
+import time
+from email.message import EmailMessage
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from aiosmtplib import SMTPRecipientsRefused, SMTPTimeoutError
+
+from app.services.smtp_pool import SMTPPool
+
+
+class Servidor:
+    """aiosmtpd handler: counts DATA commands, can refuse recipients or stall DATA"""
+
+    def __init__(self):
+        self.dados = 0
+        self.recusar = set()
+        self.atraso_dados = 0.0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.recusar:
+            return "550 Destinatário inexistente"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.dados += 1
+        await asyncio.sleep(self.atraso_dados)
+        return "250 OK"
+
+
+@pytest.fixture
+def servidor():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        porta = s.getsockname()[1]
+    handler = Servidor()
+    controller = Controller(handler, hostname="127.0.0.1", port=porta)
+    controller.start()
+    handler.porta = porta
+    yield handler
+    controller.stop()
+
+
+def _mensagem(destinatario="lab@calibracore.lab"):
+    mensagem = EmailMessage()
+    mensagem["Subject"] = "Teste"
+    mensagem["From"] = "noreply@calibracore.lab"
+    mensagem["To"] = destinatario
+    mensagem.set_content("Teste")
+    return mensagem
+
+
+def _pool(servidor, **kwargs):
+    return SMTPPool("127.0.0.1", servidor.porta, start_tls=False, **kwargs)
+
+
+def test_refused_and_cancelled_sends_do_not_exhaust_the_pool(servidor):
+    servidor.recusar.add("ninguem@calibracore.lab")
+
+    async def cenario():
+        pool = _pool(servidor, tamanho=2)
+        for _ in range(5):
+            with pytest.raises(SMTPRecipientsRefused):
+                await pool.send_message(_mensagem("ninguem@calibracore.lab"))
+        servidor.atraso_dados = 1.0
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.send_message(_mensagem(), timeout=0.2)
+        servidor.atraso_dados = 0.0
+        await asyncio.wait_for(pool.send_message(_mensagem()), timeout=5)
+        await pool.close()
+
+    asyncio.run(cenario())
+
+
+def test_a_timeout_during_data_is_not_retried(servidor):
+    servidor.atraso_dados = 1.0
+
+    async def cenario():
+        pool = _pool(servidor, timeout=0.3)
+        with pytest.raises(SMTPTimeoutError):
+            await pool.send_message(_mensagem())
+        await pool.close()
+
+    asyncio.run(cenario())
+    time.sleep(1.0)
+    # The server got the message once: a retry could deliver it twice
+    assert servidor.dados == 1
+
+
+def test_timeout_does_not_count_the_wait_for_a_free_connection(servidor):
+    servidor.atraso_dados = 0.3
+
+    async def cenario():
+        pool = _pool(servidor, tamanho=1)
+        # Three sends of ~0.3 s queue on one connection: the last one waits
+        # ~0.6 s for it, more than the timeout, but its own send is quick
+        await asyncio.gather(*(pool.send_message(_mensagem(), timeout=0.5) for _ in range(3)))
+        await pool.close()
+
+    asyncio.run(cenario())
+    assert servidor.dados == 3
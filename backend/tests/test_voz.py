@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from app.services.voz import VoiceWorker
+
+
+class _EngineFalso:
+    def __init__(self):
+        self.falado = []
+
+    def say(self, texto):
+        self.falado.append(texto)
+
+    def runAndWait(self):
+        pass
+
+
+def test_speak_does_not_wait_for_the_engine_to_start(monkeypatch):
+    liberar = threading.Event()
+    engine = _EngineFalso()
+
+    def iniciar_lento(self):
+        liberar.wait(5)
+        return engine
+
+    monkeypatch.setattr(VoiceWorker, "_iniciar_engine", iniciar_lento)
+    monkeypatch.setattr("app.services.voz.settings.VOICE_COALESCE_SECONDS", 0)
+    worker = VoiceWorker()
+    try:
+        inicio = time.monotonic()
+        assert worker.speak("Equipamento vencido")
+        assert time.monotonic() - inicio < 0.5
+
+        # Queued while starting, spoken once the engine is up
+        liberar.set()
+        for _ in range(50):
+            if engine.falado:
+                break
+            time.sleep(0.05)
+        assert engine.falado == ["Equipamento vencido"]
+    finally:
+        worker.stop()
+
+
+def test_synthesis_queued_while_starting_fails_if_the_engine_does(monkeypatch, tmp_path):
+    liberar = threading.Event()
+
+    def iniciar_falha(self):
+        liberar.wait(5)
+        raise OSError("sem driver de áudio")
+
+    monkeypatch.setattr(VoiceWorker, "_iniciar_engine", iniciar_falha)
+    worker = VoiceWorker()
+    futuro = worker.synthesize("Alerta", str(tmp_path / "alerta.wav"))
+    liberar.set()
+    with pytest.raises(RuntimeError):
+        futuro.result(timeout=5)
+    assert not worker.disponivel
+    assert worker.speak("Outro alerta") is False
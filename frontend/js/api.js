@@ -154,6 +154,10 @@ const API = {
         return this.request('/api/dashboard/laboratorios-stats');
     },
 
+    async getStreamToken() {
+        return this.request('/api/dashboard/stream-token', { method: 'POST' });
+    },
+
     // ============= Equipamentos =============
 
     async getEquipamentos(params = {}) {
@@ -14,6 +14,9 @@ document.addEventListener('DOMContentLoaded', () => {
     loadEquipments();
     loadLaboratories();
 
+    // Live updates (replaces manual reloads)
+    subscribeDashboard();
+
     // Setup filters
     setupFilters();
     setupModalEvents();
@@ -24,6 +27,10 @@ document.addEventListener('DOMContentLoaded', () => {
 let currentPage = 1;
 const perPage = 15;
 
+// Last summary received (REST or stream)
+let currentResumo = null;
+let dashboardStream = null;
+
 
 /**
  * Load dashboard summary
@@ -32,20 +39,10 @@ async function loadDashboard() {
     try {
         const resumo = await API.getDashboardResumo();
 
-        document.getElementById('stat-total').textContent = resumo.total;
-        document.getElementById('stat-ok').textContent = resumo.em_dia;
-        document.getElementById('stat-60').textContent = resumo.vence_60_dias;
-        document.getElementById('stat-30').textContent = resumo.vence_30_dias;
-        document.getElementById('stat-vencidos').textContent = resumo.vencidos;
-
-        // Reset Alert Classes
-        document.querySelector('.stat-card.danger').classList.remove('blink-critical');
-        document.querySelector('.stat-card.warning-30').classList.remove('blink-warning');
+        renderResumo(resumo);
 
         // Logic for Critical Alerts (Expired)
         if (resumo.vencidos > 0) {
-            document.querySelector('.stat-card.danger').classList.add('blink-critical');
-
             // Setup Modal Data
             document.getElementById('critical-count').textContent = resumo.vencidos;
             document.getElementById('warning-count').textContent = resumo.vence_30_dias;
@@ -62,11 +59,6 @@ async function loadDashboard() {
             playAlertSound();
         }
 
-        // Logic for Warnings (30 days)
-        if (resumo.vence_30_dias > 0) {
-            document.querySelector('.stat-card.warning-30').classList.add('blink-warning');
-        }
-
         // Voice Greeting
         const user = await API.getMe();
 
@@ -100,6 +92,64 @@ async function loadDashboard() {
     }
 }
 
+/**
+ * Render summary counters and alert highlights
+ */
+function renderResumo(resumo) {
+    currentResumo = { ...resumo };
+
+    document.getElementById('stat-total').textContent = resumo.total;
+    document.getElementById('stat-ok').textContent = resumo.em_dia;
+    document.getElementById('stat-60').textContent = resumo.vence_60_dias;
+    document.getElementById('stat-30').textContent = resumo.vence_30_dias;
+    document.getElementById('stat-vencidos').textContent = resumo.vencidos;
+
+    document.querySelector('.stat-card.danger').classList.toggle('blink-critical', resumo.vencidos > 0);
+    document.querySelector('.stat-card.warning-30').classList.toggle('blink-warning', resumo.vence_30_dias > 0);
+}
+
+
+/**
+ * Subscribe to live dashboard updates (Server-Sent Events).
+ * The browser reconnects on its own and resumes via Last-Event-ID. The URL
+ * carries a short-lived stream token, never the access token; once it has
+ * expired the reconnect is refused and we subscribe again with a new one.
+ */
+async function subscribeDashboard() {
+    if (!window.EventSource || !API.getToken()) return;
+
+    let streamToken;
+    try {
+        streamToken = await API.getStreamToken();
+    } catch (error) {
+        console.warn('Dashboard stream unavailable:', error);
+        return;
+    }
+
+    dashboardStream = new EventSource(`/api/dashboard/stream?token=${encodeURIComponent(streamToken.token)}`);
+
+    dashboardStream.addEventListener('resumo', (event) => {
+        renderResumo(JSON.parse(event.data));
+    });
+
+    dashboardStream.addEventListener('delta', (event) => {
+        const data = JSON.parse(event.data);
+        renderResumo({ ...(currentResumo || {}), ...data.alteracoes });
+        loadEquipments();
+    });
+
+    dashboardStream.onerror = () => {
+        if (dashboardStream.readyState === EventSource.CLOSED) {
+            console.warn('Dashboard stream closed, subscribing again...');
+            setTimeout(subscribeDashboard, 5000);
+        } else {
+            console.warn('Dashboard stream disconnected, retrying...');
+        }
+    };
+}
+
+window.addEventListener('beforeunload', () => dashboardStream && dashboardStream.close());
+
 function playAlertSound() {
     const audio = document.getElementById('alert-sound');
     if (audio) {
@@ -6,6 +6,11 @@ const VoiceService = {
     synth: window.speechSynthesis,
     voice: null,
     speaking: false,
+    serverAudio: true,          // Server-rendered audio first, speechSynthesis as fallback
+    audioUrls: new Map(),       // text -> Promise<url>
+    queue: Promise.resolve(),   // Phrases play one after another
+    generation: 0,              // Bumped by cancel() to drop queued phrases
+    audio: null,
 
     // Helper: Number to Words PT-BR
     numberToWords(n) {
@@ -124,27 +129,102 @@ const VoiceService = {
     },
 
     /**
-     * Speak text
+     * Get the URL of the server-rendered audio for a phrase (cached on disk
+     * by the server and, being content-addressed, by the browser)
      */
-    speak(text, priority = false) {
-        if (!this.synth) return;
+    fetchAudioUrl(text) {
+        if (!this.audioUrls.has(text)) {
+            const promise = API.request('/api/voz/audio', {
+                method: 'POST',
+                body: JSON.stringify({ texto: text })
+            }).then(data => data.url);
+            promise.catch(() => this.audioUrls.delete(text));
+            this.audioUrls.set(text, promise);
+        }
+        return this.audioUrls.get(text);
+    },
 
-        // If voice not loaded, try to load it now
-        if (!this.voice) this.loadVoice();
-        if (!this.voice) {
-            console.warn('Jarvis: Cannot speak, no voice loaded.');
-            return;
+    /**
+     * Play an audio URL, resolving when it ends
+     */
+    playUrl(url) {
+        return new Promise((resolve, reject) => {
+            const audio = new Audio(url);
+            this.audio = audio;
+            audio.onended = resolve;
+            audio.onerror = () => reject(new Error('Falha ao reproduzir áudio'));
+            audio.play().catch(reject);
+        });
+    },
+
+    /**
+     * Speak with the browser's speechSynthesis, resolving when done
+     */
+    speakBrowser(text) {
+        return new Promise(resolve => {
+            if (!this.synth) return resolve();
+
+            // If voice not loaded, try to load it now
+            if (!this.voice) this.loadVoice();
+            if (!this.voice) {
+                console.warn('Jarvis: Cannot speak, no voice loaded.');
+                return resolve();
+            }
+
+            const utterance = new SpeechSynthesisUtterance(text);
+            utterance.voice = this.voice;
+            utterance.rate = 0.9;
+            utterance.pitch = 1.0;
+            utterance.volume = 1.0;
+            utterance.onend = resolve;
+            utterance.onerror = resolve;
+            this.synth.speak(utterance);
+        });
+    },
+
+    /**
+     * Stop the current phrase and drop the queued ones
+     */
+    cancel() {
+        this.generation++;
+        this.queue = Promise.resolve();
+        if (this.audio) {
+            this.audio.pause();
+            this.audio = null;
         }
+        if (this.synth) this.synth.cancel();
+    },
 
-        if (priority) this.synth.cancel();
+    /**
+     * Speak text (queued after the phrases already requested)
+     */
+    speak(text, priority = false) {
+        if (priority) this.cancel();
 
         console.log('Jarvis speaking:', text);
-        const utterance = new SpeechSynthesisUtterance(text);
-        utterance.voice = this.voice;
-        utterance.rate = 0.9;
-        utterance.pitch = 1.0;
-        utterance.volume = 1.0;
-        this.synth.speak(utterance);
+        const generation = this.generation;
+        // Request the audio right away so rendering overlaps earlier phrases
+        const url = this.serverAudio
+            ? this.fetchAudioUrl(text).catch(() => {
+                this.serverAudio = false; // No voice engine on this server: stop asking
+                return null;
+            })
+            : Promise.resolve(null);
+
+        this.queue = this.queue.then(async () => {
+            if (generation !== this.generation) return;
+            const audioUrl = await url;
+            if (generation !== this.generation) return;
+            if (audioUrl) {
+                try {
+                    await this.playUrl(audioUrl);
+                    return;
+                } catch (e) {
+                    console.warn('Jarvis: server audio failed, using browser voice.', e);
+                }
+            }
+            await this.speakBrowser(text);
+        });
     },
 
     /**
@@ -152,7 +232,7 @@ const VoiceService = {
      */
     async greetUser(userName, stats, expiringItems = [], force = false) {
         console.log('Jarvis: greetUser called', { userName, stats, itemCount: expiringItems.length });
-        this.synth.cancel();
+        this.cancel();
 
         const now = new Date();
         const hour = now.getHours();
@@ -0,0 +1,61 @@
+"""
+CalibraCore Lab - Script de Arquivamento do Histórico de Alertas
+O servidor já arquiva diariamente, logo após o processamento dos alertas.
+Use este script quando o servidor não fica ligado ou para arquivar com
+outro período de retenção.
+
+Uso:
+    python arquivar_alertas.py            # ALERT_RETENTION_MONTHS
+    python arquivar_alertas.py --meses 6
+"""
+import sys
+import os
+import argparse
+import logging
+
+# Add backend to path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.insert(0, backend_dir)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Archive alert history past the retention period"""
+    parser = argparse.ArgumentParser(description="Arquiva alertas antigos em JSONL compactado")
+    parser.add_argument("--meses", type=int, default=None, help="Meses de histórico mantidos no banco")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.database import SessionLocal, init_db
+    from app.services.agendador import LEASE_RETENCAO, acquire_lease, release_lease
+    from app.services.outbox import prune_outbox
+    from app.services.retencao import archive_alerts
+
+    init_db()
+    db = SessionLocal()
+    try:
+        dono = acquire_lease(db, LEASE_RETENCAO, settings.SCHEDULER_LEASE_SECONDS)
+        if not dono:
+            logger.info("Arquivamento já em execução em outra instância. Nada a fazer.")
+            return
+        try:
+            resultado = archive_alerts(db, meses=args.meses)
+            resultado["notificacoes_removidas"] = prune_outbox(db)
+        finally:
+            db.rollback()
+            release_lease(db, LEASE_RETENCAO, dono)
+    finally:
+        db.close()
+
+    logger.info(f"Destinatários normalizados: {resultado['normalizados']}")
+    logger.info(f"Alertas arquivados: {resultado['arquivados']}")
+    logger.info(f"Notificações finalizadas removidas: {resultado['notificacoes_removidas']}")
+    for mes in resultado["meses"]:
+        logger.info(f"  - {mes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+CalibraCore Lab - Teste de Carga do Processamento Diário de Alertas
+Cria uma frota sintética de equipamentos num banco temporário, sobe um
+servidor SMTP local (aiosmtpd) e um Twilio falso (uvicorn), ambos com
+latência configurável, executa o job diário completo (run_alert_job) e
+em seguida o envio de WhatsApp dos equipamentos alertados pela outbox.
+
+Imprime um JSON com os tempos por fase registrados pelo próprio job,
+latências de envio por canal, vazão e pico de memória.
+
+Uso:
+    pip install aiosmtpd
+    python scripts/benchmark_alertas.py --equipamentos 50000 --latencia-ms 20
+    python scripts/benchmark_alertas.py --sem-agenda --tracemalloc --saida resultado.json
+"""
+import sys
+import os
+import asyncio
+import argparse
+import json
+import logging
+import random
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+from datetime import date, timedelta
+
+# Add backend to path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.insert(0, backend_dir)
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    print("aiosmtpd não instalado. Execute: pip install aiosmtpd")
+    sys.exit(1)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LABORATORIOS = ["Solos", "Concreto", "Asfalto", "Agregados", "Química", "Metrologia"]
+CATEGORIAS = ["Balanças", "Termômetros", "Peneiras", "Provetas Graduadas", "Beckers", "Paquímetros", "Estufas", "Prensas"]
+
+
+class SMTPLatencyHandler:
+    """Accepts every message after `latencia` seconds (a remote relay's DATA round trip)"""
+
+    def __init__(self, latencia: float):
+        self.latencia = latencia
+        self.recebidas = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latencia)
+        self.recebidas += 1
+        return "250 OK"
+
+
+def fake_twilio(latencia: float):
+    """Starlette app answering Twilio's Messages endpoint after `latencia` seconds"""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    contador = {"recebidas": 0}
+
+    async def mensagens(request):
+        await request.form()
+        await asyncio.sleep(latencia)
+        contador["recebidas"] += 1
+        return JSONResponse({"sid": f"SM{contador['recebidas']:032d}", "status": "queued"}, status_code=201)
+
+    app = Starlette(routes=[Route("/2010-04-01/Accounts/{sid}/Messages.json", mensagens, methods=["POST"])])
+    return app, contador
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def configurar_ambiente(args, diretorio: str, smtp_port: int, twilio_port: int) -> None:
+    """Settings for the run; must happen before `app` is imported"""
+    os.environ.update(
+        DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(diretorio, 'benchmark.db')}",
+        SMTP_HOST="127.0.0.1",
+        SMTP_PORT=str(smtp_port),
+        SMTP_USER="benchmark",
+        SMTP_PASSWORD="benchmark",
+        SMTP_TLS="false",
+        SMTP_POOL_SIZE=str(args.conexoes),
+        TWILIO_SID="ACbenchmark",
+        TWILIO_AUTH_TOKEN="benchmark",
+        TWILIO_WHATSAPP_NUMBER="whatsapp:+15550000000",
+        TWILIO_API_BASE_URL=f"http://127.0.0.1:{twilio_port}",
+        WHATSAPP_MAX_CONNECTIONS=str(args.conexoes),
+        ALERT_SEND_CONCURRENCY=str(args.conexoes),
+        ALERT_RECIPIENTS="qualidade@calibracore.lab",
+        ALERT_DIGEST_RECIPIENTS=args.digest,
+        # Measure the pipeline, not the production rate limits and quotas
+        EMAIL_RATE_PER_MINUTE="0",
+        EMAIL_QUOTA_PER_DAY="0",
+        WHATSAPP_RATE_PER_MINUTE="0",
+        WHATSAPP_QUOTA_PER_DAY="0",
+        VOICE_ENABLED="false",
+        OUTBOX_WORKER_ENABLED="false",
+        SCHEDULER_ENABLED="false",
+        ALERT_ARCHIVE_DIR=os.path.join(diretorio, "arquivo"),
+    )
+
+
+def data_vencimento_sintetica(rng: random.Random, hoje: date, campanhas) -> date:
+    """
+    Realistic spread of due dates for yearly calibrations: most spread over
+    the coming year, part clustered on calibration campaigns (a whole lab
+    calibrated on the same day) and a tail of overdue equipment
+    """
+    sorteio = rng.random()
+    if sorteio < 0.10:
+        return hoje - timedelta(days=int(rng.expovariate(1 / 60)) + 1)
+    if sorteio < 0.35:
+        return rng.choice(campanhas)
+    return hoje + timedelta(days=rng.randint(0, 365))
+
+
+def seed(args, hoje: date) -> dict:
+    """Bulk insert the synthetic fleet; returns what was created"""
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import Equipamento, Usuario, UserRole
+    from app.services.alerta_service import next_alert_date
+
+    init_db()
+    rng = random.Random(args.semente)
+    campanhas = [hoje + timedelta(days=rng.randint(-10, 365)) for _ in range(12)]
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(Usuario), [
+            {
+                "nome": f"Responsável {i}",
+                "email": f"responsavel{i}@calibracore.lab",
+                "senha_hash": "-",
+                "papel": UserRole.LABORATORIO,
+                "laboratorio": LABORATORIOS[i % len(LABORATORIOS)],
+                "ativo": True
+            }
+            for i in range(args.responsaveis)
+        ])
+        responsaveis = [row.id for row in db.query(Usuario.id)]
+
+        com_telefone = 0
+        for inicio in range(0, args.equipamentos, 5000):
+            linhas = []
+            for i in range(inicio, min(inicio + 5000, args.equipamentos)):
+                vencimento = data_vencimento_sintetica(rng, hoje, campanhas)
+                telefone = f"+55319{i:08d}" if rng.random() < args.fracao_whatsapp else None
+                com_telefone += telefone is not None
+                linhas.append({
+                    "codigo_interno": f"EQ-{i:06d}",
+                    "descricao": f"{rng.choice(CATEGORIAS)} {i}",
+                    "categoria": rng.choice(CATEGORIAS),
+                    "laboratorio": rng.choice(LABORATORIOS),
+                    "responsavel_id": rng.choice(responsaveis) if rng.random() < 0.6 else None,
+                    "data_ultima_calibracao": vencimento - timedelta(days=365),
+                    "data_vencimento": vencimento,
+                    "proxima_data_alerta": None if args.sem_agenda else next_alert_date(vencimento, hoje),
+                    "telefone_contato": telefone,
+                    "notificar_automaticamente": True,
+                    "ativo": True
+                })
+            db.execute(insert(Equipamento), linhas)
+        db.commit()
+    finally:
+        db.close()
+    return {"equipamentos": args.equipamentos, "responsaveis": args.responsaveis, "com_whatsapp": com_telefone}
+
+
+async def enviar_whatsapp(hoje: date) -> tuple:
+    """
+    Queue one WhatsApp message per equipment alerted today that has a phone
+    (what the equipment handlers do) and deliver them through the outbox.
+    Returns (messages queued, send latencies).
+    """
+    from app.database import SessionLocal
+    from app.models import AlertaEnviado, Equipamento
+    from app.services.metricas import ColetorLatencia, coletar_latencias
+    from app.services.outbox import enqueue, outbox_worker
+
+    db = SessionLocal()
+    try:
+        alertados = db.query(Equipamento.id, Equipamento.codigo_interno, Equipamento.telefone_contato, AlertaEnviado.tipo_alerta).join(
+            AlertaEnviado, AlertaEnviado.equipamento_id == Equipamento.id
+        ).filter(
+            AlertaEnviado.data_envio >= hoje,
+            Equipamento.telefone_contato.isnot(None)
+        ).all()
+        origem = f"benchmark:whatsapp:{hoje.isoformat()}"
+        for eq in alertados:
+            enqueue(
+                db,
+                f"benchmark:{eq.id}:{eq.tipo_alerta}:whatsapp",
+                "whatsapp",
+                f"CalibraCore: alerta {eq.tipo_alerta} para o equipamento {eq.codigo_interno}.",
+                [f"whatsapp:{eq.telefone_contato}"],
+                origem=origem
+            )
+        db.commit()
+    finally:
+        db.close()
+    with coletar_latencias(ColetorLatencia()) as latencias:
+        await outbox_worker.drain(origem)
+    return len(alertados), latencias.resumo()
+
+
+def pico_rss_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do processamento diário de alertas")
+    parser.add_argument("--equipamentos", type=int, default=50000)
+    parser.add_argument("--responsaveis", type=int, default=200)
+    parser.add_argument("--fracao-whatsapp", type=float, default=0.2, help="Fração dos equipamentos com telefone")
+    parser.add_argument("--latencia-ms", type=float, default=20.0, help="Latência do SMTP (DATA) e do Twilio falso")
+    parser.add_argument("--conexoes", type=int, default=10, help="Conexões SMTP/HTTP e envios simultâneos")
+    parser.add_argument("--digest", default="", help="Destinatários que recebem resumo (ALERT_DIGEST_RECIPIENTS)")
+    parser.add_argument("--sem-agenda", action="store_true", help="Equipamentos sem proxima_data_alerta (primeira execução após importação)")
+    parser.add_argument("--database-url", default="", help="Banco a usar (padrão: SQLite temporário)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true", help="Mede o pico de alocações Python (mais lento)")
+    parser.add_argument("--saida", help="Grava o JSON também neste arquivo")
+    args = parser.parse_args()
+
+    # One log line per alert would dominate the measurement
+    logging.basicConfig(level=logging.WARNING)
+    warnings.filterwarnings("ignore", message="Session.login_data")
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    saida = os.path.abspath(args.saida) if args.saida else None
+    diretorio = tempfile.mkdtemp(prefix="calibracore-benchmark-")
+    smtp_port, twilio_port = free_port(), free_port()
+    configurar_ambiente(args, diretorio, smtp_port, twilio_port)
+    os.chdir(diretorio)
+
+    import uvicorn
+    from app.services.agendador import run_alert_job
+    from app.services.canais import close_channels
+
+    latencia = args.latencia_ms / 1000
+    handler = SMTPLatencyHandler(latencia)
+    controller = Controller(
+        handler,
+        hostname="127.0.0.1",
+        port=smtp_port,
+        auth_require_tls=False,
+        authenticator=lambda *a: AuthResult(success=True)
+    )
+    controller.start()
+    twilio_app, twilio = fake_twilio(latencia)
+    servidor = uvicorn.Server(uvicorn.Config(twilio_app, host="127.0.0.1", port=twilio_port, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        await asyncio.sleep(0.05)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    hoje = date.today()
+    tempos = {}
+    try:
+        inicio = time.perf_counter()
+        frota = seed(args, hoje)
+        tempos["seed"] = round(time.perf_counter() - inicio, 4)
+
+        inicio = time.perf_counter()
+        resultado = await run_alert_job("benchmark")
+        tempos["job_diario"] = round(time.perf_counter() - inicio, 4)
+
+        inicio = time.perf_counter()
+        whatsapp, latencias_whatsapp = await enviar_whatsapp(hoje)
+        tempos["whatsapp"] = round(time.perf_counter() - inicio, 4)
+        await close_channels()
+    finally:
+        controller.stop()
+        servidor.should_exit = True
+        pico_tracemalloc = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        tracemalloc.stop()
+
+    resultado = resultado or {}
+    relatorio = {
+        "parametros": {
+            "equipamentos": args.equipamentos,
+            "latencia_ms": args.latencia_ms,
+            "conexoes": args.conexoes,
+            "sem_agenda": args.sem_agenda,
+            "digest": bool(args.digest),
+            "banco": os.environ["DATABASE_URL"].split(":", 1)[0]
+        },
+        "frota": frota,
+        "resultado": {
+            "processados": resultado.get("processados", 0),
+            "alertas_enviados": resultado.get("alertas_enviados", 0),
+            "erros": resultado.get("erros", 0),
+            "emails_recebidos": handler.recebidas,
+            "whatsapp_enfileirados": whatsapp,
+            "whatsapp_recebidos": twilio["recebidas"]
+        },
+        "tempos_s": tempos,
+        "fases_job_ms": resultado.get("fases", {}),
+        "latencias_envio": {**resultado.get("latencias", {}), **latencias_whatsapp},
+        "vazao": {
+            "equipamentos_por_s": round(resultado.get("processados", 0) / tempos["job_diario"], 1),
+            "alertas_por_s": round(resultado.get("alertas_enviados", 0) / tempos["job_diario"], 1),
+            "emails_por_s": round(handler.recebidas / tempos["job_diario"], 1),
+            "whatsapp_por_s": round(twilio["recebidas"] / tempos["whatsapp"], 1) if tempos["whatsapp"] else None
+        },
+        "memoria_mb": {
+            "pico_rss": pico_rss_mb(),
+            "pico_tracemalloc": round(pico_tracemalloc / (1024 * 1024), 1) if pico_tracemalloc is not None else None
+        }
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    print(texto)
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+"""
+CalibraCore Lab - Benchmark dos Endpoints de Escrita de Equipamentos
+Mede a latência (p50/p95/máx) de criar, atualizar e desativar equipamentos
+com notificações ativas, contra um SMTP local (aiosmtpd) e um Twilio falso
+com latência configurável:
+- sincrono: cada requisição só termina depois de entregar suas notificações
+  (como quando os handlers enviavam os alertas antes de responder)
+- outbox: a requisição termina no commit; o worker da outbox entrega em
+  segundo plano
+
+Uso:
+    pip install aiosmtpd
+    python scripts/benchmark_escrita.py --operacoes 100 --latencia-ms 50
+"""
+import sys
+import os
+import asyncio
+import argparse
+import json
+import logging
+import tempfile
+import threading
+import time
+import warnings
+from datetime import date, timedelta
+
+# Add backend to path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.insert(0, backend_dir)
+
+from benchmark_alertas import AuthResult, Controller, SMTPLatencyHandler, configurar_ambiente, fake_twilio, free_port
+
+
+class EnvioSincrono:
+    """ASGI wrapper: a write request returns only after its notifications were delivered"""
+
+    def __init__(self, app, worker):
+        self.app = app
+        self.worker = worker
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT", "DELETE"):
+            await self.worker.drain()
+
+
+def resumo(latencias) -> dict:
+    from app.services.metricas import percentil
+    ordenadas = sorted(latencias)
+    return {
+        "requisicoes": len(ordenadas),
+        "p50_ms": round(percentil(ordenadas, 50), 1),
+        "p95_ms": round(percentil(ordenadas, 95), 1),
+        "max_ms": round(ordenadas[-1], 1) if ordenadas else 0.0
+    }
+
+
+async def medir(client, metodo: str, url: str, latencias: list, **kwargs):
+    inicio = time.perf_counter()
+    resposta = await client.request(metodo, url, **kwargs)
+    latencias.append((time.perf_counter() - inicio) * 1000)
+    resposta.raise_for_status()
+    return resposta
+
+
+async def executar(app, modo: str, operacoes: int) -> dict:
+    """Create, update and deactivate `operacoes` equipment, one request at a time"""
+    import httpx
+    from app.config import settings
+    from app.services.outbox import outbox_worker
+
+    alvo = EnvioSincrono(app, outbox_worker) if modo == "sincrono" else app
+    if modo == "sincrono":
+        await outbox_worker.stop()
+    else:
+        outbox_worker.start()
+
+    latencias = {"criar": [], "atualizar": [], "desativar": []}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=alvo), base_url="http://benchmark") as client:
+        resposta = await client.post("/api/auth/login", data={
+            "username": settings.ADMIN_EMAIL,
+            "password": settings.ADMIN_PASSWORD
+        })
+        client.headers["Authorization"] = f"Bearer {resposta.json()['access_token']}"
+
+        for i in range(operacoes):
+            # Due in 7 days: every write queues an urgent alert (e-mail + WhatsApp)
+            resposta = await medir(client, "POST", "/api/equipamentos", latencias["criar"], json={
+                "codigo_interno": f"BENCH-{modo}-{i:05d}",
+                "descricao": "Equipamento de benchmark",
+                "categoria": "Balanças",
+                "laboratorio": "Metrologia",
+                "data_ultima_calibracao": (date.today() - timedelta(days=358)).isoformat(),
+                "data_vencimento": (date.today() + timedelta(days=7)).isoformat(),
+                "email_contato": f"lab{i}@calibracore.lab",
+                "telefone_contato": f"+55319{i:08d}",
+                "notificar_automaticamente": True
+            })
+            equipamento_id = resposta.json()["id"]
+            await medir(client, "PUT", f"/api/equipamentos/{equipamento_id}", latencias["atualizar"], json={
+                "observacoes": f"Atualizado {i}"
+            })
+            await medir(client, "DELETE", f"/api/equipamentos/{equipamento_id}", latencias["desativar"])
+
+    # Let the background worker finish before the next mode is measured
+    await outbox_worker.drain()
+    return {operacao: resumo(valores) for operacao, valores in latencias.items()}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints de escrita de equipamentos")
+    parser.add_argument("--operacoes", type=int, default=100, help="Equipamentos criados/atualizados/desativados por modo")
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="Latência do SMTP (DATA) e do Twilio falso")
+    parser.add_argument("--conexoes", type=int, default=10)
+    parser.add_argument("--modos", default="sincrono,outbox")
+    args = parser.parse_args()
+    args.database_url = ""
+    args.digest = ""
+
+    logging.basicConfig(level=logging.WARNING)
+    warnings.filterwarnings("ignore", message="Session.login_data")
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    diretorio = tempfile.mkdtemp(prefix="calibracore-benchmark-")
+    smtp_port, twilio_port = free_port(), free_port()
+    configurar_ambiente(args, diretorio, smtp_port, twilio_port)
+    os.chdir(diretorio)
+
+    import uvicorn
+    from app.main import app, shutdown_event, startup_event
+
+    latencia = args.latencia_ms / 1000
+    handler = SMTPLatencyHandler(latencia)
+    controller = Controller(
+        handler,
+        hostname="127.0.0.1",
+        port=smtp_port,
+        auth_require_tls=False,
+        authenticator=lambda *a: AuthResult(success=True)
+    )
+    controller.start()
+    twilio_app, twilio = fake_twilio(latencia)
+    servidor = uvicorn.Server(uvicorn.Config(twilio_app, host="127.0.0.1", port=twilio_port, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        await asyncio.sleep(0.05)
+
+    await startup_event()
+    resultados = {}
+    try:
+        for modo in args.modos.split(","):
+            resultados[modo] = await executar(app, modo.strip(), args.operacoes)
+    finally:
+        await shutdown_event()
+        controller.stop()
+        servidor.should_exit = True
+
+    print(json.dumps({
+        "operacoes": args.operacoes,
+        "latencia_ms": args.latencia_ms,
+        "modos": resultados,
+        "emails_recebidos": handler.recebidas,
+        "whatsapp_recebidos": twilio["recebidas"]
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""
+CalibraCore Lab - Benchmark do Pool SMTP
+Mede mensagens/segundo contra um servidor SMTP local (aiosmtpd):
+- antes: uma conexão nova por mensagem (aiosmtplib.send)
+- depois: conexões persistentes do pool compartilhado
+
+Uso:
+    pip install aiosmtpd
+    python scripts/benchmark_smtp_pool.py --mensagens 300 --latencia-ms 50
+"""
+import sys
+import os
+import asyncio
+import argparse
+import json
+import socket
+import time
+from email.message import EmailMessage
+
+# Add backend to path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.insert(0, backend_dir)
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    print("aiosmtpd não instalado. Execute: pip install aiosmtpd")
+    sys.exit(1)
+
+import aiosmtplib
+from app.services.smtp_pool import SMTPPool
+
+
+class SlowHandshakeHandler:
+    """Counts messages; delays EHLO to emulate TLS + AUTH round trips"""
+
+    def __init__(self, latencia: float):
+        self.latencia = latencia
+        self.recebidas = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latencia)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.recebidas += 1
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_message(i: int) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "bench@calibracore.lab"
+    message["To"] = "lab@calibracore.lab"
+    message["Subject"] = f"[CalibraCore] Benchmark {i}"
+    message.set_content("Mensagem de benchmark")
+    return message
+
+
+async def run_sem_pool(host: str, port: int, total: int, concorrencia: int) -> float:
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def enviar(i):
+        async with semaforo:
+            await aiosmtplib.send(build_message(i), hostname=host, port=port, start_tls=False)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(enviar(i) for i in range(total)))
+    return time.perf_counter() - inicio
+
+
+async def run_com_pool(host: str, port: int, total: int, concorrencia: int) -> float:
+    pool = SMTPPool(host, port, start_tls=False, tamanho=concorrencia)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(pool.send_message(build_message(i)) for i in range(total)))
+    duracao = time.perf_counter() - inicio
+    await pool.close()
+    return duracao
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pool SMTP")
+    parser.add_argument("--mensagens", type=int, default=300)
+    parser.add_argument("--concorrencia", type=int, default=5)
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="Atraso no EHLO (simula TLS/AUTH)")
+    args = parser.parse_args()
+
+    handler = SlowHandshakeHandler(args.latencia_ms / 1000)
+    host, port = "127.0.0.1", free_port()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+
+    try:
+        antes = await run_sem_pool(host, port, args.mensagens, args.concorrencia)
+        depois = await run_com_pool(host, port, args.mensagens, args.concorrencia)
+    finally:
+        controller.stop()
+
+    print(json.dumps({
+        "mensagens": args.mensagens,
+        "concorrencia": args.concorrencia,
+        "latencia_ms": args.latencia_ms,
+        "sem_pool_msgs_por_s": round(args.mensagens / antes, 1),
+        "com_pool_msgs_por_s": round(args.mensagens / depois, 1),
+        "recebidas": handler.recebidas
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
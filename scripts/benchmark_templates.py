@@ -0,0 +1,185 @@
+"""
+CalibraCore Lab - Benchmark dos Templates de E-mail
+Renderiza N mensagens de alerta (individuais, via build_messages e um
+resumo) e compara o template f-string antigo com os pré-compilados, que
+também escapam os campos e trazem o CSS inline.
+
+Uso:
+    python scripts/benchmark_templates.py --mensagens 10000
+"""
+import sys
+import os
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+# Add backend to path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.insert(0, backend_dir)
+
+from app.services.alerta_service import build_messages, get_alert_type
+from app.services.email_service import get_alert_style, get_alert_email_html, get_alert_digest_email_html
+
+
+# Previous implementation, kept as the baseline
+def legacy_alert_email_html(
+    equipamento_codigo: str,
+    equipamento_descricao: str,
+    laboratorio: str,
+    data_vencimento: str,
+    dias_restantes: int,
+    tipo_alerta: str
+) -> str:
+    """
+    Generate HTML email for calibration alert
+    """
+    cor, urgencia, mensagem = get_alert_style(tipo_alerta, dias_restantes)
+    
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background: linear-gradient(135deg, #1e3a5f 0%, #2d5a87 100%); color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
+            .content {{ background: #f8f9fa; padding: 30px; border: 1px solid #ddd; }}
+            .alert-badge {{ display: inline-block; background: {cor}; color: white; padding: 10px 20px; border-radius: 5px; font-weight: bold; font-size: 18px; }}
+            .info-table {{ width: 100%; margin: 20px 0; }}
+            .info-table td {{ padding: 10px; border-bottom: 1px solid #ddd; }}
+            .info-table td:first-child {{ font-weight: bold; width: 40%; }}
+            .footer {{ background: #1e3a5f; color: white; padding: 15px; text-align: center; border-radius: 0 0 10px 10px; font-size: 12px; }}
+            .btn {{ display: inline-block; background: #2d5a87; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin-top: 20px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>⚗️ CalibraCore Lab</h1>
+                <p>Sistema de Controle de Calibração</p>
+            </div>
+            <div class="content">
+                <div style="text-align: center; margin-bottom: 20px;">
+                    <span class="alert-badge">{urgencia}</span>
+                </div>
+                
+                <p style="font-size: 16px; text-align: center;">{mensagem}</p>
+                
+                <table class="info-table">
+                    <tr>
+                        <td>Código:</td>
+                        <td><strong>{equipamento_codigo}</strong></td>
+                    </tr>
+                    <tr>
+                        <td>Descrição:</td>
+                        <td>{equipamento_descricao}</td>
+                    </tr>
+                    <tr>
+                        <td>Laboratório:</td>
+                        <td>{laboratorio}</td>
+                    </tr>
+                    <tr>
+                        <td>Data de Vencimento:</td>
+                        <td><strong style="color: {cor};">{data_vencimento}</strong></td>
+                    </tr>
+                </table>
+                
+                <p style="text-align: center;">
+                    Por favor, providencie a recalibração o mais breve possível.
+                </p>
+            </div>
+            <div class="footer">
+                <p>Este é um e-mail automático do CalibraCore Lab.</p>
+                <p>Não responda a este e-mail.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return html
+
+
+def gerar_envios(n: int) -> list:
+    """Synthetic alerts spread over every alert type"""
+    hoje = date.today()
+    dias_possiveis = [60, 45, 28, 21, 14, 7, 0, -7, -14, -35]
+    envios = []
+    for i in range(n):
+        dias = dias_possiveis[i % len(dias_possiveis)]
+        eq = SimpleNamespace(
+            id=i,
+            codigo_interno=f"EQ-{i:05d}",
+            descricao=f"Paquímetro digital {i}",
+            laboratorio=f"Lab {i % 7}",
+            data_vencimento=hoje + timedelta(days=dias)
+        )
+        envios.append({
+            "equipamento": eq,
+            "tipo_alerta": get_alert_type(dias),
+            "dias": dias,
+            "destinatarios": ["qualidade@calibracore.lab"]
+        })
+    return envios
+
+
+def cronometrar(func, repeticoes: int = 3) -> float:
+    """Best of a few runs (the first one also warms the template caches)"""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos templates de e-mail")
+    parser.add_argument("--mensagens", type=int, default=10000)
+    args = parser.parse_args()
+
+    envios = gerar_envios(args.mensagens)
+    campos = [
+        (
+            envio["equipamento"].codigo_interno,
+            envio["equipamento"].descricao,
+            envio["equipamento"].laboratorio,
+            envio["equipamento"].data_vencimento.strftime("%d/%m/%Y"),
+            envio["dias"],
+            envio["tipo_alerta"]
+        )
+        for envio in envios
+    ]
+    itens = [
+        {
+            "equipamento_codigo": codigo,
+            "equipamento_descricao": descricao,
+            "laboratorio": laboratorio,
+            "data_vencimento": vencimento,
+            "dias_restantes": dias,
+            "tipo_alerta": tipo
+        }
+        for codigo, descricao, laboratorio, vencimento, dias, tipo in campos
+    ]
+
+    t_fstring = cronometrar(lambda: [legacy_alert_email_html(*c) for c in campos])
+    t_compilado = cronometrar(lambda: [get_alert_email_html(*c) for c in campos])
+    t_mensagens = cronometrar(lambda: build_messages(envios))
+    t_resumo = cronometrar(lambda: get_alert_digest_email_html(itens))
+
+    print(json.dumps({
+        "mensagens": args.mensagens,
+        "html_fstring_ms": round(t_fstring * 1000, 1),
+        "html_compilado_ms": round(t_compilado * 1000, 1),
+        "build_messages_ms": round(t_mensagens * 1000, 1),
+        "resumo_ms": round(t_resumo * 1000, 1),
+        "compilado_msgs_por_s": round(args.mensagens / t_compilado)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 """
 CalibraCore Lab - Script de Processamento de Alertas
-Execute este script diariamente via Agendador de Tarefas do Windows
+O servidor já processa os alertas diariamente (ALERT_SCHEDULE_TIME). Use este
+script quando o servidor não fica ligado, via Agendador de Tarefas do Windows.
+Ele usa o mesmo lock do servidor, então nunca roda em paralelo com ele.
 
 Para configurar no Agendador:
 1. Abra "Agendador de Tarefas" no Windows
@@ -11,10 +13,23 @@ Para configurar no Agendador:
 6. Programa: python
 7. Argumentos: "C:\\...\\CalibraCore Lab\\scripts\\processar_alertas.py"
 8. Iniciar em: "C:\\...\\CalibraCore Lab\\scripts"
+
+Frotas grandes: --workers N divide o processamento em shards (por
+laboratório ou por faixa de ids) preparados em N processos. Cada shard
+grava um checkpoint junto com seus alertas; se a execução for interrompida,
+--resume continua do primeiro shard não concluído sem reenviar nada.
+Com SQLite (um único escritor por vez) os shards rodam em um só processo:
+--workers só paraleliza com PostgreSQL.
+
+    python processar_alertas.py --workers 4
+    python processar_alertas.py --workers 4 --particao ids --tamanho-shard 5000
+    python processar_alertas.py --workers 4 --resume
 """
 import sys
 import os
 import asyncio
+import argparse
+import functools
 import logging
 from datetime import datetime
 
@@ -36,7 +51,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
+async def main(args):
     """Process calibration alerts"""
     logger.info("=" * 60)
     logger.info("Iniciando processamento de alertas - CalibraCore Lab")
@@ -45,36 +60,65 @@ async def main():
     
     try:
         # Import after path is set
-        from app.database import SessionLocal, init_db
-        from app.services.alerta_service import process_alerts
+        from app.database import init_db
+        from app.services.agendador import run_alert_job
+        from app.services.alerta_shards import process_alerts_sharded
+        from app.services.smtp_pool import close_smtp_pools
+        from app.services.whatsapp import close_whatsapp_clients
+        from app.services.canais import close_channels
         
         # Initialize database
         init_db()
         
-        # Create session
-        db = SessionLocal()
-        
         try:
-            # Process alerts
-            result = await process_alerts(db)
+            # Process alerts (same lease as the in-app scheduler)
+            executor = None
+            if args.workers > 1 or args.resume:
+                executor = functools.partial(
+                    process_alerts_sharded,
+                    particao=args.particao,
+                    workers=max(args.workers, 1),
+                    retomar=args.resume,
+                    tamanho=args.tamanho_shard
+                )
+                logger.info(f"Modo em shards: {args.particao}, {max(args.workers, 1)} processo(s)" + (", retomando" if args.resume else ""))
+            result = await run_alert_job("script", executor=executor)
+            if result is None:
+                logger.info("Processamento já em execução em outra instância. Nada a fazer.")
+                return
             
             logger.info("-" * 60)
             logger.info("RESULTADO DO PROCESSAMENTO:")
             logger.info(f"  Equipamentos processados: {result['processados']}")
             logger.info(f"  Alertas enviados: {result['alertas_enviados']}")
             logger.info(f"  Erros: {result['erros']}")
+            if 'shards' in result:
+                shards = result['shards']
+                logger.info(
+                    f"  Shards: {shards['total']} ({shards['executados']} executados, "
+                    f"{shards['retomados']} já concluídos antes)"
+                )
             
-            if result['detalhes']:
-                logger.info("-" * 60)
-                logger.info("DETALHES:")
-                for detalhe in result['detalhes']:
-                    logger.info(f"  - {detalhe['equipamento']}: {detalhe['status']} ({detalhe['tipo_alerta']})")
+            logger.info("-" * 60)
+            logger.info("FASES:")
+            total = sum(result['fases'].values()) or 1
+            for fase, ms in result['fases'].items():
+                logger.info(f"  {fase:<16} {ms:>10.1f} ms  ({ms / total:.0%})")
+            for canal, latencia in result['latencias'].items():
+                logger.info(
+                    f"  Envio {canal}: {latencia['envios']} envios, {latencia['falhas']} falhas, "
+                    f"p50 {latencia['p50_ms']} ms, p95 {latencia['p95_ms']} ms, "
+                    f"p99 {latencia['p99_ms']} ms, máx {latencia['max_ms']} ms"
+                )
+            logger.info(f"  Detalhes por equipamento: GET /api/alertas/execucoes/{result['execucao_id']}/itens")
             
             logger.info("-" * 60)
             logger.info("Processamento concluído com sucesso!")
             
         finally:
-            db.close()
+            await close_smtp_pools()
+            await close_whatsapp_clients()
+            await close_channels()
             
     except Exception as e:
         logger.error(f"Erro no processamento: {str(e)}")
@@ -82,4 +126,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Processamento diário de alertas de calibração")
+    parser.add_argument("--workers", type=int, default=1, help="Processos para os shards (1 = execução única)")
+    parser.add_argument("--resume", action="store_true", help="Pula os shards já concluídos hoje")
+    parser.add_argument("--particao", choices=["laboratorio", "ids"], default="laboratorio")
+    parser.add_argument("--tamanho-shard", type=int, default=5000, help="Ids por shard com --particao ids")
+    asyncio.run(main(parser.parse_args()))
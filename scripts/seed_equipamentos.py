@@ -13,6 +13,7 @@ sys.path.insert(0, backend_dir)
 
 from app.database import SessionLocal, init_db
 from app.models import Equipamento
+from app.services.calibracao import registrar_historico
 
 # Equipment data from user's images
 EQUIPAMENTOS = [
@@ -118,6 +119,8 @@ def seed_equipamentos():
                 print(f"  [SKIP] {eq['codigo']} - já existe")
                 continue
             
+            data_calibracao = date.fromisoformat(eq["calibracao"])
+            data_vencimento = date.fromisoformat(eq["vencimento"])
             equipamento = Equipamento(
                 codigo_interno=eq["codigo"],
                 descricao=eq["codigo"],
@@ -125,11 +128,16 @@ def seed_equipamentos():
                 marca=eq["marca"] if eq["marca"] != "-" else None,
                 numero_certificado=eq["certificado"] if eq["certificado"] != "-" else None,
                 laboratorio="Laboratório",
-                data_ultima_calibracao=eq["calibracao"],
-                data_vencimento=eq["vencimento"],
+                data_ultima_calibracao=data_calibracao,
+                data_vencimento=data_vencimento,
                 ativo=True
             )
             db.add(equipamento)
+            # Imported calibration starts the equipment history
+            registrar_historico(
+                db, equipamento, data_calibracao, data_vencimento,
+                numero_certificado=equipamento.numero_certificado
+            )
             added += 1
             print(f"  [ADD] {eq['codigo']}")
         
@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from app.database import SessionLocal, init_db
 from app.models import Equipamento
+from app.services.calibracao import registrar_historico
 
 init_db()
 db = SessionLocal()
@@ -73,6 +74,7 @@ for eq in equipamentos:
         ativo=True
     )
     db.add(novo)
+    registrar_historico(db, novo, eq[4], eq[5], numero_certificado=eq[3])
     count += 1
     print(f"  + {eq[0]}")
 